@@ -0,0 +1,45 @@
+"""
+Micro-benchmarks de la verificación de JWT: jose.jwt.decode contra decode_jwt.
+
+Uso (desde backend/):
+    python -m pytest benchmarks/bench_jwt.py -q --benchmark-baseline none
+
+No usa la base de datos: mide solo la verificación de firma y expiración.
+'sin caché' vacía la caché de claims antes de cada llamada (primer uso del token);
+'con caché' es el caso habitual de un cliente que repite su token.
+"""
+
+import pytest
+from jose import jwt
+
+from controllers import auth
+
+
+class _User:
+    email = "bench@example.com"
+    name = "Bench"
+    surname = "User"
+    birthdate = "2000-01-01"
+    storage_used = 0
+
+
+@pytest.fixture(scope="module")
+def token() -> str:
+    return auth._generate_jwt_token(_User())
+
+
+def test_jose_decode(benchmark, token):
+    claims = benchmark(jwt.decode, token, auth.SECRET_KEY, algorithms=["HS256"])
+    assert claims["user_id"] == _User.email
+
+
+def test_decode_jwt_uncached(benchmark, token):
+    def decode():
+        auth.forget_jwt(token)
+        return auth.decode_jwt(token)
+
+    assert benchmark(decode)["user_id"] == _User.email
+
+
+def test_decode_jwt_cached(benchmark, token):
+    assert benchmark(auth.decode_jwt, token)["user_id"] == _User.email
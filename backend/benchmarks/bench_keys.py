@@ -0,0 +1,158 @@
+"""
+Micro-benchmarks de las primitivas de controllers.keys y de verify_signature.
+
+Uso (desde backend/):
+    python -m pytest benchmarks/bench_keys.py -q
+    python -m pytest benchmarks/bench_keys.py --benchmark-runs 5 \
+        --benchmark-save benchmarks/baselines/keys.json
+
+Los tamaños de archivo van de 1 KiB a 1 GiB; los mayores que BENCH_MAX_SIZE
+(16 MiB por defecto) se omiten para que una corrida normal sea corta. La
+generación de llaves se mide pero no se compara contra la línea base: RSA busca
+primos al azar y su tiempo varía demasiado entre corridas.
+"""
+
+import asyncio
+import os
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from controllers import keys
+from controllers.hashing import HASH_ALGORITHMS as REGISTERED_HASH_ALGORITHMS
+from controllers.hashing import hash_file
+from routes.file import verify_signature
+
+KIB = 1024
+MIB = 1024 * KIB
+FILE_SIZES = [KIB, 64 * KIB, MIB, 16 * MIB, 256 * MIB, 1024 * MIB]
+CHUNK_SIZES = [16 * KIB, 64 * KIB, MIB, 4 * MIB]
+SIGNING_ALGORITHMS = ["rsa", "ecc", "ed25519"]
+HASH_ALGORITHMS = [
+    name
+    for name in ("sha256", "blake2b", "sha512_256", "blake3")
+    if name in REGISTERED_HASH_ALGORITHMS
+]
+BENCH_MAX_SIZE = int(os.getenv("BENCH_MAX_SIZE", str(16 * MIB)))
+
+GENERATORS = {
+    "rsa": keys.generate_rsa_keys,
+    "ecc": keys.generate_ecc_keys,
+    "ed25519": keys.generate_ed25519_keys,
+}
+SIGNERS = {
+    "rsa": keys.sign_file_with_rsa,
+    "ecc": keys.sign_file_with_ecc,
+    "ed25519": keys.sign_file_with_ed25519,
+}
+
+
+def _size_id(size: int) -> str:
+    return f"{size // MIB}MiB" if size >= MIB else f"{size // KIB}KiB"
+
+
+def _sizes():
+    return [
+        pytest.param(
+            size,
+            id=_size_id(size),
+            marks=pytest.mark.skipif(
+                size > BENCH_MAX_SIZE, reason="mayor que BENCH_MAX_SIZE"
+            ),
+        )
+        for size in FILE_SIZES
+    ]
+
+
+@pytest.fixture(scope="session")
+def data_file(tmp_path_factory):
+    """Crea (una sola vez por tamaño) un archivo de datos aleatorios."""
+    directory = tmp_path_factory.mktemp("bench")
+    files = {}
+
+    def make(size: int) -> str:
+        if size not in files:
+            path = directory / f"data-{size}.bin"
+            block = os.urandom(min(size, MIB))
+            with open(path, "wb") as f:
+                f.writelines(
+                    block[: size - offset] for offset in range(0, size, len(block))
+                )
+            files[size] = str(path)
+        return files[size]
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def private_keys():
+    return {
+        algorithm: serialization.load_pem_private_key(
+            generate()[0].encode(), password=None
+        )
+        for algorithm, generate in GENERATORS.items()
+    }
+
+
+@pytest.mark.parametrize("algorithm", SIGNING_ALGORITHMS)
+def test_generate_keys(benchmark, algorithm):
+    benchmark.gated = False
+    _private_pem, public_pem = benchmark(GENERATORS[algorithm])
+    assert "BEGIN PUBLIC KEY" in public_pem
+
+
+@pytest.mark.parametrize("algorithm", HASH_ALGORITHMS)
+@pytest.mark.parametrize("size", _sizes())
+def test_save_hash(benchmark, tmp_path, size, algorithm):
+    data = os.urandom(size)
+    benchmark.extra_info["bytes"] = size
+    benchmark(keys.save_hash, data, str(tmp_path / "archivo"), algorithm, algorithm)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES, ids=_size_id)
+@pytest.mark.parametrize("algorithm", HASH_ALGORITHMS)
+@pytest.mark.parametrize("size", _sizes())
+def test_hash_file(benchmark, data_file, size, algorithm, chunk_size):
+    path = data_file(size)
+    benchmark.extra_info["bytes"] = size
+    digest = benchmark(hash_file, path, algorithm, chunk_size)
+    assert digest
+
+
+@pytest.mark.parametrize("algorithm", SIGNING_ALGORITHMS)
+@pytest.mark.parametrize("size", _sizes())
+def test_sign_file(benchmark, data_file, private_keys, tmp_path, size, algorithm):
+    # Cada firma escribe sus archivos .sig/.hash junto al archivo firmado
+    path = tmp_path / "archivo.bin"
+    os.symlink(data_file(size), path)
+    benchmark.extra_info["bytes"] = size
+    signature_path, _ = benchmark(
+        SIGNERS[algorithm], str(path), private_keys[algorithm]
+    )
+    assert os.path.exists(signature_path)
+
+
+@pytest.mark.parametrize("algorithm", SIGNING_ALGORITHMS)
+@pytest.mark.parametrize("size", _sizes())
+def test_verify_signature(
+    benchmark, data_file, private_keys, tmp_path, size, algorithm
+):
+    path = tmp_path / "archivo.bin"
+    os.symlink(data_file(size), path)
+    signature_path, _ = asyncio.run(
+        SIGNERS[algorithm](str(path), private_keys[algorithm])
+    )
+    with open(signature_path, "rb") as f:
+        signature = f.read()
+    public_pem = (
+        private_keys[algorithm]
+        .public_key()
+        .public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+
+    benchmark.extra_info["bytes"] = size
+    assert benchmark(verify_signature, str(path), public_pem, signature, algorithm)
@@ -0,0 +1,75 @@
+"""
+Micro-benchmarks de las respuestas JSON de listados: serialización y compresión.
+
+Uso (desde backend/):
+    python -m pytest benchmarks/bench_responses.py -q --benchmark-baseline none
+
+El listado simula /file/files con BENCH_LISTING_USERS usuarios de 50 archivos.
+'fastapi' es el camino por defecto (jsonable_encoder + JSONResponse); 'fast_json'
+retorna FastJSONResponse directo (orjson si está instalado). Los de compresión
+miden el middleware completo sobre el cuerpo ya serializado.
+"""
+
+import asyncio
+import os
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from controllers.responses import FastJSONResponse
+from middleware.compression import ENCODERS, CompressionMiddleware
+
+BENCH_LISTING_USERS = int(os.getenv("BENCH_LISTING_USERS", "2000"))
+
+
+@pytest.fixture(scope="module")
+def listing() -> list[dict]:
+    return [
+        {
+            "user": f"user{i}@example.com",
+            "files": [f"informe-{i}-{n}.pdf" for n in range(50)],
+        }
+        for i in range(BENCH_LISTING_USERS)
+    ]
+
+
+def test_listing_fastapi(benchmark, listing):
+    body = benchmark(lambda: JSONResponse(jsonable_encoder(listing)).body)
+    assert body.startswith(b"[")
+
+
+def test_listing_fast_json(benchmark, listing):
+    body = benchmark(lambda: FastJSONResponse(listing).body)
+    assert body.startswith(b"[")
+
+
+@pytest.mark.parametrize("encoding", list(ENCODERS))
+def test_listing_compressed(benchmark, listing, encoding):
+    body = FastJSONResponse(listing).body
+
+    async def app(scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    middleware = CompressionMiddleware(app)
+    scope = {"type": "http", "headers": [(b"accept-encoding", encoding.encode())]}
+
+    def request() -> bytes:
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(middleware(scope, None, send))
+        return sent[-1]["body"]
+
+    compressed = benchmark(request)
+    print(f"\n{encoding}: {len(body)} -> {len(compressed)} bytes")
+    assert len(compressed) < len(body)
@@ -0,0 +1,128 @@
+"""
+Compara el costo por petición de las cabeceras de seguridad implementadas con
+@app.middleware("http") (BaseHTTPMiddleware) y con el middleware ASGI puro.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_security_headers [--requests 5000] [--download-mib 64]
+
+Mide peticiones por segundo sobre /health y el rendimiento de una descarga con
+FileResponse. Las peticiones se hacen en proceso con httpx.ASGITransport, sin
+red, para que la diferencia medida sea solo la del middleware.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse
+
+from middleware.security import SECURITY_HEADERS, SecurityHeadersMiddleware
+
+
+def build_app(kind: str, download_path: str) -> FastAPI:
+    app = FastAPI()
+
+    if kind == "http":
+
+        @app.middleware("http")
+        async def add_security_headers(request: Request, call_next):
+            response = await call_next(request)
+            for name, value in SECURITY_HEADERS.items():
+                response.headers[name] = value
+            return response
+
+    elif kind == "asgi":
+        app.add_middleware(SecurityHeadersMiddleware)
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "ok"}
+
+    @app.get("/download")
+    async def download():
+        return FileResponse(download_path)
+
+    return app
+
+
+async def bench_health(app: FastAPI, requests: int, concurrency: int) -> float:
+    """Retorna peticiones por segundo sobre /health."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for _ in range(100):  # calentamiento
+            await client.get("/health")
+
+        remaining = requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get("/health")
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+async def bench_download(app: FastAPI, size: int, rounds: int) -> float:
+    """Retorna el rendimiento de descarga en MiB/s."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        await client.get("/download")  # calentamiento (page cache)
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            async with client.stream("GET", "/download") as response:
+                received = 0
+                async for chunk in response.aiter_raw():
+                    received += len(chunk)
+            assert received == size
+        return size * rounds / (time.perf_counter() - start) / (1024 * 1024)
+
+
+async def main(args):
+    size = args.download_mib * 1024 * 1024
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(os.urandom(1024 * 1024) * args.download_mib)
+        download_path = f.name
+
+    try:
+        print(
+            f"{'middleware':<12}{'/health req/s':>16}"
+            f"{'us/req':>10}{'descarga MiB/s':>18}"
+        )
+        results = {}
+        for kind in ("none", "http", "asgi"):
+            app = build_app(kind, download_path)
+            rps = await bench_health(app, args.requests, args.concurrency)
+            mibps = await bench_download(app, size, args.rounds)
+            results[kind] = rps
+            print(f"{kind:<12}{rps:>16.0f}{1e6 / rps:>10.1f}{mibps:>18.0f}")
+
+        overhead_http = 1e6 / results["http"] - 1e6 / results["none"]
+        overhead_asgi = 1e6 / results["asgi"] - 1e6 / results["none"]
+        print(
+            f"\nCosto agregado por petición: http={overhead_http:.1f} us, "
+            f"asgi={overhead_asgi:.1f} us"
+        )
+    finally:
+        os.unlink(download_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--download-mib", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""
+Mide el arranque en frío de la app contra un presupuesto.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_startup [--runs 5] [--import-budget-ms 1500] \
+        [--ready-budget-ms 5000]
+
+- import: tiempo de 'import main' en un proceso nuevo (mediana de --runs).
+- listen: desde que se lanza uvicorn hasta que /health responde.
+- ready: desde que se lanza uvicorn hasta que /ready responde 200 (base, Redis y
+  backends criptográficos listos).
+
+Termina con código 1 si alguna mediana supera su presupuesto.
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.loadtest import BACKEND_DIR, AppServer, LocalRedis
+
+IMPORT_CODE = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+
+def measure_import() -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_CODE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url: str, timeout: float = 60) -> float:
+    """Espera hasta que la URL responda 200 y retorna el instante (perf_counter)."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(url)
+
+
+def measure_server(redis_port: int) -> tuple[float, float]:
+    workdir = Path(tempfile.mkdtemp(prefix="startup-"))
+    server = AppServer(workdir, redis_port)
+    try:
+        start = time.perf_counter()
+        server.start()
+        listen = wait_for(f"{server.base_url}/health") - start
+        ready = wait_for(f"{server.base_url}/ready") - start
+        return listen, ready
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1500)
+    parser.add_argument("--ready-budget-ms", type=float, default=5000)
+    parser.add_argument("--redis-port", type=int, default=None)
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+
+    redis = LocalRedis(args.redis_port)
+    redis.start()
+    try:
+        servers = [measure_server(redis.port) for _ in range(args.runs)]
+    finally:
+        redis.stop()
+
+    report = {
+        "import_ms": statistics.median(imports) * 1000,
+        "listen_ms": statistics.median(s[0] for s in servers) * 1000,
+        "ready_ms": statistics.median(s[1] for s in servers) * 1000,
+        "import_budget_ms": args.import_budget_ms,
+        "ready_budget_ms": args.ready_budget_ms,
+    }
+    print(json.dumps({k: round(v, 1) for k, v in report.items()}, indent=2))
+
+    over_budget = (
+        report["import_ms"] > args.import_budget_ms
+        or report["ready_ms"] > args.ready_budget_ms
+    )
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
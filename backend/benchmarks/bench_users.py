@@ -0,0 +1,103 @@
+"""
+Micro-benchmarks de las búsquedas de usuarios por email (rutas de autenticación).
+
+Uso (desde backend/):
+    python -m pytest benchmarks/bench_users.py -q --benchmark-baseline none
+
+Usa una base SQLite temporal con BENCH_USERS usuarios (10 000 por defecto), todos
+con llaves públicas RSA, ECC y Ed25519 registradas, como en producción.
+"""
+
+import os
+import tempfile
+
+# La base se elige al importar 'database': antes de importar los controladores
+os.environ.setdefault(
+    "DATABASE_PATH", os.path.join(tempfile.mkdtemp(), "bench-users.db")
+)
+
+import pytest
+from sqlalchemy import insert, select
+
+from controllers import auth
+from controllers.keys import (
+    generate_ecc_keys,
+    generate_ed25519_keys,
+    generate_rsa_keys,
+    key_fingerprint,
+    pem_to_der,
+)
+from database import User, UserKey, db
+
+BENCH_USERS = int(os.getenv("BENCH_USERS", "10000"))
+PASSWORD = "password123"
+
+
+@pytest.fixture(scope="module")
+def emails() -> list[str]:
+    db.create_tables()
+    _, rsa_public = generate_rsa_keys()
+    _, ecc_public = generate_ecc_keys()
+    _, ed25519_public = generate_ed25519_keys()
+    hashed = auth._hash_password(PASSWORD)
+    emails = [f"bench-{index}@example.com" for index in range(BENCH_USERS)]
+
+    with db.write() as session:
+        session.execute(
+            insert(User),
+            [
+                {
+                    "email": email,
+                    "password": hashed,
+                    "name": "Bench",
+                    "surname": "User",
+                    "birthdate": "2000-01-01",
+                }
+                for email in emails
+            ],
+        )
+        # La misma llave para todos: solo importa el tamaño de user_keys
+        keys = []
+        for algorithm, pem in (
+            ("rsa", rsa_public),
+            ("ecc", ecc_public),
+            ("ed25519", ed25519_public),
+        ):
+            der = pem_to_der(pem)
+            keys.append(
+                {
+                    "algorithm": algorithm,
+                    "public_key": der,
+                    "fingerprint": key_fingerprint(der),
+                }
+            )
+        session.execute(
+            insert(UserKey),
+            [
+                {**key, "user_id": user_id}
+                for user_id in session.scalars(select(User.id))
+                for key in keys
+            ],
+        )
+    return emails
+
+
+def test_get_user_by_email(benchmark, emails):
+    email = emails[len(emails) // 2]
+    user = benchmark(auth.get_user_by_email, email)
+    assert user.email == email
+
+
+def test_login(benchmark, emails):
+    email = emails[-1]
+    assert benchmark(auth.login, email, PASSWORD)[0] == email
+
+
+def test_login_wrong_password(benchmark, emails):
+    assert benchmark(auth.login, emails[0], "incorrecta") == ("", "")
+
+
+def test_verify_jwt(benchmark, emails):
+    email = emails[1]
+    token = auth._generate_jwt_token(auth.get_user_by_email(email))
+    assert benchmark(auth.verify_jwt, token).email == email
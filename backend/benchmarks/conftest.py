@@ -0,0 +1,179 @@
+"""
+Fixture 'benchmark' al estilo de pytest-benchmark, sin dependencias adicionales.
+
+Cada benchmark repite la función hasta cubrir BENCH_MIN_TIME segundos (con un
+mínimo de rondas) y compara la mediana contra la línea base guardada: la prueba
+falla si es más lenta que la base por encima del umbral (y por encima de
+BENCH_NOISE_FLOOR_MS, para no fallar por ruido en operaciones de microsegundos).
+
+Las escrituras corren con FSYNC_POLICY=none salvo que se indique otra política:
+el fsync mide el disco, no el código, y su latencia varía demasiado entre
+corridas para compararla contra una línea base. Los benchmarks marcados con
+'benchmark.gated = False' se miden y se guardan, pero no se comparan.
+
+Opciones:
+    --benchmark-baseline PATH   Línea base a comparar (por defecto baselines/keys.json;
+                                una ruta inexistente desactiva la comparación)
+    --benchmark-threshold X     Regresión tolerada, 0.5 = 50 % más lento
+    --benchmark-runs N          Repite la medición N veces y usa la mediana de las
+                                medianas (por defecto 1; usar 5 al guardar una base)
+    --benchmark-save PATH       Guarda los resultados de esta corrida como JSON
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
+
+# Antes de importar controllers.storage, que lee la política al importarse
+os.environ.setdefault("FSYNC_POLICY", "none")
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "keys.json"
+BENCH_MIN_TIME = float(os.getenv("BENCH_MIN_TIME", "0.5"))
+BENCH_MIN_ROUNDS = int(os.getenv("BENCH_MIN_ROUNDS", "3"))
+BENCH_MAX_ROUNDS = int(os.getenv("BENCH_MAX_ROUNDS", "200"))
+# Diferencias absolutas por debajo de este valor se consideran ruido
+BENCH_NOISE_FLOOR_S = float(os.getenv("BENCH_NOISE_FLOOR_MS", "0.1")) / 1000
+
+_results = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark")
+    group.addoption("--benchmark-baseline", type=Path, default=BASELINE_PATH)
+    group.addoption(
+        "--benchmark-threshold",
+        type=float,
+        default=float(os.getenv("BENCH_THRESHOLD", "0.5")),
+    )
+    group.addoption(
+        "--benchmark-runs", type=int, default=int(os.getenv("BENCH_RUNS", "1"))
+    )
+    group.addoption("--benchmark-save", type=Path, default=None)
+
+
+class Benchmark:
+    """Mide una función (sync o async) y guarda sus estadísticas."""
+
+    def __init__(self, name: str, baseline: dict, threshold: float, runs: int = 1):
+        self.name = name
+        self.baseline = baseline
+        self.threshold = threshold
+        self.runs = max(runs, 1)
+        self.gated = True
+        self.extra_info = {}
+        self.stats = None
+
+    def _runner(self, func, args, kwargs):
+        if inspect.iscoroutinefunction(func):
+            loop = asyncio.new_event_loop()
+            return (lambda: loop.run_until_complete(func(*args, **kwargs))), loop
+        return (lambda: func(*args, **kwargs)), None
+
+    def _measure(self, run) -> tuple[list[float], object]:
+        timings = []
+        result = run()  # calentamiento, no se mide
+        started = time.perf_counter()
+        while len(timings) < BENCH_MAX_ROUNDS and (
+            len(timings) < BENCH_MIN_ROUNDS
+            or time.perf_counter() - started < BENCH_MIN_TIME
+        ):
+            start = time.perf_counter()
+            result = run()
+            timings.append(time.perf_counter() - start)
+        return timings, result
+
+    def __call__(self, func, *args, **kwargs):
+        run, loop = self._runner(func, args, kwargs)
+        timings, medians = [], []
+        try:
+            for _ in range(self.runs):
+                run_timings, result = self._measure(run)
+                timings.extend(run_timings)
+                medians.append(statistics.median(run_timings))
+        finally:
+            if loop is not None:
+                loop.close()
+
+        median = statistics.median(medians)
+        self.stats = {
+            "median_s": median,
+            "min_s": min(timings),
+            "mean_s": statistics.fmean(timings),
+            "rounds": len(timings),
+            "runs": self.runs,
+            **self.extra_info,
+        }
+        if not self.gated:
+            self.stats["gated"] = False
+        if "bytes" in self.extra_info and median > 0:
+            self.stats["mib_s"] = self.extra_info["bytes"] / median / (1024 * 1024)
+        _results[self.name] = self.stats
+
+        if self.gated:
+            self._check_regression(median)
+        return result
+
+    def _check_regression(self, median: float):
+        reference = self.baseline.get(self.name)
+        if reference is None:
+            return
+        limit = max(
+            reference["median_s"] * (1 + self.threshold),
+            reference["median_s"] + BENCH_NOISE_FLOOR_S,
+        )
+        if median > limit:
+            pytest.fail(
+                f"Regresión en {self.name}: mediana {median * 1000:.3f} ms, "
+                f"línea base {reference['median_s'] * 1000:.3f} ms "
+                f"(umbral +{self.threshold:.0%})",
+                pytrace=False,
+            )
+
+
+@pytest.fixture(scope="session")
+def benchmark_baseline(request) -> dict:
+    path = request.config.getoption("--benchmark-baseline")
+    if path is None or not path.exists():
+        return {}
+    return json.loads(path.read_text()).get("benchmarks", {})
+
+
+@pytest.fixture
+def benchmark(request, benchmark_baseline) -> Benchmark:
+    return Benchmark(
+        request.node.name,
+        benchmark_baseline,
+        request.config.getoption("--benchmark-threshold"),
+        request.config.getoption("--benchmark-runs"),
+    )
+
+
+def pytest_sessionfinish(session):
+    path = session.config.getoption("--benchmark-save", default=None)
+    if path is None or not _results:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {
+                "meta": {
+                    "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "machine": platform.machine(),
+                    "fsync_policy": os.environ["FSYNC_POLICY"],
+                },
+                "benchmarks": dict(sorted(_results.items())),
+            },
+            indent=2,
+        )
+        + "\n"
+    )
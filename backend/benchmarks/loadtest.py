@@ -0,0 +1,514 @@
+"""
+Pruebas de carga locales de login, subida, descarga y verificación.
+
+Uso (desde backend/):
+    python -m benchmarks.loadtest --scenarios login,upload,download,verify \\
+        --users 4 --concurrency 16 --duration 10 --file-sizes 1K,1M \\
+        --algorithms ed25519,rsa --output resultados.json
+
+Levanta la app con uvicorn en un subproceso, con una base SQLite y un directorio
+de trabajo temporales, y un Redis local: 'redis-server' si está instalado o, si no,
+el servidor TCP de 'fakeredis'. Con --redis-port se usa un Redis ya levantado.
+
+El resultado es un JSON con RPS, percentiles de latencia (p50/p95/p99) y el pico de
+memoria residente (VmHWM) del proceso del servidor por escenario, para comparar
+entre commits.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+import httpx
+from cryptography.hazmat.primitives import serialization
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PASSWORD = "BenchPassword123"
+SCENARIOS = ("login", "upload", "download", "verify")
+SIZE_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+FAKEREDIS_SERVER = (
+    "import sys\n"
+    "from fakeredis import TcpFakeServer\n"
+    "server = TcpFakeServer(('127.0.0.1', int(sys.argv[1])), server_type='redis')\n"
+    "server.serve_forever()\n"
+)
+
+
+def parse_size(value: str) -> int:
+    """Convierte '1K', '4M' o '1G' a bytes."""
+    value = value.strip().upper().removesuffix("B")
+    if value and value[-1] in SIZE_UNITS:
+        return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+def format_size(size: int) -> str:
+    for unit in ("G", "M", "K"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return str(size)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El proceso terminó con código {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"El puerto {port} no respondió en {timeout} s")
+
+
+class LocalRedis:
+    """Redis local para la prueba: redis-server si existe, si no fakeredis."""
+
+    def __init__(self, port: int | None = None):
+        self.external = port is not None
+        self.port = port or free_port()
+        self.process = None
+        self.kind = "external" if self.external else None
+
+    def start(self):
+        if self.external:
+            return
+        if shutil.which("redis-server"):
+            self.kind = "redis-server"
+            command = [
+                "redis-server",
+                "--port",
+                str(self.port),
+                "--save",
+                "",
+                "--appendonly",
+                "no",
+            ]
+        else:
+            self.kind = "fakeredis"
+            command = [sys.executable, "-c", FAKEREDIS_SERVER, str(self.port)]
+        self.process = subprocess.Popen(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        wait_for_port(self.port, self.process)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+
+class AppServer:
+    """La app corriendo con uvicorn en un subproceso aislado en 'workdir'."""
+
+    def __init__(self, workdir: Path, redis_port: int, env: dict | None = None):
+        self.workdir = workdir
+        self.port = free_port()
+        self.redis_port = redis_port
+        self.extra_env = env or {}
+        self.process = None
+        self.log = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(BACKEND_DIR),
+            "REDIS_HOST": "127.0.0.1",
+            "REDIS_PORT": str(self.redis_port),
+            "DATABASE_PATH": str(self.workdir / "bench.db"),
+            "STORAGE_QUOTA_BYTES": "0",
+            **self.extra_env,
+        }
+        self.log = open(self.workdir / "server.log", "wb")  # noqa: SIM115 se cierra en stop
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "main:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(self.port),
+                "--log-level",
+                "warning",
+                "--no-access-log",
+            ],
+            cwd=self.workdir,
+            env=env,
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+        wait_for_port(self.port, self.process, timeout=60)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+        if self.log is not None:
+            self.log.close()
+
+    def reset_peak_rss(self):
+        """Reinicia VmHWM (Linux) para medir el pico de cada escenario por separado."""
+        try:
+            Path(f"/proc/{self.process.pid}/clear_refs").write_text("5")
+        except OSError:
+            pass
+
+    def peak_rss_mib(self) -> float | None:
+        """Pico de memoria residente del servidor en MiB (None fuera de Linux)."""
+        try:
+            for line in (
+                Path(f"/proc/{self.process.pid}/status").read_text().splitlines()
+            ):
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+
+def public_pem(private_pem: str) -> str:
+    key = serialization.load_pem_private_key(private_pem.encode(), password=None)
+    return (
+        key.public_key()
+        .public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+
+
+async def setup_users(client: httpx.AsyncClient, count: int) -> list[dict]:
+    """Registra los usuarios de la prueba, inicia sesión y genera sus llaves."""
+    users = []
+    for i in range(count):
+        email = f"bench{i}@example.com"
+        response = await client.post(
+            "/auth/register",
+            json={
+                "email": email,
+                "password": PASSWORD,
+                "name": "Bench",
+                "surname": "User",
+                "birthdate": "2000-01-01",
+            },
+        )
+        if response.status_code not in (201, 409):
+            response.raise_for_status()
+
+        response = await client.post(
+            "/auth/login", json={"email": email, "password": PASSWORD}
+        )
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['jwt_token']}"}
+
+        response = await client.post("/auth/generate-keys", headers=headers)
+        response.raise_for_status()
+        keys = response.json()
+        private_keys = {
+            alg: keys[f"{alg}_private_key"] for alg in ("rsa", "ecc", "ed25519")
+        }
+        users.append(
+            {
+                "email": email,
+                "headers": headers,
+                "private_keys": private_keys,
+                "public_keys": {
+                    alg: public_pem(pem) for alg, pem in private_keys.items()
+                },
+            }
+        )
+    return users
+
+
+def build_request(
+    scenario: str, users: list[dict], size: int, algorithm: str, hash_algorithm: str
+):
+    """Retorna la función asíncrona que ejecuta una petición del escenario."""
+    payload = os.urandom(size) if scenario != "login" else b""
+    shared_name = f"bench-{size}-{algorithm}.bin"
+
+    async def login(client, worker):
+        user = users[worker % len(users)]
+        response = await client.post(
+            "/auth/login", json={"email": user["email"], "password": PASSWORD}
+        )
+        return response.status_code == 200, 0
+
+    async def upload(client, worker, filename=None):
+        user = users[worker % len(users)]
+        response = await client.post(
+            "/file/upload",
+            headers=user["headers"],
+            files={
+                "file": (filename or f"bench-{size}-{algorithm}-{worker}.bin", payload)
+            },
+            data={
+                "sign": "true",
+                "method": algorithm,
+                "private_key": user["private_keys"][algorithm],
+                "hash_algorithm": hash_algorithm,
+            },
+        )
+        return response.status_code == 200, size
+
+    async def download(client, worker):
+        user = users[worker % len(users)]
+        received = 0
+        async with client.stream(
+            "GET",
+            f"/file/archivos/{user['email']}/{shared_name}/descargar",
+            headers=user["headers"],
+        ) as response:
+            async for chunk in response.aiter_raw():
+                received += len(chunk)
+        return response.status_code == 200 and received > 0, received
+
+    async def verify(client, worker):
+        user = users[worker % len(users)]
+        response = await client.post(
+            "/file/verificar",
+            files={"file": (shared_name, payload)},
+            data={
+                "user_email": user["email"],
+                "public_key": user["public_keys"][algorithm],
+                "algorithm": algorithm,
+            },
+        )
+        return response.status_code == 200, size
+
+    async def prepare(client):
+        """Sube el archivo que usan la descarga y la verificación."""
+        if scenario in ("download", "verify"):
+            for worker in range(len(users)):
+                ok, _ = await upload(client, worker, filename=shared_name)
+                if not ok:
+                    raise RuntimeError("No se pudo subir el archivo de preparación")
+
+    request = {"login": login, "upload": upload, "download": download, "verify": verify}
+    return request[scenario], prepare
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    request,
+    concurrency: int,
+    duration: float,
+    max_requests: int | None,
+) -> dict:
+    """Ejecuta el escenario con 'concurrency' workers hasta agotar tiempo o pedidos."""
+    latencies = []
+    errors = 0
+    transferred = 0
+    issued = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int):
+        nonlocal errors, transferred, issued
+        while time.perf_counter() < deadline and (
+            max_requests is None or issued < max_requests
+        ):
+            issued += 1
+            start = time.perf_counter()
+            try:
+                ok, size = await request(client, worker_id)
+            except httpx.HTTPError:
+                ok, size = False, 0
+            latencies.append(time.perf_counter() - start)
+            if ok:
+                transferred += size
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "throughput_mib_s": round(transferred / elapsed / 1024**2, 2)
+        if elapsed
+        else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, server: AppServer) -> list[dict]:
+    results = []
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    async with httpx.AsyncClient(
+        base_url=server.base_url, limits=limits, timeout=300
+    ) as client:
+        users = await setup_users(client, args.users)
+
+        for scenario in args.scenarios:
+            # El login no depende del tamaño ni del algoritmo
+            combinations = (
+                [(0, "-")]
+                if scenario == "login"
+                else [
+                    (size, alg) for size in args.file_sizes for alg in args.algorithms
+                ]
+            )
+            for size, algorithm in combinations:
+                request, prepare = build_request(
+                    scenario, users, size, algorithm, args.hash_algorithm
+                )
+                await prepare(client)
+                server.reset_peak_rss()
+                stats = await run_scenario(
+                    client, request, args.concurrency, args.duration, args.requests
+                )
+                result = {
+                    "scenario": scenario,
+                    "file_size": size,
+                    "algorithm": algorithm,
+                    "concurrency": args.concurrency,
+                    **stats,
+                    "peak_rss_mib": server.peak_rss_mib(),
+                }
+                results.append(result)
+                latency = result["latency_ms"]
+                rss = result["peak_rss_mib"] or 0
+                print(
+                    f"{scenario:<9}{format_size(size) if size else '-':>6} "
+                    f"{algorithm:<8}{result['rps']:>9.1f} rps"
+                    f"  p50 {latency['p50']:>8.1f} ms  p95 {latency['p95']:>8.1f} ms"
+                    f"  p99 {latency['p99']:>8.1f} ms"
+                    f"  err {result['errors']:>4}  rss {rss:>6.1f} MiB",
+                    file=sys.stderr,
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--duration", type=float, default=10, help="Segundos por escenario"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=None, help="Máximo de peticiones por escenario"
+    )
+    parser.add_argument("--file-sizes", default="1K,1M")
+    parser.add_argument("--algorithms", default="ed25519,ecc,rsa")
+    parser.add_argument("--hash-algorithm", default="sha256")
+    parser.add_argument(
+        "--redis-port", type=int, default=None, help="Usar un Redis ya levantado"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=None, help="Archivo JSON de resultados"
+    )
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+    args.file_sizes = [parse_size(s) for s in args.file_sizes.split(",")]
+    args.algorithms = [a.strip() for a in args.algorithms.split(",")]
+
+    workdir = Path(tempfile.mkdtemp(prefix="loadtest-"))
+    redis = LocalRedis(args.redis_port)
+    max_size = max(args.file_sizes)
+    server = AppServer(
+        workdir,
+        redis.port,
+        env={
+            "MAX_UPLOAD_BYTES": str(max_size + 1024),
+            "MAX_REQUEST_BYTES": str(max_size + 1024**2),
+        },
+    )
+    try:
+        redis.start()
+        server.start()
+        results = asyncio.run(run(args, server))
+    finally:
+        server.stop()
+        redis.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "redis": redis.kind,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "hash_algorithm": args.hash_algorithm,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
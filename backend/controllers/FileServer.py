@@ -1,84 +1,387 @@
+import logging
+import os
+from collections.abc import AsyncIterator
+from functools import partial
 from pathlib import Path
-from fastapi import UploadFile, HTTPException
-from cryptography.hazmat.primitives import serialization
-from controllers.keys import sign_file_with_rsa, sign_file_with_ecc, save_hash
-import aiofiles
 
-BASE_DIR = Path("FileSection")
+from fastapi import HTTPException, UploadFile
 
+from controllers import fs
+from controllers.hashing import DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS, get_hasher
+from controllers.jobs import job_handler
+from controllers.keys import (
+    DEFAULT_SIGNING_METHOD,
+    save_hash_digest,
+    sign_file_with_ecc,
+    sign_file_with_ed25519,
+    sign_file_with_rsa,
+)
+from controllers.layout import BASE_DIR, SIGNING_METHODS, storage_path
+from controllers.progress import UploadProgress
+from controllers.quota import adjust_storage, reserve_storage
+from controllers.storage import is_data_file, path_lock, stored_size, write_stream
+from monitoring import span
 
-async def save_user_file(
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo de un archivo subido en bytes
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Jobs de firma de subidas que un proceso ejecuta a la vez (usan CPU)
+UPLOAD_JOB_CONCURRENCY = int(os.getenv("UPLOAD_JOB_CONCURRENCY", "2"))
+
+
+async def upload_chunks(
+    file: UploadFile, max_bytes: int | None = None
+) -> AsyncIterator[bytes]:
+    """
+    Lee un archivo subido por bloques sin cargarlo completo en memoria.
+
+    Lanza 413 en cuanto se supera 'max_bytes' (MAX_UPLOAD_BYTES por defecto).
+    """
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    total = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        total += len(chunk)
+        if total > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"El archivo excede el tamaño máximo de {max_bytes} bytes.",
+            )
+        yield chunk
+
+
+async def store_user_file(
     file: UploadFile,
     user_email: str,
+    hash_algorithm: str | None = None,
+    progress: UploadProgress = None,
     sign: bool = False,
-    method: str = None,
-    private_key: str = None,
+    method: str | None = None,
 ) -> dict:
     """
-    Guarda el archivo en una carpeta del usuario. Opcionalmente:
-    - Genera el hash (siempre)
-    - Firma el archivo (si sign=True y se provee clave y método)
+    Guarda el contenido del archivo en la carpeta del usuario (durable según
+    FSYNC_POLICY), calcula su hash en la misma pasada y escribe su sidecar de hash.
+
+    El archivo y su hash se reemplazan bajo el lock de la ruta, así que nunca
+    queda la versión nueva junto al hash o las firmas de la anterior. La firma la
+    escribe después finalize_user_file.
+
+    :return: {'file_path', 'hash_path', 'hash_algorithm', 'codec', 'generation'}
     """
-    user_dir = BASE_DIR / user_email
-    user_dir.mkdir(parents=True, exist_ok=True)
+    hash_algorithm = (hash_algorithm or DEFAULT_HASH_ALGORITHM).lower()
+    if sign and not method:
+        method = DEFAULT_SIGNING_METHOD
+    if hash_algorithm not in HASH_ALGORITHMS:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                "Algoritmo de hash inválido. Usa uno de: "
+                f"{', '.join(sorted(HASH_ALGORITHMS))}."
+            ),
+        )
+
+    # 'x.rsa.sig' o 'x.codec' se confundirían con los auxiliares del archivo 'x'
+    if not is_data_file(file.filename):
+        raise HTTPException(
+            status_code=400,
+            detail="Nombre de archivo reservado para hashes, firmas y codecs.",
+        )
+
+    # Rechazo temprano si el tamaño declarado ya excede el límite
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El archivo excede el tamaño máximo de {MAX_UPLOAD_BYTES} bytes.",
+        )
+
+    # Carpeta sharded del archivo (o la del formato anterior si ya existía ahí)
+    file_path = await fs.run(storage_path, BASE_DIR / user_email, file.filename)
+    await fs.mkdir(file_path.parent, parents=True, exist_ok=True)
+
+    # Lock por ruta: dos subidas del mismo archivo no intercalan datos y sidecars
+    async with path_lock(file_path):
+        # Se reserva la cuota antes de escribir; al sobrescribir cuenta la diferencia
+        previous_size = stored_size(file_path)
+        reserved = (file.size or 0) - previous_size
+        with span("upload.reserve_quota", {"quota.bytes": reserved}):
+            reserve_storage(user_email, reserved)
 
-    file_path = user_dir / file.filename
+        try:
+            # Se guarda por bloques (comprimido si está habilitado y es compresible)
+            # y el hash se calcula en la misma pasada sobre el contenido original
+            with span("upload.write", {"hash.algorithm": hash_algorithm}) as write_span:
+                hasher = get_hasher(hash_algorithm)
+                on_chunk = hasher.update
+                if progress is not None:
+                    progress.update("storing", stored=0)
 
+                    def on_chunk(chunk: bytes):
+                        hasher.update(chunk)
+                        progress.advance("stored", len(chunk))
+
+                stored = await write_stream(
+                    file_path, upload_chunks(file), on_chunk=on_chunk
+                )
+                write_span.set_attributes(
+                    {
+                        "file.bytes": stored["size"],
+                        "file.stored_bytes": stored["stored_size"],
+                        "storage.codec": stored["codec"] or "none",
+                    }
+                )
+        except HTTPException:
+            adjust_storage(user_email, -reserved)
+            raise
+        except Exception as e:
+            adjust_storage(user_email, -reserved)
+            raise HTTPException(
+                status_code=500, detail=f"Error al guardar archivo: {e}"
+            )
+
+        # Se corrige la reserva con lo que realmente ocupa el archivo en disco
+        adjust_storage(user_email, stored["stored_size"] - previous_size - reserved)
+
+        # Guardar el hash del archivo (siempre sobre el contenido original) y
+        # quitar el hash y las firmas que quedaban de la versión anterior
+        with span("upload.save_hash", {"hash.algorithm": hash_algorithm}):
+            hash_path = await save_hash_digest(
+                hasher.hexdigest(),
+                file_path,
+                method if sign else hash_algorithm,
+                hash_algorithm,
+            )
+        for removed in await fs.run(remove_stale_sidecars, file_path, hash_path):
+            fs.invalidate(removed)
+        generation = await fs.run(file_generation, file_path)
+
+    return {
+        "file_path": str(file_path),
+        "hash_path": hash_path,
+        "hash_algorithm": hash_algorithm,
+        "codec": stored["codec"],
+        "generation": generation,
+    }
+
+
+def remove_stale_sidecars(file_path: str | Path, keep: str | Path) -> list[Path]:
+    """
+    Borra los sidecars de hash y firma de 'file_path' salvo 'keep'.
+    Retorna los borrados.
+
+    'a.b.hash' y 'a.b.sig' son de 'a' salvo que exista el archivo 'a.b'.
+    """
+    file_path, keep = Path(file_path), Path(keep)
+    name = file_path.name
+    candidates = []
+    for method in (*SIGNING_METHODS, *HASH_ALGORITHMS):
+        if file_path.with_name(f"{name}.{method}").is_file():
+            continue
+        candidates.append(file_path.with_name(f"{name}.{method}.hash"))
+        candidates.append(file_path.with_name(f"{name}.{method}.sig"))
+
+    removed = []
+    for candidate in candidates:
+        if candidate == keep:
+            continue
+        try:
+            candidate.unlink()
+        except FileNotFoundError:
+            continue
+        removed.append(candidate)
+    return removed
+
+
+def file_generation(file_path: str) -> str:
+    """Identifica la versión del archivo: cada subida lo reemplaza por otro inodo."""
+    stat = os.stat(file_path)
+    return f"{stat.st_ino}:{stat.st_mtime_ns}"
+
+
+def load_signing_key(private_key: str, method: str | None = None):
+    """
+    Carga la clave privada PEM de una subida firmada y comprueba que sea del
+    algoritmo de 'method' (Ed25519 si no se indica).
+
+    Lanza HTTPException(400) si falta, no se puede cargar o es de otro algoritmo:
+    una clave RSA o ECC con method=ed25519 fallaría después dentro del firmador.
+    """
+    method = method or DEFAULT_SIGNING_METHOD
+    if method not in SIGNING_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail="Método de firma inválido. Usa 'rsa', 'ecc' o 'ed25519'.",
+        )
+    if not private_key:
+        raise HTTPException(
+            status_code=400,
+            detail="Se requiere método de firma y clave privada si sign=True.",
+        )
+
+    # 🔧 Limpiar y cargar la clave privada
     try:
-        async with aiofiles.open(file_path, "wb") as f:
-            content = await file.read()
-            await f.write(content)
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+        with span("upload.load_private_key", {"crypto.algorithm": method}):
+            cleaned_key = private_key.replace("\\n", "\n").encode()
+            key = serialization.load_pem_private_key(cleaned_key, password=None)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al guardar archivo: {e}")
+        raise HTTPException(
+            status_code=400, detail=f"Error al cargar la clave privada: {e}"
+        )
 
-    try:
-        async with aiofiles.open(file_path, "rb") as f:
-            file_data = await f.read()
-
-        # Generar el hash del archivo
-        hash_path = (
-            await save_hash(file_data, str(file_path), method)
-            if method
-            else await save_hash(file_data, str(file_path), "sha256")
+    key_types = {
+        "rsa": rsa.RSAPrivateKey,
+        "ecc": ec.EllipticCurvePrivateKey,
+        "ed25519": ed25519.Ed25519PrivateKey,
+    }
+    if not isinstance(key, key_types[method]):
+        raise HTTPException(
+            status_code=400,
+            detail=f"La clave privada no corresponde al método de firma '{method}'.",
         )
+    return key
+
+
+async def finalize_user_file(
+    file_path: str,
+    hash_path: str,
+    hash_algorithm: str,
+    codec: str | None = None,
+    generation: str | None = None,
+    sign: bool = False,
+    method: str | None = None,
+    private_key: str | None = None,
+    progress: UploadProgress = None,
+) -> dict:
+    """
+    Firma un archivo ya guardado por store_user_file si sign=True (el método por
+    defecto es Ed25519). Reporta los bytes firmados en 'progress'.
+
+    Si el archivo se volvió a subir desde 'generation', no hace nada: la subida
+    más reciente escribe sus propios sidecars.
+    """
+    if sign and not method:
+        method = DEFAULT_SIGNING_METHOD
+
+    async with path_lock(file_path):
+        if generation and await fs.run(file_generation, file_path) != generation:
+            return {
+                "message": "El archivo fue reemplazado por una subida posterior",
+                "file_path": file_path,
+                "superseded": True,
+            }
 
         response = {
             "message": "Archivo subido exitosamente",
-            "file_path": str(file_path),
+            "file_path": file_path,
             "hash_path": hash_path,
+            "hash_algorithm": hash_algorithm,
+            "codec": codec,
         }
 
         if sign:
-            if not method or not private_key:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Se requiere método de firma y clave privada si sign=True.",
-                )
-            print("private_key\n", private_key)
-            # 🔧 Limpiar y cargar la clave privada
-            try:
-                cleaned_key = private_key.replace("\\n", "\n").encode()
-                key = serialization.load_pem_private_key(cleaned_key, password=None)
-            except Exception as e:
-                raise HTTPException(
-                    status_code=400, detail=f"Error al cargar la clave privada: {e}"
-                )
+            key = load_signing_key(private_key, method)
+
+            on_bytes = None
+            if progress is not None:
+                progress.update("signing", signed=0, method=method)
+                on_bytes = partial(progress.advance, "signed")
 
             if method == "rsa":
-                signature_path, _ = await sign_file_with_rsa(str(file_path), key)
+                signature_path, _ = await sign_file_with_rsa(
+                    file_path, key, hash_algorithm, on_bytes
+                )
                 response["rsa_signature"] = signature_path
             elif method == "ecc":
-                signature_path, _ = await sign_file_with_ecc(str(file_path), key)
+                signature_path, _ = await sign_file_with_ecc(
+                    file_path, key, hash_algorithm, on_bytes
+                )
                 response["ecc_signature"] = signature_path
             else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Método de firma inválido. Usa 'rsa' o 'ecc'.",
+                signature_path, _ = await sign_file_with_ed25519(
+                    file_path, key, hash_algorithm, on_bytes
                 )
+                response["ed25519_signature"] = signature_path
 
         return response
 
+
+async def save_user_file(
+    file: UploadFile,
+    user_email: str,
+    sign: bool = False,
+    method: str | None = None,
+    private_key: str | None = None,
+    hash_algorithm: str | None = None,
+    progress: UploadProgress = None,
+) -> dict:
+    """
+    Guarda el archivo en una carpeta del usuario. Opcionalmente:
+    - Genera el hash (siempre, con el algoritmo elegido o el por defecto)
+    - Firma el archivo (si sign=True y se provee clave; por defecto con Ed25519)
+    - Reporta los bytes guardados y firmados en 'progress'
+
+    Hace todo en la petición; /file/upload en cambio deja la firma a la
+    cola de jobs (ver finalize_upload_job).
+    """
+    stored = await store_user_file(
+        file, user_email, hash_algorithm, progress, sign=sign, method=method
+    )
+    try:
+        return await finalize_user_file(
+            stored["file_path"],
+            stored["hash_path"],
+            stored["hash_algorithm"],
+            stored["codec"],
+            sign=sign,
+            method=method,
+            private_key=private_key,
+            progress=progress,
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error durante proceso de hash o firma: {e}"
         )
+
+
+def _upload_job_failed(payload: dict, error: str):
+    if payload.get("upload_id"):
+        progress = UploadProgress(
+            payload["user_email"], payload["upload_id"], resume=True
+        )
+        progress.fail(f"Error durante proceso de hash o firma: {error}")
+
+
+@job_handler(
+    "upload.finalize",
+    concurrency=UPLOAD_JOB_CONCURRENCY,
+    on_failure=_upload_job_failed,
+)
+async def finalize_upload_job(payload: dict) -> dict:
+    """
+    Job que termina una subida guardada con store_user_file: la firma.
+
+    payload: user_email, upload_id (opcional), file_path, hash_path, hash_algorithm,
+    codec, generation, sign, method, private_key.
+    """
+    progress = None
+    if payload.get("upload_id"):
+        progress = UploadProgress(
+            payload["user_email"], payload["upload_id"], resume=True
+        )
+    result = await finalize_user_file(
+        payload["file_path"],
+        payload["hash_path"],
+        payload["hash_algorithm"],
+        payload.get("codec"),
+        payload.get("generation"),
+        sign=payload.get("sign", False),
+        method=payload.get("method"),
+        private_key=payload.get("private_key"),
+        progress=progress,
+    )
+    if progress is not None:
+        progress.finish(result)
+    return result
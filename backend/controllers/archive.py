@@ -0,0 +1,205 @@
+import asyncio
+import io
+import tarfile
+import time
+import zipfile
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+from fastapi import HTTPException
+
+from controllers.layout import find_stored_file, iter_stored_files
+from controllers.storage import (
+    CODEC_SUFFIX,
+    READ_CHUNK_SIZE,
+    CorruptedFileError,
+    is_data_file,
+    is_sidecar,
+    iter_file,
+    original_size,
+)
+
+ARCHIVE_FORMATS = {"zip": "application/zip", "tar": "application/x-tar"}
+
+# Extensiones de formatos que ya están comprimidos: se guardan sin deflate (ZIP_STORED)
+COMPRESSED_EXTENSIONS = frozenset(
+    {
+        # Archivos comprimidos y paquetes
+        ".7z", ".apk", ".br", ".bz2", ".gz", ".jar", ".lz4", ".rar", ".tgz",
+        ".whl", ".xz", ".zip", ".zst",
+        # Imágenes, audio y video
+        ".avif", ".gif", ".heic", ".jpeg", ".jpg", ".png", ".webp",
+        ".aac", ".flac", ".m4a", ".mp3", ".ogg", ".opus",
+        ".avi", ".mkv", ".mov", ".mp4", ".webm",
+        # Documentos que internamente son zip
+        ".docx", ".epub", ".odt", ".pptx", ".xlsx",
+        ".woff", ".woff2",
+    }
+)  # fmt: skip
+
+
+def is_compressed_format(filename: str) -> bool:
+    """Indica si la extensión del archivo corresponde a un formato ya comprimido."""
+    return Path(filename).suffix.lower() in COMPRESSED_EXTENSIONS
+
+
+def sidecar_files(user_dir: Path, filename: str) -> list[Path]:
+    """
+    Retorna los archivos de hash y firma de un archivo subido
+    ('<archivo>.<método>.sig', ...).
+
+    El .codec se omite: describe el formato en disco, no el contenido del archivo.
+    """
+    prefix = f"{filename}."
+    sidecars = []
+    for candidate in sorted(user_dir.iterdir()):
+        name = candidate.name
+        rest = name[len(prefix) :]
+        if (
+            name.startswith(prefix)
+            and is_sidecar(name)
+            and not name.endswith(CODEC_SUFFIX)
+            # 'a.b.rsa.sig' es de 'a.b', no de 'a'
+            and rest.count(".") <= 1
+        ):
+            sidecars.append(candidate)
+    return sidecars
+
+
+def collect_archive_entries(
+    user_dir: Path, filenames: list[str] | None = None, include_sidecars: bool = False
+) -> list[tuple[Path, str]]:
+    """
+    Resuelve los archivos a incluir en un archivo comprimido como
+    (ruta, nombre en el archivo).
+
+    Sin 'filenames' se incluyen todos los archivos subidos del usuario.
+    """
+    if not user_dir.is_dir():
+        raise HTTPException(status_code=404, detail="Usuario sin archivos")
+
+    if filenames:
+        # Sin duplicados y en el orden pedido
+        filenames = list(dict.fromkeys(filenames))
+        for filename in filenames:
+            if "/" in filename or "\\" in filename or filename in (".", ".."):
+                raise HTTPException(
+                    status_code=400, detail=f"Nombre de archivo inválido: {filename}"
+                )
+        paths = {}
+        for filename in filenames:
+            path = (
+                find_stored_file(user_dir, filename) if is_data_file(filename) else None
+            )
+            if path is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Archivo no encontrado: {filename}"
+                )
+            paths[filename] = path
+    else:
+        paths = {path.name: path for path in iter_stored_files(user_dir)}
+        filenames = sorted(paths)
+
+    entries = []
+    for filename in filenames:
+        path = paths[filename]
+        entries.append((path, filename))
+        if include_sidecars:
+            entries.extend(
+                (sidecar, sidecar.name)
+                for sidecar in sidecar_files(path.parent, filename)
+            )
+    return entries
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Destino no posicionable de zipfile: acumula lo escrito hasta que se drena."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def iter_zip(
+    entries: list[tuple[Path, str]], chunk_size: int = READ_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Genera un zip de los archivos al vuelo, sin escribirlo en disco.
+
+    Como la salida no es posicionable, zipfile escribe los tamaños y el CRC en un
+    descriptor después de cada entrada. La memoria usada es del orden de un bloque.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for path, arcname in entries:
+            info = zipfile.ZipInfo(
+                arcname, date_time=time.localtime(path.stat().st_mtime)[:6]
+            )
+            info.external_attr = 0o644 << 16
+            # El tamaño original decide si la entrada necesita ZIP64
+            info.file_size = original_size(path)
+            store = is_compressed_format(arcname)
+            info.compress_type = zipfile.ZIP_STORED if store else zipfile.ZIP_DEFLATED
+
+            with archive.open(info, "w") as dest:
+                async for chunk in iter_file(path, chunk_size):
+                    if store:
+                        dest.write(chunk)
+                    else:
+                        # deflate es intensivo en CPU: fuera del event loop
+                        await asyncio.to_thread(dest.write, chunk)
+                    if data := buffer.drain():
+                        yield data
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+async def iter_tar(
+    entries: list[tuple[Path, str]], chunk_size: int = READ_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Genera un tar (formato POSIX/PAX) al vuelo, sin escribirlo en disco."""
+    for path, arcname in entries:
+        size = original_size(path)
+        info = tarfile.TarInfo(arcname)
+        info.size = size
+        info.mtime = int(path.stat().st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+
+        written = 0
+        async for chunk in iter_file(path, chunk_size):
+            written += len(chunk)
+            yield chunk
+        # La cabecera ya anunció el tamaño; un archivo que cambió a mitad de
+        # camino dejaría el tar desalineado
+        if written != size:
+            raise CorruptedFileError(
+                f"{arcname} cambió durante la descarga ({written} de {size} bytes)"
+            )
+
+        remainder = size % tarfile.BLOCKSIZE
+        if remainder:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+
+    # Fin del archivo: dos bloques vacíos
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def iter_archive(
+    entries: list[tuple[Path, str]], archive_format: str, chunk_size: int
+) -> AsyncIterator[bytes]:
+    """Retorna el generador del formato pedido ('zip' o 'tar')."""
+    if archive_format == "zip":
+        return iter_zip(entries, chunk_size)
+    return iter_tar(entries, chunk_size)
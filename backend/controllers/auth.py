@@ -1,54 +1,243 @@
+import asyncio
+import base64
 import hashlib
-
-from jose import jwt
-from jose.exceptions import ExpiredSignatureError
+import hmac
+import json
 import os
-from fastapi import HTTPException, Header
-
-from database import db, User
-from datetime import datetime, timedelta, timezone
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from functools import lru_cache
+from types import SimpleNamespace
+
+from fastapi import Header, HTTPException
+
+from database import User, db
+from database.queries import (
+    CREDENTIALS_BY_EMAIL,
+    DELETE_USER_BY_EMAIL,
+    INSERT_NEW_USERS,
+    USER_BY_EMAIL,
+    USER_ID_BY_EMAIL,
+)
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 
+# Alta masiva: usuarios por petición y filas por INSERT/transacción
+BULK_REGISTER_MAX_USERS = int(os.getenv("BULK_REGISTER_MAX_USERS", "10000"))
+BULK_REGISTER_CHUNK_SIZE = int(os.getenv("BULK_REGISTER_CHUNK_SIZE", "500"))
+# Bloques de contraseñas que se hashean en paralelo en el pool de hilos
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_BATCH_SIZE = 64
+# Emails que pueden usar el alta masiva (separados por comas; vacío = deshabilitada)
+BULK_REGISTER_ADMINS = frozenset(
+    email.strip().lower()
+    for email in os.getenv("BULK_REGISTER_ADMINS", "").split(",")
+    if email.strip()
+)
+# Peticiones de alta masiva por IP en la ventana del limitador de login
+BULK_REGISTER_MAX_REQUESTS = int(os.getenv("BULK_REGISTER_MAX_REQUESTS", "5"))
+JWT_ALGORITHM = "HS256"
+
+# Claims ya verificados por token, hasta su 'exp'
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "10000"))
+
+# Incluye el perfil en el token para que /auth/me no lea la fila del usuario
+JWT_EMBED_PROFILE = os.getenv("JWT_EMBED_PROFILE", "false").lower() == "true"
+PROFILE_CLAIMS = ("name", "surname", "birthdate", "storage_used")
+
+# HMAC con la llave ya procesada: cada verificación solo copia el estado inicial
+_HMAC_SHA256 = hmac.new(SECRET_KEY.encode(), digestmod=hashlib.sha256)
+
+_claims_cache: dict[str, dict] = {}
+_claims_cache_lock = threading.Lock()
+
+
+class InvalidTokenError(ValueError):
+    """El token no es un JWT HS256 válido para SECRET_KEY."""
+
+
+class ExpiredTokenError(InvalidTokenError):
+    """La firma es válida pero el token ya expiró."""
+
 
 def _generate_jwt_token(user: User) -> str:
     """Genera un JWT con el ID del usuario y una expiración de 1 hora."""
-    now = datetime.now(timezone.utc)  # <-- UTC explícito
+    from jose import jwt  # diferido: ver controllers.backends
+
+    now = datetime.now(UTC)  # <-- UTC explícito
     payload = {
         "user_id": user.email,
         "exp": int((now + timedelta(hours=1)).timestamp()),
         "iat": int(now.timestamp()),
     }
-    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+    if JWT_EMBED_PROFILE:
+        payload["profile"] = {
+            claim: getattr(user, claim, None) for claim in PROFILE_CLAIMS
+        }
+    return jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
-def verify_jwt(token: str) -> User:
-    """Verifica el JWT y devuelve el usuario asociado."""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        email = payload.get("user_id")
-
-        if not email:
-            raise HTTPException(status_code=401, detail="Token inválido: sin usuario")
+def issue_access_token(email: str) -> str:
+    """
+    Genera un JWT para el usuario sin pedir su contraseña (renovación con el
+    refresh token).
 
+    Solo consulta la base si el perfil va dentro del token. Retorna "" si el
+    usuario ya no existe.
+    """
+    if JWT_EMBED_PROFILE:
         user = get_user_by_email(email)
         if not user:
-            raise HTTPException(status_code=401, detail="Usuario no encontrado")
+            return ""
+        return _generate_jwt_token(user)
+    return _generate_jwt_token(SimpleNamespace(email=email))
 
-        return user
 
-    except ExpiredSignatureError:
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+@lru_cache(maxsize=32)
+def _is_supported_header(segment: str) -> bool:
+    """Indica si la cabecera del JWT declara HS256 (hay pocas cabeceras distintas)."""
+    try:
+        header = json.loads(_b64url_decode(segment))
+    except ValueError:
+        return False
+    return isinstance(header, dict) and header.get("alg") == JWT_ALGORITHM
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate_claims(claims: dict, now: float):
+    """
+    Valida los claims registrados como jose.jwt.decode sin 'audience' ('exp'
+    obligatorio, 'iat'/'nbf' enteros, 'sub'/'jti' de texto y sin 'aud') y, como
+    PyJWT, rechaza un 'iat' o un 'nbf' futuros.
+    """
+    if not _is_int(claims.get("exp")):
+        raise InvalidTokenError("Expiration Time claim (exp) must be an integer.")
+    if "iat" in claims:
+        if not _is_int(claims["iat"]):
+            raise InvalidTokenError("Issued At claim (iat) must be an integer.")
+        if claims["iat"] > now:
+            raise InvalidTokenError("The token is not yet valid (iat)")
+    if "nbf" in claims:
+        if not _is_int(claims["nbf"]):
+            raise InvalidTokenError("Not Before claim (nbf) must be an integer.")
+        if claims["nbf"] > now:
+            raise InvalidTokenError("The token is not yet valid (nbf)")
+    if "aud" in claims:
+        raise InvalidTokenError("Invalid audience")
+    if "sub" in claims and not isinstance(claims["sub"], str):
+        raise InvalidTokenError("Subject must be a string.")
+    if "jti" in claims and not isinstance(claims["jti"], str):
+        raise InvalidTokenError("JWT ID must be a string.")
+    if now >= claims["exp"]:
+        raise ExpiredTokenError("Signature has expired.")
+
+
+def decode_jwt(token: str) -> dict:
+    """
+    Verifica la firma HS256 y los claims registrados del token y retorna sus claims.
+
+    Equivale a jose.jwt.decode(token, SECRET_KEY, algorithms=["HS256"]) para los
+    tokens que genera _generate_jwt_token, sin pasar por jose. Los claims de un
+    token ya verificado se guardan hasta su 'exp'; el diccionario retornado es
+    compartido y no se debe modificar.
+    """
+    now = time.time()
+    claims = _claims_cache.get(token)
+    if claims is not None:
+        if now < claims["exp"]:
+            return claims
+        with _claims_cache_lock:
+            _claims_cache.pop(token, None)
+        raise ExpiredTokenError("Signature has expired.")
+
+    try:
+        header, payload, signature = token.split(".")
+        signing_input = f"{header}.{payload}".encode("ascii")
+        signature = _b64url_decode(signature)
+    except ValueError:
+        raise InvalidTokenError("Not enough segments")
+
+    if not _is_supported_header(header):
+        raise InvalidTokenError("The specified alg value is not allowed")
+
+    mac = _HMAC_SHA256.copy()
+    mac.update(signing_input)
+    if not hmac.compare_digest(mac.digest(), signature):
+        raise InvalidTokenError("Signature verification failed.")
+
+    try:
+        claims = json.loads(_b64url_decode(payload))
+    except ValueError:
+        raise InvalidTokenError("Invalid payload string")
+    if not isinstance(claims, dict):
+        raise InvalidTokenError("Invalid payload string")
+    _validate_claims(claims, now)
+
+    with _claims_cache_lock:
+        if len(_claims_cache) >= JWT_CLAIMS_CACHE_SIZE:
+            # Descarta el más antiguo (los dict conservan el orden de inserción)
+            _claims_cache.pop(next(iter(_claims_cache)), None)
+        if JWT_CLAIMS_CACHE_SIZE > 0:
+            _claims_cache[token] = claims
+    return claims
+
+
+def forget_jwt(token: str):
+    """Quita un token de la caché de claims verificados."""
+    with _claims_cache_lock:
+        _claims_cache.pop(token, None)
+
+
+def verify_jwt_claims(token: str) -> dict:
+    """Verifica el JWT y devuelve sus claims, sin consultar la base de datos."""
+    try:
+        claims = decode_jwt(token)
+    except ExpiredTokenError:
         raise HTTPException(status_code=401, detail="Token expirado")
+    except InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=f"Token inválido: {e!s}")
+
+    if not claims.get("user_id") or not isinstance(claims["user_id"], str):
+        raise HTTPException(status_code=401, detail="Token inválido: sin usuario")
+    return claims
+
+
+def verify_jwt(token: str) -> User:
+    """Verifica el JWT y devuelve el usuario asociado."""
+    claims = verify_jwt_claims(token)
+    try:
+        user = get_user_by_email(claims["user_id"])
     except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Token inválido: {str(e)}")
+        raise HTTPException(status_code=401, detail=f"Token inválido: {e!s}")
+    if not user:
+        raise HTTPException(status_code=401, detail="Usuario no encontrado")
+    return user
 
 
-def get_current_user(authorization: str = Header(...)) -> User:
-    """Obtiene el usuario actual a partir del JWT en el encabezado de autorización."""
+def _bearer_token(authorization: str) -> str:
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=400, detail="Formato de autorización inválido")
-    token = authorization.split(" ")[1]
-    return verify_jwt(token)
+    return authorization.split(" ")[1]
+
+
+def get_current_user(authorization: str = Header(...)) -> User:
+    """Obtiene el usuario actual a partir del JWT en el encabezado de autorización."""
+    return verify_jwt(_bearer_token(authorization))
+
+
+def get_current_claims(authorization: str = Header(...)) -> dict:
+    """Obtiene los claims del JWT del encabezado de autorización sin ir a la base."""
+    return verify_jwt_claims(_bearer_token(authorization))
 
 
 """
@@ -64,17 +253,23 @@ def _hash_password(password: str) -> str:
 
 
 def get_user_by_email(email: str) -> User:
-    """Obtiene un usuario por su correo electrónico."""
+    """Obtiene un usuario por su correo electrónico (sin cargar las llaves públicas)."""
     with db.read() as session:
-        return session.query(User).filter_by(email=email).first()
+        return session.scalar(USER_BY_EMAIL, {"email": email})
+
+
+def user_exists(email: str) -> bool:
+    """Indica si el usuario existe, leyendo solo el índice de email."""
+    with db.read() as session:
+        return session.scalar(USER_ID_BY_EMAIL, {"email": email}) is not None
 
 
 def register(
     email: str,
     password: str,
-    name: str = None,
-    surname: str = None,
-    birthdate: str = None,
+    name: str | None = None,
+    surname: str | None = None,
+    birthdate: str | None = None,
 ) -> User:
     """Crea un nuevo usuario con la contraseña hasheada usando SHA-256."""
     hashed_password = _hash_password(password)
@@ -92,37 +287,81 @@ def register(
         return user
 
 
+def _hash_batch(passwords: list[str]) -> list[str]:
+    return [_hash_password(password) for password in passwords]
+
+
+async def hash_passwords(passwords: list[str]) -> list[str]:
+    """
+    Hashea un lote de contraseñas (ver _hash_password) fuera del event loop.
+
+    Se reparte en bloques de PASSWORD_HASH_BATCH_SIZE que corren en el pool de
+    hilos, con a lo sumo PASSWORD_HASH_WORKERS a la vez. Conserva el orden.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+
+    async def hash_batch(batch: list[str]) -> list[str]:
+        async with semaphore:
+            return await loop.run_in_executor(None, _hash_batch, batch)
+
+    batches = await asyncio.gather(
+        *(
+            hash_batch(passwords[start : start + PASSWORD_HASH_BATCH_SIZE])
+            for start in range(0, len(passwords), PASSWORD_HASH_BATCH_SIZE)
+        )
+    )
+    return [hashed for batch in batches for hashed in batch]
+
+
+def register_many(users: list[dict]) -> set[str]:
+    """
+    Inserta usuarios con la contraseña ya hasheada en una sola transacción.
+
+    Los emails ya registrados se omiten sin abortar el lote.
+
+    :return: Emails insertados.
+    """
+    if not users:
+        return set()
+    with db.write() as session:
+        return set(session.scalars(INSERT_NEW_USERS, users))
+
+
 def login(email: str, password: str) -> tuple[str, str]:
     """Inicia sesión y devuelve email + token si las credenciales son válidas."""
 
-    with db.write() as session:
-        user = session.query(User).filter_by(email=email).first()
+    with db.read() as session:
+        if JWT_EMBED_PROFILE:
+            # El perfil completo va dentro del token
+            credentials = session.scalar(USER_BY_EMAIL, {"email": email})
+        else:
+            # Solo las columnas del login
+            credentials = session.execute(
+                CREDENTIALS_BY_EMAIL, {"email": email}
+            ).first()
 
-        if not user or user.password != _hash_password(password):
-            return "", ""
+    if not credentials or credentials.password != _hash_password(password):
+        return "", ""
 
-        token = _generate_jwt_token(user)
-        return user.email, token
+    token = _generate_jwt_token(credentials)
+    return credentials.email, token
 
 
 def delete_user(email: str) -> bool:
     """Elimina el usuario por email."""
     with db.write() as session:
-        user = session.query(User).filter_by(email=email).first()
-        if not user:
-            return False
-        session.delete(user)
-        session.commit()
-        return True
+        result = session.execute(DELETE_USER_BY_EMAIL, {"email": email})
+    return result.rowcount > 0
 
 
 def update(
-    id: str = None,
-    email: str = None,
-    password: str = None,
-    name: str = None,
-    surname: str = None,
-    birthdate: str = None,
+    id: str | None = None,
+    email: str | None = None,
+    password: str | None = None,
+    name: str | None = None,
+    surname: str | None = None,
+    birthdate: str | None = None,
 ) -> User:
     """
     Actualiza un usuario con la contraseña hasheada usando SHA-256.
@@ -136,7 +375,7 @@ def update(
     :return: Usuario actualizado o None si no se encuentra.
     """
     with db.write() as session:
-        user = session.query(User).filter_by(email=id).first()
+        user = session.scalar(USER_BY_EMAIL, {"email": id})
 
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
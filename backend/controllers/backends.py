@@ -0,0 +1,42 @@
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Módulos que el resto del código importa de forma diferida (dentro de funciones)
+CRYPTO_MODULES = (
+    "cryptography.exceptions",
+    "cryptography.hazmat.primitives.serialization",
+    "cryptography.hazmat.primitives.hashes",
+    "cryptography.hazmat.primitives.asymmetric.rsa",
+    "cryptography.hazmat.primitives.asymmetric.ec",
+    "cryptography.hazmat.primitives.asymmetric.ed25519",
+    "cryptography.hazmat.primitives.asymmetric.padding",
+    "cryptography.hazmat.primitives.asymmetric.utils",
+    "jose.jwt",
+)
+
+_loaded = threading.Event()
+
+
+def load_crypto_backends():
+    """
+    Importa cryptography y python-jose por adelantado.
+
+    El lifespan lo ejecuta en un hilo después de arrancar, para que la primera
+    petición que firma o valida un JWT no pague el costo de importación.
+    """
+    start = time.perf_counter()
+    for name in CRYPTO_MODULES:
+        importlib.import_module(name)
+    _loaded.set()
+    logger.info(
+        f"Backends criptográficos cargados en {time.perf_counter() - start:.3f} s"
+    )
+
+
+def crypto_backends_loaded() -> bool:
+    return _loaded.is_set()
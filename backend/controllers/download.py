@@ -0,0 +1,199 @@
+import asyncio
+import mmap
+import os
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import aiofiles
+from fastapi.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from monitoring import DOWNLOAD_BYTES, DOWNLOAD_THROUGHPUT, span
+
+# Tamaño de cada bloque enviado cuando el servidor no soporta envío sin copias
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(256 * 1024)))
+
+# Extensiones ASGI de envío sin copias (https://asgi.readthedocs.io/en/latest/extensions.html)
+ZEROCOPY_EXTENSION = "http.response.zerocopy"
+PATHSEND_EXTENSION = "http.response.pathsend"
+
+
+def record_download(mode: str, sent_bytes: int, elapsed: float):
+    """Registra los bytes y el rendimiento (bytes/s) de una descarga."""
+    DOWNLOAD_BYTES.inc(sent_bytes, mode=mode)
+    if sent_bytes and elapsed > 0:
+        DOWNLOAD_THROUGHPUT.observe(sent_bytes / elapsed, mode=mode)
+
+
+async def metered_stream(
+    chunks: AsyncIterator[bytes], mode: str
+) -> AsyncIterator[bytes]:
+    """Reenvía los bloques de una descarga por streaming y registra su rendimiento."""
+    started = time.perf_counter()
+    sent_bytes = 0
+    try:
+        async for chunk in chunks:
+            sent_bytes += len(chunk)
+            yield chunk
+    finally:
+        record_download(mode, sent_bytes, time.perf_counter() - started)
+
+
+def _map_file(path: str | Path) -> mmap.mmap:
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, "madvise"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    return mapped
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    FileResponse que entrega el archivo sin copiarlo en Python cuando el servidor
+    lo permite.
+
+    Según las extensiones ASGI que anuncie el servidor:
+
+    - 'http.response.zerocopy': se le pasa el archivo abierto y el kernel lo envía
+      con sendfile.
+    - 'http.response.pathsend': se le pasa la ruta (solo respuestas completas).
+    - Sin extensiones (uvicorn): el archivo se mapea en memoria y se envía por bloques
+      de DOWNLOAD_CHUNK_SIZE, sin una lectura en un hilo por bloque.
+
+    Los archivos se reemplazan con un rename atómico, así que el inodo mapeado no se
+    trunca mientras se envía. Las peticiones HEAD y los rangos múltiples usan la
+    implementación de FileResponse.
+    """
+
+    chunk_size = DOWNLOAD_CHUNK_SIZE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.extensions = scope.get("extensions") or {}
+        await super().__call__(scope, receive, send)
+
+    async def _handle_simple(self, send: Send, send_header_only: bool):
+        if send_header_only:
+            await super()._handle_simple(send, send_header_only)
+            return
+        size = int(self.headers["content-length"])
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        await self._send_file(send, 0, size, whole=True)
+
+    async def _handle_single_range(
+        self, send: Send, start: int, end: int, file_size: int, send_header_only: bool
+    ):
+        if send_header_only:
+            await super()._handle_single_range(
+                send, start, end, file_size, send_header_only
+            )
+            return
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send(
+            {"type": "http.response.start", "status": 206, "headers": self.raw_headers}
+        )
+        await self._send_file(send, start, end)
+
+    async def _send_file(self, send: Send, start: int, end: int, whole: bool = False):
+        if ZEROCOPY_EXTENSION in self.extensions:
+            mode = "zerocopy"
+        elif whole and PATHSEND_EXTENSION in self.extensions:
+            mode = "pathsend"
+        else:
+            mode = "mmap"
+
+        started = time.perf_counter()
+        with span(
+            "download.send", {"download.mode": mode, "file.bytes": end - start}
+        ) as send_span:
+            if mode == "zerocopy":
+                f = await asyncio.to_thread(open, self.path, "rb")
+                try:
+                    await send(
+                        {
+                            "type": ZEROCOPY_EXTENSION,
+                            "file": f,
+                            "offset": start,
+                            "count": end - start,
+                            "more_body": False,
+                        }
+                    )
+                finally:
+                    f.close()
+            elif mode == "pathsend":
+                await send(
+                    {
+                        "type": PATHSEND_EXTENSION,
+                        "path": str(Path(self.path).absolute()),
+                    }
+                )
+            else:
+                mode = await self._send_mapped(send, start, end)
+                send_span.set_attribute("download.mode", mode)
+        record_download(mode, end - start, time.perf_counter() - started)
+
+    async def _send_mapped(self, send: Send, start: int, end: int) -> str:
+        """Envía [start, end) desde un mapeo en memoria; retorna el modo usado."""
+        if start == end:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return "mmap"
+
+        try:
+            mapped = await asyncio.to_thread(_map_file, self.path)
+        except (OSError, ValueError):
+            # Sistemas de archivos sin soporte de mmap
+            await self._send_read(send, start, end)
+            return "read"
+
+        with mapped:
+            # El tamaño anunciado viene del stat previo a abrir el archivo
+            end = min(end, len(mapped))
+            if start >= end:
+                await send(
+                    {"type": "http.response.body", "body": b"", "more_body": False}
+                )
+                return "mmap"
+            offset = start
+            while offset < end:
+                next_offset = min(offset + self.chunk_size, end)
+                if next_offset < end and hasattr(mapped, "madvise"):
+                    # Lectura anticipada del siguiente bloque mientras se envía este
+                    aligned = next_offset - next_offset % mmap.PAGESIZE
+                    mapped.madvise(
+                        mmap.MADV_WILLNEED,
+                        aligned,
+                        min(self.chunk_size, end - next_offset) + next_offset - aligned,
+                    )
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": mapped[offset:next_offset],
+                        "more_body": next_offset < end,
+                    }
+                )
+                offset = next_offset
+        return "mmap"
+
+    async def _send_read(self, send: Send, start: int, end: int):
+        async with aiofiles.open(self.path, "rb") as f:
+            await f.seek(start)
+            while start < end:
+                chunk = await f.read(min(self.chunk_size, end - start))
+                start += len(chunk)
+                more_body = bool(chunk) and start < end
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": more_body,
+                    }
+                )
+                if not chunk:
+                    break
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import stat as stat_module
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import aiofiles
+import aiofiles.os
+
+# Segundos que se reutiliza el stat de un archivo existente (0 = sin caché)
+STAT_CACHE_TTL = float(os.getenv("STAT_CACHE_TTL", "1.0"))
+STAT_CACHE_SIZE = int(os.getenv("STAT_CACHE_SIZE", "4096"))
+
+# Acceso asíncrono al sistema de archivos para los handlers 'async def'.
+#
+# Cada operación corre en el pool de hilos (aiofiles.os), así un disco lento o
+# montado por red no detiene el event loop. Las secuencias de varias llamadas
+# (recorrer un directorio, buscar sidecars) van juntas en un solo salto con run().
+#
+# Solo se guardan en caché los stat de rutas que existen: una ruta que no existía
+# se vuelve a consultar siempre, para que un archivo recién subido aparezca de
+# inmediato. Un archivo borrado por otro proceso puede seguir figurando como
+# existente hasta STAT_CACHE_TTL; quien lo abra después recibirá el error de E/S.
+# La caché solo se usa desde el event loop, por eso no lleva lock.
+
+_stat_cache: dict[str, tuple[float, os.stat_result]] = {}
+
+
+async def run(func: Callable, *args, **kwargs) -> Any:
+    """Ejecuta una función síncrona de E/S en el pool de hilos."""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+async def stat(path: str | Path) -> os.stat_result | None:
+    """Retorna el stat de la ruta (en caché por STAT_CACHE_TTL), o None si no existe."""
+    key = os.fspath(path)
+    now = time.monotonic()
+    cached = _stat_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    try:
+        result = await aiofiles.os.stat(key)
+    except (FileNotFoundError, NotADirectoryError):
+        _stat_cache.pop(key, None)
+        return None
+
+    if STAT_CACHE_TTL > 0:
+        if len(_stat_cache) >= STAT_CACHE_SIZE:
+            # Descarta la entrada más antigua (orden de inserción)
+            _stat_cache.pop(next(iter(_stat_cache)))
+        _stat_cache[key] = (now + STAT_CACHE_TTL, result)
+    return result
+
+
+def invalidate(path: str | Path | None = None):
+    """Quita una ruta de la caché de stat (o toda la caché si no se indica)."""
+    if path is None:
+        _stat_cache.clear()
+    else:
+        _stat_cache.pop(os.fspath(path), None)
+
+
+async def exists(path: str | Path) -> bool:
+    return await stat(path) is not None
+
+
+async def is_file(path: str | Path) -> bool:
+    result = await stat(path)
+    return result is not None and stat_module.S_ISREG(result.st_mode)
+
+
+async def is_dir(path: str | Path) -> bool:
+    result = await stat(path)
+    return result is not None and stat_module.S_ISDIR(result.st_mode)
+
+
+async def read_bytes(path: str | Path) -> bytes:
+    async with aiofiles.open(path, "rb") as f:
+        return await f.read()
+
+
+async def read_text(path: str | Path) -> str:
+    async with aiofiles.open(path, "r") as f:
+        return await f.read()
+
+
+async def mkdir(path: str | Path, parents: bool = False, exist_ok: bool = False):
+    if parents:
+        await aiofiles.os.makedirs(path, exist_ok=exist_ok)
+        return
+    try:
+        await aiofiles.os.mkdir(path)
+    except FileExistsError:
+        if not exist_ok:
+            raise
+
+
+async def unlink(path: str | Path, missing_ok: bool = False):
+    invalidate(path)
+    try:
+        await aiofiles.os.unlink(path)
+    except FileNotFoundError:
+        if not missing_ok:
+            raise
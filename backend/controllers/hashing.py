@@ -0,0 +1,151 @@
+import bisect
+import hashlib
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+import aiofiles
+
+try:
+    import blake3 as _blake3
+except ImportError:  # blake3 es opcional
+    _blake3 = None
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_HASH_ALGORITHM = os.getenv("HASH_ALGORITHM", "sha256")
+
+# Registro de algoritmos de hash: nombre -> fábrica de objetos hash (API de hashlib)
+HASH_ALGORITHMS: dict[str, Callable] = {}
+# Métodos de firma; con los algoritmos de hash, nombran los sidecars de un archivo
+# ('<archivo>.<método>.hash' y '<archivo>.<método>.sig')
+SIGNING_METHODS = ("rsa", "ecc", "ed25519")
+
+
+def register_hash_algorithm(name: str, factory: Callable) -> None:
+    """Registra un algoritmo de hash disponible para los archivos subidos."""
+    HASH_ALGORITHMS[name.lower()] = factory
+
+
+register_hash_algorithm("sha256", hashlib.sha256)
+register_hash_algorithm("blake2b", hashlib.blake2b)
+register_hash_algorithm("blake2s", hashlib.blake2s)
+register_hash_algorithm("sha3_256", hashlib.sha3_256)
+
+# SHA-512/256 es más rápido que SHA-256 en CPUs de 64 bits sin extensiones SHA,
+# pero depende de la versión de OpenSSL enlazada.
+if "sha512_256" in hashlib.algorithms_available:
+    register_hash_algorithm("sha512_256", lambda: hashlib.new("sha512_256"))
+
+if _blake3 is not None:
+    register_hash_algorithm("blake3", _blake3.blake3)
+
+
+def get_hasher(algorithm: str):
+    """Crea un objeto hash nuevo para el algoritmo indicado."""
+    try:
+        return HASH_ALGORITHMS[algorithm.lower()]()
+    except KeyError:
+        raise ValueError(
+            f"Algoritmo de hash no soportado: {algorithm}. "
+            f"Usa uno de: {', '.join(sorted(HASH_ALGORITHMS))}."
+        )
+
+
+def hash_bytes(data: bytes, algorithm: str = DEFAULT_HASH_ALGORITHM) -> str:
+    """Calcula el hash (hex) de un bloque de bytes."""
+    hasher = get_hasher(algorithm)
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+async def hash_file(
+    file_path: str | Path,
+    algorithm: str = DEFAULT_HASH_ALGORITHM,
+    chunk_size: int = CHUNK_SIZE,
+) -> str:
+    """Calcula el hash (hex) de un archivo leyéndolo por bloques."""
+    hasher = get_hasher(algorithm)
+    async with aiofiles.open(file_path, "rb") as f:
+        while chunk := await f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def format_hash_file(
+    digest: str, algorithm: str, method: str, key_fingerprint: str | None = None
+) -> str:
+    """
+    Genera el contenido del archivo .hash con el algoritmo explícito.
+
+    Si el archivo está firmado, 'key_fingerprint' identifica la llave pública usada.
+    """
+    content = (
+        f"{algorithm.upper()}: {digest}\nFirmado con: {method}\nAlgoritmo: {algorithm}"
+    )
+    if key_fingerprint:
+        content += f"\nLlave: {key_fingerprint}"
+    return content
+
+
+def parse_hash_file(content: str) -> tuple[str, str]:
+    """
+    Lee el contenido de un archivo .hash y retorna (algoritmo, hash).
+
+    Los archivos antiguos no tienen la línea 'Algoritmo' y siempre usan SHA-256.
+    """
+    fields = {}
+    for line in content.strip().splitlines():
+        key, _, value = line.partition(":")
+        fields[key.strip()] = value.strip()
+
+    algorithm = fields.get("Algoritmo", "sha256").lower()
+    digest = fields.get(algorithm.upper())
+    if not digest:
+        raise ValueError("Archivo de hash mal formado.")
+
+    return algorithm, digest
+
+
+def parse_key_fingerprint(content: str) -> str | None:
+    """Retorna la huella de la llave de firma de un .hash (None si no la tiene)."""
+    for line in content.strip().splitlines():
+        key, _, value = line.partition(":")
+        if key.strip() == "Llave":
+            return value.strip() or None
+    return None
+
+
+def find_hash_file(
+    user_dir: Path, filename: str, method: str | None = None
+) -> Path | None:
+    """
+    Busca el archivo .hash de un archivo subido.
+
+    Prioriza el del método indicado y luego cualquier otro '<archivo>.<método>.hash'.
+    """
+    if method:
+        candidate = user_dir / f"{filename}.{method}.hash"
+        if candidate.exists():
+            return candidate
+
+    name = select_hash_file(filename, sorted(os.listdir(user_dir)))
+    return user_dir / name if name else None
+
+
+def select_hash_file(filename: str, names: list[str]) -> str | None:
+    """
+    Elige entre 'names' (ordenados) el '<archivo>.<método>.hash' de 'filename'.
+
+    Sirve para buscar el hash de muchos archivos de un directorio listándolo una
+    sola vez. Solo cuentan los métodos de firma y algoritmos de hash conocidos.
+    """
+    prefix = f"{filename}."
+    for name in names[bisect.bisect_left(names, prefix) :]:
+        if not name.startswith(prefix):
+            break
+        method = name[len(prefix) : -len(".hash")]
+        if name.endswith(".hash") and (
+            method in SIGNING_METHODS or method in HASH_ALGORITHMS
+        ):
+            return name
+    return None
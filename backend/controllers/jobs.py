@@ -0,0 +1,495 @@
+import asyncio
+import base64
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from contextlib import nullcontext, suppress
+from functools import lru_cache
+from typing import Any
+
+from fastapi import HTTPException
+
+from database import get_redis
+from monitoring import span
+
+logger = logging.getLogger(__name__)
+
+# Backend de la cola: 'local' (cola y payload en la memoria de cada proceso) o
+# 'redis' (compartida entre workers); el estado de los jobs siempre está en Redis
+JOB_BACKEND = os.getenv("JOB_BACKEND", "local").lower()
+# Jobs que un proceso ejecuta en paralelo (de cualquier tipo)
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Espera antes del primer reintento; se duplica en cada intento
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "1.0"))
+# Duración máxima de un intento
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "300"))
+# Tiempo que se conserva el estado de un job
+JOB_TTL = int(os.getenv("JOB_TTL", "86400"))
+# Cada cuánto se busca trabajo nuevo en Redis (los jobs del propio proceso no esperan)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.2"))
+
+# Menor número = se ejecuta antes; dentro de una prioridad, en orden de llegada
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+# Estados: queued → running → done | failed (retrying entre intentos fallidos)
+FINAL_STATUSES = ("done", "failed")
+_INT_FIELDS = (
+    "priority",
+    "attempts",
+    "max_attempts",
+    "status_code",
+    "created_at",
+    "updated_at",
+)
+
+# Claves de Redis: el estado 'job:<id>' con ambos backends; el payload cifrado y
+# las colas solo con JOB_BACKEND=redis
+QUEUE_KEY = "jobs:queue"
+DELAYED_KEY = "jobs:delayed"
+RUNNING_KEY = "jobs:running"
+# Orden de la cola: prioridad y, dentro de ella, milisegundo de llegada
+_PRIORITY_SCALE = 10**13
+
+
+def _job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def _payload_key(job_id: str) -> str:
+    return f"job:{job_id}:payload"
+
+
+# Cola de trabajos en segundo plano (procesamiento posterior a las subidas).
+#
+# Cada tipo de job es una función async registrada con @job_handler que recibe
+# un payload JSON. Un despachador por proceso toma los jobs por prioridad y los
+# ejecuta con dos límites de concurrencia: JOB_CONCURRENCY en total y, si el
+# tipo lo define, uno propio (p. ej. para las firmas, que usan CPU).
+#
+# Un intento que lanza una excepción se reintenta con espera exponencial hasta
+# 'max_attempts'; un HTTPException es un error definitivo (el handler ya decidió
+# la respuesta) y no se reintenta. Al apagar, el job en curso vuelve a la cola.
+#
+# El estado de cada job ('job:<id>') se guarda en Redis con ambos backends, como
+# el progreso de las subidas: con varios workers, cualquiera responde
+# /file/jobs/{id} aunque el job corra en la memoria de otro proceso.
+
+_handlers: dict[str, "JobHandler"] = {}
+
+
+class JobHandler:
+    def __init__(
+        self,
+        func: Callable[[dict], Awaitable[Any]],
+        concurrency: int | None = None,
+        on_failure: Callable[[dict, str], None] | None = None,
+    ):
+        self.func = func
+        self.concurrency = concurrency
+        self.on_failure = on_failure
+
+
+def job_handler(
+    kind: str,
+    concurrency: int | None = None,
+    on_failure: Callable[[dict, str], None] | None = None,
+):
+    """
+    Registra la función que ejecuta los jobs de tipo 'kind'.
+
+    'concurrency' limita cuántos de estos jobs corren a la vez en un proceso;
+    'on_failure(payload, error)' se llama cuando el job falla definitivamente.
+    """
+
+    def register(func: Callable[[dict], Awaitable[Any]]):
+        _handlers[kind] = JobHandler(func, concurrency, on_failure)
+        return func
+
+    return register
+
+
+class JobQueue:
+    """
+    Despachador, ciclo de vida y estado (en Redis) de los jobs. Los backends
+    implementan dónde se guardan el payload y la cola (_store_payload, _payload,
+    _finish_storage, _push, _take).
+    """
+
+    def __init__(
+        self,
+        concurrency: int = JOB_CONCURRENCY,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        retry_delay: float = JOB_RETRY_DELAY,
+        timeout: float = JOB_TIMEOUT,
+        poll_interval: float = JOB_POLL_INTERVAL,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self._finished: dict[str, asyncio.Event] = {}
+
+    def start(self):
+        """Arranca el despachador en el event loop actual (si no está corriendo)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._dispatcher and not self._dispatcher.done():
+            return
+        # Los locks de asyncio pertenecen a un loop: se crean de nuevo en cada uno
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self._running = set()
+        self._finished = {}
+        self._dispatcher = loop.create_task(self._dispatch())
+
+    async def stop(self):
+        """Detiene el despachador y espera a que terminen los jobs en curso."""
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._dispatcher
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        self._dispatcher = None
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        owner: str | None = None,
+        priority: int = PRIORITY_NORMAL,
+        max_attempts: int | None = None,
+        job_id: str | None = None,
+    ) -> str:
+        """Encola un job y retorna su id."""
+        if kind not in _handlers:
+            raise ValueError(f"Tipo de job desconocido: {kind}")
+        self.start()
+        job_id = job_id or uuid.uuid4().hex
+        now = int(time.time())
+        self._create(
+            {
+                "id": job_id,
+                "kind": kind,
+                "owner": owner or "",
+                "priority": priority,
+                "status": "queued",
+                "attempts": 0,
+                "max_attempts": max_attempts or self.max_attempts,
+                "created_at": now,
+                "updated_at": now,
+            },
+            payload,
+        )
+        self._push(job_id, priority)
+        self._wakeup.set()
+        return job_id
+
+    def _create(self, job: dict, payload: dict):
+        pipe = get_redis().pipeline()
+        pipe.hset(_job_key(job["id"]), mapping=job)
+        pipe.expire(_job_key(job["id"]), JOB_TTL)
+        self._store_payload(pipe, job["id"], payload)
+        pipe.execute()
+
+    def _update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = int(time.time())
+        pipe = get_redis().pipeline()
+        pipe.hset(_job_key(job_id), mapping=fields)
+        pipe.expire(_job_key(job_id), JOB_TTL)
+        pipe.execute()
+
+    def get(self, job_id: str) -> dict | None:
+        """Estado del job (de cualquier worker), o None si no existe o expiró."""
+        job = get_redis().hgetall(_job_key(job_id))
+        if not job:
+            return None
+        for field in _INT_FIELDS:
+            if field in job:
+                job[field] = int(job[field])
+        if "result" in job:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    async def wait(self, job_id: str, timeout: float | None = None) -> dict | None:
+        """Espera a que el job termine; retorna su estado (o el actual al vencer)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                job = self.get(job_id)
+                if job is None or job["status"] in FINAL_STATUSES:
+                    return job
+                if deadline is not None and time.monotonic() >= deadline:
+                    return job
+                # Un job de este proceso avisa al terminar; los de otros se consultan
+                finished = self._finished.setdefault(job_id, asyncio.Event())
+                with suppress(TimeoutError):
+                    async with asyncio.timeout(self.poll_interval):
+                        await finished.wait()
+        finally:
+            self._finished.pop(job_id, None)
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            job_id = self._take()
+            while job_id is None:
+                with suppress(TimeoutError):
+                    async with asyncio.timeout(self.poll_interval):
+                        await self._wakeup.wait()
+                self._wakeup.clear()
+                job_id = self._take()
+            task = asyncio.create_task(self._run(job_id))
+            self._running.add(task)
+            task.add_done_callback(self._release_slot)
+
+    def _release_slot(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slots.release()
+
+    def _limit(self, kind: str, handler: JobHandler):
+        if not handler.concurrency:
+            return nullcontext()
+        if kind not in self._limits:
+            self._limits[kind] = asyncio.Semaphore(handler.concurrency)
+        return self._limits[kind]
+
+    async def _run(self, job_id: str):
+        job = self.get(job_id)
+        payload = self._payload(job_id)
+        if job is None or payload is None or job["status"] in FINAL_STATUSES:
+            # Expiró o ya lo terminó otro worker
+            self._finish_storage(job_id)
+            return
+
+        handler = _handlers.get(job["kind"])
+        if handler is None:
+            self._fail(job, None, payload, f"Tipo de job desconocido: {job['kind']}")
+            return
+
+        attempts = job["attempts"] + 1
+        self._update(job_id, status="running", attempts=attempts)
+        try:
+            with span("job.run", {"job.kind": job["kind"], "job.attempt": attempts}):
+                async with self._limit(job["kind"], handler):
+                    async with asyncio.timeout(self.timeout):
+                        result = await handler.func(payload)
+        except asyncio.CancelledError:
+            # El proceso se está apagando: el job vuelve a la cola sin gastar el intento
+            self._update(job_id, status="queued", attempts=attempts - 1)
+            self._push(job_id, job["priority"])
+            raise
+        except HTTPException as e:
+            self._fail(job, handler, payload, str(e), e.status_code)
+        except Exception as e:
+            self._attempt_failed({**job, "attempts": attempts}, handler, payload, e)
+        else:
+            self._update(job_id, status="done", result=result, error="")
+            self._done(job_id)
+
+    def _attempt_failed(
+        self, job: dict, handler: JobHandler, payload: dict, error: Exception | str
+    ):
+        """Programa el reintento del job, o lo marca fallido si no quedan intentos."""
+        detail = str(error) or type(error).__name__
+        if job["attempts"] < job["max_attempts"]:
+            delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+            logger.warning(
+                f"Job {job['id']} ({job['kind']}) falló en el intento "
+                f"{job['attempts']}, se reintenta en {delay:.1f}s: {detail}"
+            )
+            self._update(job["id"], status="retrying", error=detail)
+            self._push(job["id"], job["priority"], delay)
+        else:
+            logger.error(f"Job {job['id']} ({job['kind']}) falló: {detail}")
+            self._fail(job, handler, payload, detail)
+
+    def _fail(
+        self,
+        job: dict,
+        handler: JobHandler | None,
+        payload: dict | None,
+        detail: str,
+        status_code: int = 500,
+    ):
+        self._update(job["id"], status="failed", error=detail, status_code=status_code)
+        self._done(job["id"])
+        if handler is not None and handler.on_failure is not None and payload:
+            try:
+                handler.on_failure(payload, detail)
+            except Exception:
+                logger.exception(f"Error en on_failure del job {job['id']}")
+
+    def _done(self, job_id: str):
+        self._finish_storage(job_id)
+        finished = self._finished.get(job_id)
+        if finished is not None:
+            finished.set()
+
+    def _wake(self):
+        """Avisa al despachador que hay trabajo (desde el loop de la cola)."""
+        if self._dispatcher is not None:
+            self._wakeup.set()
+
+
+class LocalJobQueue(JobQueue):
+    """
+    Cola en memoria del proceso: el payload (que puede llevar llaves privadas) no
+    sale del proceso, pero los jobs se ejecutan en el worker que los encoló y los
+    pendientes se terminan antes de apagar (ver stop). El estado sí está en Redis.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._payloads: dict[str, dict] = {}
+        self._heap: list[tuple[int, int, str]] = []
+        self._counter = itertools.count()
+        self._delayed = 0
+
+    async def stop(self):
+        # Los jobs pendientes se perderían al apagar: se espera a que terminen
+        while self._dispatcher is not None and (
+            self._heap or self._delayed or self._running
+        ):
+            await asyncio.sleep(self.poll_interval)
+        await super().stop()
+
+    def _store_payload(self, pipe, job_id: str, payload: dict):
+        self._payloads[job_id] = payload
+
+    def _payload(self, job_id: str) -> dict | None:
+        return self._payloads.get(job_id)
+
+    def _finish_storage(self, job_id: str):
+        job = self.get(job_id)
+        if job is None or job["status"] in FINAL_STATUSES:
+            self._payloads.pop(job_id, None)
+
+    def _push(self, job_id: str, priority: int, delay: float = 0):
+        if delay > 0:
+            self._delayed += 1
+            self._loop.call_later(delay, self._push_delayed, job_id, priority)
+            return
+        heapq.heappush(self._heap, (priority, next(self._counter), job_id))
+        self._wake()
+
+    def _push_delayed(self, job_id: str, priority: int):
+        self._delayed -= 1
+        self._push(job_id, priority)
+
+    def _take(self) -> str | None:
+        return heapq.heappop(self._heap)[2] if self._heap else None
+
+
+@lru_cache(maxsize=1)
+def _payload_cipher():
+    # El payload puede llevar llaves privadas: en Redis se guarda cifrado con una
+    # clave derivada de SECRET_KEY
+    from cryptography.fernet import Fernet
+
+    from controllers.auth import SECRET_KEY
+
+    digest = hashlib.sha256(f"jobs:{SECRET_KEY}".encode()).digest()
+    return Fernet(base64.urlsafe_b64encode(digest))
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Cola compartida en Redis: cualquier worker toma los jobs de 'jobs:queue'
+    (sorted set por prioridad). Los reintentos esperan en 'jobs:delayed' y los
+    jobs en curso quedan en 'jobs:running' con un plazo; si el worker muere, el
+    job vuelve a la cola al vencer el plazo (contando el intento).
+    """
+
+    def _store_payload(self, pipe, job_id: str, payload: dict):
+        token = _payload_cipher().encrypt(json.dumps(payload).encode()).decode()
+        pipe.set(_payload_key(job_id), token, ex=JOB_TTL)
+
+    def _payload(self, job_id: str) -> dict | None:
+        token = get_redis().get(_payload_key(job_id))
+        if token is None:
+            return None
+        return json.loads(_payload_cipher().decrypt(token.encode()))
+
+    def _finish_storage(self, job_id: str):
+        pipe = get_redis().pipeline()
+        pipe.zrem(RUNNING_KEY, job_id)
+        job = self.get(job_id)
+        if job is None or job["status"] in FINAL_STATUSES:
+            pipe.delete(_payload_key(job_id))
+        pipe.execute()
+
+    def _push(self, job_id: str, priority: int, delay: float = 0):
+        redis = get_redis()
+        now = int(time.time() * 1000)
+        pipe = redis.pipeline()
+        pipe.zrem(RUNNING_KEY, job_id)
+        if delay > 0:
+            pipe.zadd(DELAYED_KEY, {job_id: now + int(delay * 1000)})
+        else:
+            pipe.zadd(QUEUE_KEY, {job_id: priority * _PRIORITY_SCALE + now})
+        pipe.execute()
+        if delay <= 0:
+            self._wake()
+
+    def _take(self) -> str | None:
+        redis = get_redis()
+        now = int(time.time() * 1000)
+        self._promote(redis, now)
+
+        popped = redis.zpopmin(QUEUE_KEY)
+        if not popped:
+            return None
+        job_id = popped[0][0]
+        deadline = now + int((self.timeout + 60) * 1000)
+        redis.zadd(RUNNING_KEY, {job_id: deadline})
+        return job_id
+
+    def _promote(self, redis, now: int):
+        # Reintentos cuya espera terminó (ZREM decide qué worker lo mueve)
+        for job_id in redis.zrangebyscore(DELAYED_KEY, 0, now):
+            if redis.zrem(DELAYED_KEY, job_id):
+                job = self.get(job_id)
+                if job is not None:
+                    self._push(job_id, job["priority"])
+
+        # Jobs de un worker que murió sin terminarlos
+        for job_id in redis.zrangebyscore(RUNNING_KEY, 0, now):
+            if not redis.zrem(RUNNING_KEY, job_id):
+                continue
+            job = self.get(job_id)
+            if job is None or job["status"] in FINAL_STATUSES:
+                continue
+            handler = _handlers.get(job["kind"])
+            payload = self._payload(job_id)
+            self._attempt_failed(
+                job, handler, payload, "El worker no terminó el job a tiempo"
+            )
+
+
+def create_job_queue(backend: str = JOB_BACKEND) -> JobQueue:
+    if backend == "redis":
+        return RedisJobQueue()
+    if backend == "local":
+        return LocalJobQueue()
+    raise ValueError(f"JOB_BACKEND inválido: {backend}. Usa 'local' o 'redis'.")
+
+
+job_queue = create_job_queue()
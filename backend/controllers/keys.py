@@ -1,83 +1,226 @@
+from __future__ import annotations
+
+import base64
 import hashlib
+import os
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from controllers.hashing import (
+    DEFAULT_HASH_ALGORITHM,
+    format_hash_file,
+    get_hasher,
+    hash_bytes,
+)
+from controllers.storage import atomic_write, iter_file, read_file
+from monitoring import CRYPTO_DURATION, span, timer
+
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+# cryptography se importa dentro de las funciones: importar este módulo (y la app)
+# no carga el backend criptográfico hasta que se necesita (ver controllers.backends).
+
+# Ed25519 es órdenes de magnitud más barato que RSA para generar llaves y firmar
+DEFAULT_SIGNING_METHOD = os.getenv("SIGNING_METHOD", "ed25519")
+
+
+async def save_hash(
+    file_data: bytes,
+    file_path: str,
+    method: str,
+    algorithm: str = DEFAULT_HASH_ALGORITHM,
+    key_fingerprint: str | None = None,
+) -> str:
+    """
+    Calcula el hash del archivo y lo guarda en un archivo txt con el método de firma.
+
+    El algoritmo de hash se guarda explícitamente, independiente del método de firma.
+    """
+    file_hash = hash_bytes(file_data, algorithm)
+    return await save_hash_digest(
+        file_hash, file_path, method, algorithm, key_fingerprint
+    )
 
-import aiofiles
-from cryptography.hazmat.primitives import hashes as crypto_hashes
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, ec
-from cryptography.hazmat.primitives.asymmetric.padding import PSS, MGF1
 
+async def save_hash_digest(
+    file_hash: str,
+    file_path: str,
+    method: str,
+    algorithm: str = DEFAULT_HASH_ALGORITHM,
+    key_fingerprint: str | None = None,
+) -> str:
+    """
+    Guarda un hash ya calculado (hex) en el archivo .hash del método de firma.
 
-async def save_hash(file_data: bytes, file_path: str, method: str) -> str:
-    """Calcula el hash del archivo y lo guarda en un archivo txt con el método de firma."""
-    file_hash = hashlib.sha256(file_data).hexdigest()
+    'key_fingerprint' es la huella de la llave pública que verifica la firma.
+    """
     hash_file_path = (
         f"{file_path}.{method}.hash"  # Guardamos con el método de firma en el nombre
     )
-    async with aiofiles.open(hash_file_path, "w") as f:
-        await f.write(f"SHA256: {file_hash}\nFirmado con: {method}")
+    await atomic_write(
+        hash_file_path,
+        format_hash_file(file_hash, algorithm, method, key_fingerprint),
+    )
 
     return hash_file_path
 
 
+async def _digest_file(
+    file_path: str, hash_algorithm: str, on_bytes: Callable[[int], None] | None = None
+) -> tuple[bytes, str]:
+    """
+    Lee el archivo por bloques y calcula en una sola pasada el SHA-256 usado para
+    firmar y el hash (hex) del algoritmo elegido, sin cargarlo completo en memoria.
+    'on_bytes' recibe la cantidad de bytes de cada bloque leído.
+    """
+    with span("sign.digest", {"hash.algorithm": hash_algorithm}) as digest_span:
+        sha256 = hashlib.sha256()
+        hasher = get_hasher(hash_algorithm)
+        size = 0
+        async for chunk in iter_file(file_path):
+            sha256.update(chunk)
+            hasher.update(chunk)
+            size += len(chunk)
+            if on_bytes is not None:
+                on_bytes(len(chunk))
+        digest_span.set_attribute("file.bytes", size)
+    return sha256.digest(), hasher.hexdigest()
+
+
+def _signer_fingerprint(private_key_obj) -> str:
+    """Huella de la llave pública que corresponde a la llave privada de firma."""
+    return key_fingerprint(public_key_der(private_key_obj.public_key()))
+
+
 async def sign_file_with_rsa(
-    file_path: str, private_key_obj: rsa.RSAPrivateKey
+    file_path: str,
+    private_key_obj: rsa.RSAPrivateKey,
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+    on_bytes: Callable[[int], None] | None = None,
 ) -> tuple:
     """Firma el archivo utilizando un objeto de clave privada RSA y guarda el hash."""
-    async with aiofiles.open(file_path, "rb") as f:
-        file_data = await f.read()
+    from cryptography.hazmat.primitives import hashes as crypto_hashes
+    from cryptography.hazmat.primitives.asymmetric.padding import MGF1, PSS
+    from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
 
-    # Generar la firma del archivo
-    signature = private_key_obj.sign(
-        file_data,
-        PSS(mgf=MGF1(crypto_hashes.SHA256()), salt_length=PSS.MAX_LENGTH),
-        crypto_hashes.SHA256(),
-    )
+    digest, file_hash = await _digest_file(file_path, hash_algorithm, on_bytes)
+
+    # Generar la firma del archivo (equivalente a firmar el contenido completo)
+    with (
+        timer(CRYPTO_DURATION, operation="sign", algorithm="rsa"),
+        span("sign.private_key", {"crypto.algorithm": "rsa"}),
+    ):
+        signature = private_key_obj.sign(
+            digest,
+            PSS(mgf=MGF1(crypto_hashes.SHA256()), salt_length=PSS.MAX_LENGTH),
+            Prehashed(crypto_hashes.SHA256()),
+        )
 
     # Guardar la firma en un archivo
     signature_path = f"{file_path}.rsa.sig"
-    async with aiofiles.open(signature_path, "wb") as f:
-        await f.write(signature)
+    with span("sign.write_signature", {"crypto.algorithm": "rsa"}):
+        await atomic_write(signature_path, signature)
 
     # Guardar el hash con el método 'rsa'
-    hash_file_path = await save_hash(file_data, file_path, "rsa")
+    hash_file_path = await save_hash_digest(
+        file_hash,
+        file_path,
+        "rsa",
+        hash_algorithm,
+        _signer_fingerprint(private_key_obj),
+    )
 
     return signature_path, hash_file_path
 
 
 async def sign_file_with_ecc(
-    file_path: str, private_key_obj: ec.EllipticCurvePrivateKey
+    file_path: str,
+    private_key_obj: ec.EllipticCurvePrivateKey,
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+    on_bytes: Callable[[int], None] | None = None,
 ) -> tuple:
     """Firma el archivo utilizando un objeto de clave privada ECC y guarda el hash."""
-    async with aiofiles.open(file_path, "rb") as f:
-        file_data = await f.read()
+    from cryptography.hazmat.primitives import hashes as crypto_hashes
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
 
-    # Generar la firma del archivo
-    signature = private_key_obj.sign(file_data, ec.ECDSA(crypto_hashes.SHA256()))
+    digest, file_hash = await _digest_file(file_path, hash_algorithm, on_bytes)
+
+    # Generar la firma del archivo (equivalente a firmar el contenido completo)
+    with (
+        timer(CRYPTO_DURATION, operation="sign", algorithm="ecc"),
+        span("sign.private_key", {"crypto.algorithm": "ecc"}),
+    ):
+        signature = private_key_obj.sign(
+            digest, ec.ECDSA(Prehashed(crypto_hashes.SHA256()))
+        )
 
     # Guardar la firma en un archivo
     signature_path = f"{file_path}.ecc.sig"
-    async with aiofiles.open(signature_path, "wb") as f:
-        await f.write(signature)
+    with span("sign.write_signature", {"crypto.algorithm": "ecc"}):
+        await atomic_write(signature_path, signature)
 
     # Guardar el hash con el método 'ecc'
-    hash_file_path = await save_hash(file_data, file_path, "ecc")
+    hash_file_path = await save_hash_digest(
+        file_hash,
+        file_path,
+        "ecc",
+        hash_algorithm,
+        _signer_fingerprint(private_key_obj),
+    )
 
     return signature_path, hash_file_path
 
 
-def generate_rsa_keys():
-    """Genera un par de claves RSA (2048 bits) y retorna clave privada y pública."""
-    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-    public_key = private_key.public_key()
+async def sign_file_with_ed25519(
+    file_path: str,
+    private_key_obj: ed25519.Ed25519PrivateKey,
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+    on_bytes: Callable[[int], None] | None = None,
+) -> tuple:
+    """Firma el archivo con un objeto de clave privada Ed25519 y guarda el hash."""
+    with span("sign.read", {"crypto.algorithm": "ed25519"}) as read_span:
+        file_data = await read_file(file_path)
+        read_span.set_attribute("file.bytes", len(file_data))
+    if on_bytes is not None:
+        on_bytes(len(file_data))
+
+    # Ed25519 no usa un hash externo: firma el mensaje completo en memoria
+    with (
+        timer(CRYPTO_DURATION, operation="sign", algorithm="ed25519"),
+        span("sign.private_key", {"crypto.algorithm": "ed25519"}),
+    ):
+        signature = private_key_obj.sign(file_data)
+
+    # Guardar la firma en un archivo
+    signature_path = f"{file_path}.ed25519.sig"
+    with span("sign.write_signature", {"crypto.algorithm": "ed25519"}):
+        await atomic_write(signature_path, signature)
+
+    # Guardar el hash con el método 'ed25519'
+    hash_file_path = await save_hash(
+        file_data,
+        file_path,
+        "ed25519",
+        hash_algorithm,
+        _signer_fingerprint(private_key_obj),
+    )
+
+    return signature_path, hash_file_path
+
+
+def _serialize_key_pair(private_key) -> tuple[str, str]:
+    """Serializa un par de claves a PEM (PKCS8 la privada, SPKI la pública)."""
+    from cryptography.hazmat.primitives import serialization
 
-    # Serializar claves
     private_pem = private_key.private_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PrivateFormat.PKCS8,
         encryption_algorithm=serialization.NoEncryption(),
     )
 
-    public_pem = public_key.public_bytes(
+    public_pem = private_key.public_key().public_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PublicFormat.SubjectPublicKeyInfo,
     )
@@ -85,32 +228,84 @@ def generate_rsa_keys():
     return private_pem.decode(), public_pem.decode()
 
 
+def generate_rsa_keys():
+    """Genera un par de claves RSA (2048 bits) y retorna clave privada y pública."""
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    with timer(CRYPTO_DURATION, operation="keygen", algorithm="rsa"):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return _serialize_key_pair(private_key)
+
+
 def generate_ecc_keys():
     """Genera un par de claves ECC (secp256r1) y retorna clave privada y pública."""
-    private_key = ec.generate_private_key(ec.SECP256R1())
-    public_key = private_key.public_key()
+    from cryptography.hazmat.primitives.asymmetric import ec
 
-    # Serializar claves
-    private_pem = private_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption(),
-    )
+    with timer(CRYPTO_DURATION, operation="keygen", algorithm="ecc"):
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    return _serialize_key_pair(private_key)
 
-    public_pem = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo,
-    )
 
-    return private_pem.decode(), public_pem.decode()
+def generate_ed25519_keys():
+    """Genera un par de claves Ed25519 y retorna clave privada y pública."""
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    with timer(CRYPTO_DURATION, operation="keygen", algorithm="ed25519"):
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    return _serialize_key_pair(private_key)
 
 
 def generate_keys():
-    """Genera un par de claves RSA y ECC y retorna ambas claves privadas y públicas."""
+    """Genera pares de claves RSA, ECC y Ed25519 y retorna privadas y públicas."""
     rsa_private, rsa_public = generate_rsa_keys()
     ecc_private, ecc_public = generate_ecc_keys()
+    ed25519_private, ed25519_public = generate_ed25519_keys()
 
     return {
         "rsa": {"private": rsa_private, "public": rsa_public},
         "ecc": {"private": ecc_private, "public": ecc_public},
+        "ed25519": {"private": ed25519_private, "public": ed25519_public},
     }
+
+
+"""
+
+----------------------- FORMATOS DE LLAVES PÚBLICAS -----------------------
+
+"""
+
+
+def public_key_der(public_key) -> bytes:
+    """Serializa una llave pública a SubjectPublicKeyInfo en DER."""
+    from cryptography.hazmat.primitives import serialization
+
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+
+
+def key_fingerprint(der: bytes) -> str:
+    """Huella de una llave pública: SHA-256 (hex) de su DER."""
+    return hashlib.sha256(der).hexdigest()
+
+
+def pem_to_der(pem: str) -> bytes:
+    """Convierte una llave pública PEM ('BEGIN PUBLIC KEY') a DER."""
+    body = [
+        line
+        for line in pem.replace("\\n", "\n").strip().splitlines()
+        if line and not line.startswith("-----")
+    ]
+    return base64.b64decode("".join(body))
+
+
+def der_to_pem(der: bytes) -> str:
+    """Convierte una llave pública DER a PEM, como la serializa cryptography."""
+    encoded = base64.b64encode(der).decode()
+    lines = [encoded[i : i + 64] for i in range(0, len(encoded), 64)]
+    return (
+        "-----BEGIN PUBLIC KEY-----\n"
+        + "\n".join(lines)
+        + "\n-----END PUBLIC KEY-----\n"
+    )
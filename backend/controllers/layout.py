@@ -0,0 +1,236 @@
+import bisect
+import hashlib
+import logging
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+from controllers import fs
+from controllers.hashing import HASH_ALGORITHMS, SIGNING_METHODS
+from controllers.storage import CODEC_SUFFIX, TEMP_SUFFIX, is_data_file, is_sidecar
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path("FileSection")
+
+# Distribución en disco de los archivos de un usuario:
+#
+#   FileSection/<email>/.shards/<aa>/<bb>/<archivo>        (y sus .hash, .sig, .codec)
+#
+# '<aa><bb>' son los primeros bytes del BLAKE2b del nombre del archivo, así que la
+# carpeta se calcula sin listar nada y cada una guarda una fracción (1/65536) de
+# los archivos del usuario. Los sidecars van junto a su archivo: los que se buscan
+# recorriendo la carpeta (hash, firmas del zip) solo recorren esa carpeta.
+#
+# Los archivos del formato anterior ('FileSection/<email>/<archivo>') se siguen
+# leyendo hasta que migrate_storage.py los mueve.
+SHARD_ROOT = ".shards"
+SHARD_LEVELS = 2
+
+
+def shard_dir(user_folder: Path, filename: str) -> Path:
+    """Carpeta (sharded) donde vive 'filename' y sus sidecars."""
+    digest = hashlib.blake2b(filename.encode(), digest_size=SHARD_LEVELS).hexdigest()
+    parts = [digest[i : i + 2] for i in range(0, 2 * SHARD_LEVELS, 2)]
+    return Path(user_folder, SHARD_ROOT, *parts)
+
+
+def sharded_path(user_folder: Path, filename: str) -> Path:
+    return shard_dir(user_folder, filename) / filename
+
+
+def legacy_path(user_folder: Path, filename: str) -> Path:
+    return Path(user_folder) / filename
+
+
+def stored_file_candidates(user_folder: Path, filename: str) -> tuple[Path, Path]:
+    """Rutas posibles de un archivo subido: primero la sharded, luego la anterior."""
+    return sharded_path(user_folder, filename), legacy_path(user_folder, filename)
+
+
+def find_stored_file(user_folder: Path, filename: str) -> Path | None:
+    """Ruta de un archivo subido (formato nuevo o anterior), o None si no existe."""
+    for candidate in stored_file_candidates(user_folder, filename):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+async def find_stored_file_async(user_folder: Path, filename: str) -> Path | None:
+    """find_stored_file para handlers async: usa la caché de stat de controllers.fs."""
+    for candidate in stored_file_candidates(user_folder, filename):
+        if await fs.is_file(candidate):
+            return candidate
+    return None
+
+
+def storage_path(user_folder: Path, filename: str) -> Path:
+    """Ruta donde escribir un archivo: la actual si ya existe, si no la sharded."""
+    return find_stored_file(user_folder, filename) or sharded_path(
+        user_folder, filename
+    )
+
+
+def iter_stored_dirs(user_folder: Path) -> Iterator[tuple[Path, list[str]]]:
+    """
+    Recorre los directorios del usuario que guardan archivos (cada shard y la
+    carpeta del formato anterior) con los nombres de todos sus archivos.
+    """
+    user_folder = Path(user_folder)
+    if not user_folder.is_dir():
+        return
+
+    shards = user_folder / SHARD_ROOT
+    for dirpath, dirnames, filenames in os.walk(shards):
+        dirnames[:] = [name for name in dirnames if len(name) == 2]
+        yield Path(dirpath), filenames
+
+    with os.scandir(user_folder) as entries:
+        yield user_folder, [entry.name for entry in entries if entry.is_file()]
+
+
+def iter_stored_files(user_folder: Path) -> Iterator[Path]:
+    """Recorre los archivos de datos del usuario en ambos formatos (sin orden)."""
+    for directory, names in iter_stored_dirs(user_folder):
+        for name in names:
+            if is_data_file(name):
+                yield directory / name
+
+
+def legacy_sidecars(filename: str, names: list[str], data_names: set[str]) -> list[str]:
+    """
+    Sidecars de 'filename' entre 'names' (ordenados) de una carpeta del formato
+    anterior.
+
+    'a.b.hash' es el hash con método 'b' de 'a', salvo que exista el archivo 'a.b'.
+    """
+    prefix = f"{filename}."
+    methods = set(HASH_ALGORITHMS) | set(SIGNING_METHODS)
+    sidecars = []
+    start = bisect.bisect_left(names, prefix)
+    for name in names[start:]:
+        if not name.startswith(prefix):
+            break
+        if not is_sidecar(name):
+            continue
+        rest = name[len(prefix) :]
+        if rest == CODEC_SUFFIX[1:]:
+            sidecars.append(name)
+            continue
+        method, _, suffix = rest.partition(".")
+        if (
+            suffix in ("hash", "sig")
+            and method in methods
+            and f"{prefix}{method}" not in data_names
+        ):
+            sidecars.append(name)
+    return sidecars
+
+
+def _link(source: Path, destination: Path):
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        # El archivo del formato anterior es más reciente (una subida que empezó
+        # antes de migrarlo): reemplaza la copia sharded
+        temp = destination.with_name(f".{destination.name}.migrate{TEMP_SUFFIX}")
+        temp.unlink(missing_ok=True)
+        os.link(source, temp)
+        os.replace(temp, destination)
+
+
+def _same_file(source: Path, destination: Path) -> bool:
+    """True si ambas rutas son el mismo inodo (el enlace sigue vigente)."""
+    try:
+        return os.path.samestat(os.stat(source), os.stat(destination))
+    except FileNotFoundError:
+        return False
+
+
+def _unlink_if_linked(source: Path, destination: Path, attempts: int = 3):
+    """
+    Borra la ruta anterior de un sidecar ya enlazado en la carpeta sharded.
+
+    Si un job lo reescribió (rename atómico: otro inodo) después de enlazarlo, se
+    vuelve a enlazar la versión nueva antes de borrar; si sigue cambiando, la ruta
+    anterior queda para la siguiente pasada en lugar de perder la escritura.
+    """
+    for _ in range(attempts):
+        if _same_file(source, destination):
+            source.unlink(missing_ok=True)
+            return
+        try:
+            _link(source, destination)
+        except FileNotFoundError:
+            return
+
+
+def migrate_user_dir(user_folder: Path) -> int:
+    """
+    Mueve los archivos de un usuario del formato plano al sharded.
+    Retorna cuántos movió.
+
+    Es seguro con la app en marcha: primero se crean enlaces duros a los sidecars y
+    después el archivo se mueve con un solo rename, así que quien encuentra el
+    archivo en el formato nuevo ya encuentra sus sidecars y una subida que lo
+    reemplace durante la migración no se pierde (se mueve la versión más reciente).
+    Las rutas anteriores de los sidecars solo se borran si siguen siendo el mismo
+    inodo que su enlace. Una subida que empezó antes de migrar puede dejar el
+    archivo otra vez en el formato anterior: se migra en la siguiente pasada.
+    """
+    user_folder = Path(user_folder)
+    with os.scandir(user_folder) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_file())
+    data_names = {name for name in names if is_data_file(name)}
+
+    link = True
+    moved = 0
+    for filename in sorted(data_names):
+        sidecars = legacy_sidecars(filename, names, data_names)
+        target_dir = shard_dir(user_folder, filename)
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+        linked = []
+        for name in sidecars:
+            source, destination = user_folder / name, target_dir / name
+            try:
+                if link:
+                    _link(source, destination)
+                    linked.append(name)
+                else:
+                    os.replace(source, destination)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                if not link:
+                    raise
+                # Sistema de archivos sin enlaces duros: se renombra directamente
+                link = False
+                os.replace(source, destination)
+
+        try:
+            os.replace(user_folder / filename, target_dir / filename)
+        except FileNotFoundError:
+            pass
+
+        # Después del archivo: sin él, nadie busca sus sidecars en la ruta anterior
+        for name in linked:
+            _unlink_if_linked(user_folder / name, target_dir / name)
+        moved += 1
+    return moved
+
+
+def migrate_storage(base_dir: Path = BASE_DIR) -> int:
+    """Migra las carpetas de todos los usuarios. Retorna cuántos archivos movió."""
+    base_dir = Path(base_dir)
+    if not base_dir.is_dir():
+        return 0
+
+    moved = 0
+    for user_folder in sorted(base_dir.iterdir()):
+        if user_folder.is_dir():
+            count = migrate_user_dir(user_folder)
+            if count:
+                logger.info(f"{user_folder.name}: {count} archivos migrados")
+            moved += count
+    return moved
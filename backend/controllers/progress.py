@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+import re
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from database import get_redis
+
+# Tiempo que se conserva el progreso de una subida después de su última actualización
+UPLOAD_PROGRESS_TTL = int(os.getenv("UPLOAD_PROGRESS_TTL", "3600"))
+# Mínimo de segundos entre escrituras a Redis de una misma subida (los cambios de
+# etapa se escriben siempre)
+UPLOAD_PROGRESS_INTERVAL = float(os.getenv("UPLOAD_PROGRESS_INTERVAL", "0.25"))
+# Cada cuánto el stream SSE vuelve a leer el progreso
+UPLOAD_EVENTS_POLL = float(os.getenv("UPLOAD_EVENTS_POLL", "0.5"))
+UPLOAD_EVENTS_HEARTBEAT = 15.0
+# Cuánto espera el stream SSE a que aparezca una subida que todavía no empezó
+UPLOAD_EVENTS_WAIT = 30.0
+
+UPLOAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# Etapas: receiving → queued (solo en segundo plano) → storing → signing → done | error
+FINAL_STAGES = ("done", "error")
+_INT_FIELDS = ("received", "total", "stored", "signed", "updated_at")
+
+
+def progress_key(user_email: str, upload_id: str) -> str:
+    # El email en la clave: cada usuario solo ve sus propias subidas
+    return f"upload:{user_email}:{upload_id}"
+
+
+class UploadProgress:
+    """
+    Progreso de una subida, guardado en Redis para que cualquier worker lo sirva.
+
+    Los contadores de bytes se acumulan en memoria y se escriben como mucho cada
+    UPLOAD_PROGRESS_INTERVAL segundos.
+    """
+
+    def __init__(self, user_email: str, upload_id: str, resume: bool = False):
+        """Con resume=True continúa el progreso ya guardado (p. ej. desde un job)."""
+        self.key = progress_key(user_email, upload_id)
+        self.upload_id = upload_id
+        self.state = {}
+        self._dirty = {}
+        self._last_write = None
+        self._reset = not resume
+
+    def update(self, stage: str | None = None, force: bool = False, **fields):
+        """
+        Actualiza la etapa y los campos; se escribe si cambió la etapa o pasó el
+        intervalo.
+        """
+        if stage is not None and stage != self.state.get("stage"):
+            fields["stage"] = stage
+            force = True
+        self.state.update(fields)
+        self._dirty.update(fields)
+        now = time.monotonic()
+        if (
+            force
+            or self._last_write is None
+            or now - self._last_write >= UPLOAD_PROGRESS_INTERVAL
+        ):
+            self._write(now)
+
+    def advance(self, field: str, amount: int):
+        """Suma 'amount' bytes al contador 'field'."""
+        self.update(**{field: self.state.get(field, 0) + amount})
+
+    def finish(self, result: dict):
+        self.update("done", force=True, result=json.dumps(result))
+
+    def fail(self, detail: str):
+        self.update("error", force=True, detail=str(detail))
+
+    def _write(self, now: float):
+        self._dirty["updated_at"] = int(time.time())
+        pipe = get_redis().pipeline()
+        if self._reset:
+            # Un upload_id reutilizado no conserva el resultado de la subida anterior
+            pipe.delete(self.key)
+            self._reset = False
+        pipe.hset(self.key, mapping=self._dirty)
+        pipe.expire(self.key, UPLOAD_PROGRESS_TTL)
+        pipe.execute()
+        self._dirty = {}
+        self._last_write = now
+
+
+def read_progress(user_email: str, upload_id: str) -> dict | None:
+    """Retorna el progreso de una subida, o None si no existe (o ya expiró)."""
+    state = get_redis().hgetall(progress_key(user_email, upload_id))
+    if not state:
+        return None
+    for field in _INT_FIELDS:
+        if field in state:
+            state[field] = int(state[field])
+    if "result" in state:
+        state["result"] = json.loads(state["result"])
+    return {"upload_id": upload_id, **state}
+
+
+def _event(name: str, data: dict, event_id: int) -> str:
+    return f"event: {name}\nid: {event_id}\ndata: {json.dumps(data)}\n\n"
+
+
+async def iter_progress_events(
+    user_email: str,
+    upload_id: str,
+    is_disconnected: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[str]:
+    """
+    Genera eventos SSE con el progreso de la subida hasta que termina.
+
+    Emite 'progress' con cada cambio y al final 'done' o 'error'. Si la subida no
+    aparece en UPLOAD_EVENTS_WAIT segundos, emite 'error' y termina.
+    """
+    started = last_sent = time.monotonic()
+    last_state = None
+    event_id = 0
+    while not await is_disconnected():
+        state = await asyncio.to_thread(read_progress, user_email, upload_id)
+        now = time.monotonic()
+        if state is None:
+            if now - started >= UPLOAD_EVENTS_WAIT:
+                yield _event("error", {"detail": "Subida no encontrada"}, event_id)
+                return
+        elif state != last_state:
+            event_id += 1
+            stage = state["stage"]
+            yield _event(
+                stage if stage in FINAL_STAGES else "progress", state, event_id
+            )
+            if stage in FINAL_STAGES:
+                return
+            last_state, last_sent = state, now
+        elif now - last_sent >= UPLOAD_EVENTS_HEARTBEAT:
+            # Comentario SSE: mantiene viva la conexión a través de proxies
+            yield ": keepalive\n\n"
+            last_sent = now
+        await asyncio.sleep(UPLOAD_EVENTS_POLL)
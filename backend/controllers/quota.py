@@ -0,0 +1,48 @@
+import os
+
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from database import User, db
+
+# Cuota de almacenamiento por usuario en bytes (0 = sin límite)
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", str(1024 * 1024 * 1024)))
+
+
+def reserve_storage(email: str, delta: int):
+    """
+    Reserva 'delta' bytes de la cuota del usuario.
+
+    La comprobación y el incremento se hacen en un solo UPDATE condicional, así que
+    subidas concurrentes (incluso en varios procesos) no pueden exceder la cuota.
+    """
+    if delta <= 0:
+        adjust_storage(email, delta)
+        return
+
+    statement = (
+        update(User)
+        .where(User.email == email)
+        .values(storage_used=User.storage_used + delta)
+    )
+    if STORAGE_QUOTA_BYTES > 0:
+        statement = statement.where(User.storage_used + delta <= STORAGE_QUOTA_BYTES)
+
+    with db.write() as session:
+        result = session.execute(statement)
+
+    if result.rowcount == 0:
+        raise HTTPException(status_code=413, detail="Cuota de almacenamiento excedida.")
+
+
+def adjust_storage(email: str, delta: int):
+    """Ajusta el uso del usuario sin comprobar la cuota (liberaciones, correcciones)."""
+    if delta == 0:
+        return
+
+    with db.write() as session:
+        session.execute(
+            update(User)
+            .where(User.email == email)
+            .values(storage_used=User.storage_used + delta)
+        )
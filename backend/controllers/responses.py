@@ -0,0 +1,24 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse serializada con orjson si está instalado; sin él usa json de la
+    biblioteca estándar, con la misma salida que JSONResponse.
+
+    Las rutas de listados la retornan directamente con datos nativos de JSON
+    (dict, list, str, int...): así FastAPI no recorre la respuesta completa con
+    jsonable_encoder antes de serializarla.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
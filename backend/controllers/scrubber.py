@@ -0,0 +1,304 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+import aiofiles
+
+from controllers.hashing import (
+    find_hash_file,
+    get_hasher,
+    parse_hash_file,
+    select_hash_file,
+)
+from controllers.layout import BASE_DIR, iter_stored_dirs
+from controllers.storage import CorruptedFileError, is_data_file, iter_file
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SCRUB_ENABLED = os.getenv("SCRUB_ENABLED", "false").lower() == "true"
+SCRUB_BYTES_PER_SEC = int(os.getenv("SCRUB_BYTES_PER_SEC", str(8 * 1024 * 1024)))
+SCRUB_MAX_CONCURRENCY = int(os.getenv("SCRUB_MAX_CONCURRENCY", "2"))
+SCRUB_INTERVAL_SECONDS = int(os.getenv("SCRUB_INTERVAL_SECONDS", "3600"))
+SCRUB_CHECKPOINT = Path(os.getenv("SCRUB_CHECKPOINT", "scrubber.checkpoint.json"))
+# Con varios workers solo el que obtiene este lock ejecuta el scrubber
+SCRUB_LOCK = Path(os.getenv("SCRUB_LOCK", "scrubber.lock"))
+
+
+class ByteRateLimiter:
+    """Token bucket asíncrono que limita los bytes leídos por segundo."""
+
+    def __init__(self, bytes_per_sec: int):
+        self.rate = bytes_per_sec
+        self.tokens = float(bytes_per_sec)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: int):
+        """Espera hasta que haya presupuesto para leer 'amount' bytes."""
+        if self.rate <= 0:
+            return
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    float(self.rate), self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                # Un bloque mayor que el presupuesto se deja pasar con el bucket lleno
+                needed = min(amount, self.rate)
+                if self.tokens >= needed:
+                    self.tokens -= needed
+                    return
+
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+
+class IntegrityScrubber:
+    """
+    Recorre los archivos almacenados y vuelve a calcular su hash contra el guardado.
+
+    El recorrido es incremental: guarda un checkpoint con el último archivo revisado
+    para continuar desde ahí después de un reinicio.
+    """
+
+    def __init__(
+        self,
+        base_dir: Path = BASE_DIR,
+        bytes_per_sec: int = SCRUB_BYTES_PER_SEC,
+        max_concurrency: int = SCRUB_MAX_CONCURRENCY,
+        interval_seconds: int = SCRUB_INTERVAL_SECONDS,
+        checkpoint_path: Path = SCRUB_CHECKPOINT,
+        lock_path: Path = SCRUB_LOCK,
+    ):
+        self.base_dir = Path(base_dir)
+        self.max_concurrency = max(1, max_concurrency)
+        self.interval_seconds = interval_seconds
+        self.checkpoint_path = Path(checkpoint_path)
+        self.lock_path = Path(lock_path)
+        self.lock_file = None
+        self.limiter = ByteRateLimiter(bytes_per_sec)
+        self.task: asyncio.Task | None = None
+
+        self.stats = {
+            "passes_completed": 0,
+            "files_scanned": 0,
+            "bytes_scanned": 0,
+            "corrupted": 0,
+            "missing_hash": 0,
+            "errors": 0,
+        }
+        self.progress = {"position": 0, "total": 0, "last_path": None}
+        self.recent_corruptions = deque(maxlen=50)
+        self._load_checkpoint()
+
+    # --- Checkpoint ---
+
+    def _load_checkpoint(self):
+        """Carga el checkpoint y los contadores guardados, si existen."""
+        if not self.checkpoint_path.exists():
+            return
+        try:
+            data = json.loads(self.checkpoint_path.read_text())
+        except (OSError, ValueError) as e:
+            logger.error(f"Checkpoint del scrubber ilegible: {e}")
+            return
+
+        self.progress["last_path"] = data.get("last_path")
+        self.stats.update(data.get("stats", {}))
+
+    def _save_checkpoint(self):
+        """Guarda el checkpoint de forma atómica (archivo temporal + rename)."""
+        data = {"last_path": self.progress["last_path"], "stats": self.stats}
+        temp_path = self.checkpoint_path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(data))
+        os.replace(temp_path, self.checkpoint_path)
+
+    # --- Recorrido ---
+
+    def list_files(self) -> list[tuple[str, str | None]]:
+        """
+        Retorna, ordenados por ruta, los archivos de datos como (ruta relativa desde
+        base_dir, nombre de su .hash o None).
+
+        Cada directorio se lista una sola vez y el hash de cada archivo se elige
+        entre esos nombres. Hace E/S bloqueante: run_pass lo llama en un hilo.
+        """
+        if not self.base_dir.exists():
+            return []
+
+        files = []
+        for user_folder in self.base_dir.iterdir():
+            if not user_folder.is_dir():
+                continue
+            for directory, names in iter_stored_dirs(user_folder):
+                names = sorted(names)
+                relative_dir = directory.relative_to(self.base_dir)
+                for name in names:
+                    if is_data_file(name):
+                        files.append(
+                            (
+                                (relative_dir / name).as_posix(),
+                                select_hash_file(name, names),
+                            )
+                        )
+        return sorted(files)
+
+    async def scrub_file(self, relative_path: str, hash_name: str | None = None) -> str:
+        """
+        Verifica un archivo contra su hash almacenado.
+
+        :param hash_name: Nombre del .hash ya elegido al listar el directorio; si no
+            se indica, se busca en el directorio del archivo.
+        :return: 'ok', 'corrupted', 'missing_hash' o 'error'
+        """
+        file_path = self.base_dir / relative_path
+        corrupted = False
+        try:
+            if hash_name:
+                hash_path = file_path.parent / hash_name
+            else:
+                hash_path = find_hash_file(file_path.parent, file_path.name)
+            if hash_path is None:
+                self.stats["missing_hash"] += 1
+                return "missing_hash"
+
+            async with aiofiles.open(hash_path, "r") as f:
+                algorithm, stored_hash = parse_hash_file(await f.read())
+
+            # El hash se calcula sobre el contenido original (descomprimido)
+            hasher = get_hasher(algorithm)
+            async for chunk in iter_file(file_path):
+                hasher.update(chunk)
+                self.stats["bytes_scanned"] += len(chunk)
+                await self.limiter.acquire(len(chunk))
+        except CorruptedFileError:
+            corrupted = True
+        except (OSError, ValueError) as e:
+            logger.error(f"Error al revisar {relative_path}: {e}")
+            self.stats["errors"] += 1
+            return "error"
+
+        self.stats["files_scanned"] += 1
+        if corrupted or hasher.hexdigest() != stored_hash:
+            logger.warning(f"Integridad comprometida: {relative_path}")
+            self.stats["corrupted"] += 1
+            self.recent_corruptions.append(relative_path)
+            return "corrupted"
+
+        return "ok"
+
+    async def run_pass(self):
+        """Recorre todos los archivos una vez, continuando desde el checkpoint."""
+        files = await asyncio.to_thread(self.list_files)
+        last_path = self.progress["last_path"]
+        pending = [
+            (path, hash_name)
+            for path, hash_name in files
+            if last_path is None or path > last_path
+        ]
+
+        self.progress["total"] = len(files)
+        self.progress["position"] = len(files) - len(pending)
+
+        # Se procesan lotes del tamaño de la concurrencia máxima; el checkpoint
+        # avanza al último archivo del lote cuando todo el lote terminó.
+        for start in range(0, len(pending), self.max_concurrency):
+            batch = pending[start : start + self.max_concurrency]
+            await asyncio.gather(*(self.scrub_file(*file) for file in batch))
+
+            self.progress["position"] += len(batch)
+            self.progress["last_path"] = batch[-1][0]
+            self._save_checkpoint()
+
+        self.stats["passes_completed"] += 1
+        self.progress["last_path"] = None
+        self._save_checkpoint()
+
+    async def run_forever(self):
+        """Ejecuta pasadas completas separadas por el intervalo configurado."""
+        while True:
+            try:
+                await self.run_pass()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la pasada del scrubber: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def _acquire_lock(self) -> bool:
+        """Intenta tomar el lock exclusivo entre procesos (no bloqueante)."""
+        if self.lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, "w")  # noqa: SIM115 se libera en _release_lock
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+
+    def _release_lock(self):
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+    def start(self) -> bool:
+        """
+        Inicia el scrubber como tarea en segundo plano.
+
+        :return: False si otro worker ya lo está ejecutando.
+        """
+        if self.task is not None and not self.task.done():
+            return True
+        if not self._acquire_lock():
+            logger.info("Otro worker ejecuta el scrubber")
+            return False
+        self.task = asyncio.create_task(self.run_forever())
+        return True
+
+    async def stop(self):
+        """Detiene la tarea en segundo plano."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self._release_lock()
+
+    def status(self, user_email: str | None = None) -> dict:
+        """
+        Retorna los contadores y el progreso de la pasada actual.
+
+        Con 'user_email', las rutas (corrupciones recientes y último archivo
+        revisado) se limitan a las de ese usuario; los contadores son globales.
+        """
+        progress = dict(self.progress)
+        recent = list(self.recent_corruptions)
+        if user_email is not None:
+            prefix = f"{user_email}/"
+            recent = [path for path in recent if path.startswith(prefix)]
+            if not (progress["last_path"] or "").startswith(prefix):
+                progress["last_path"] = None
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "bytes_per_sec": self.limiter.rate,
+            "max_concurrency": self.max_concurrency,
+            **self.stats,
+            "progress": progress,
+            "recent_corruptions": recent,
+        }
+
+
+scrubber = IntegrityScrubber()
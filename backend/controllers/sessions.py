@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+
+from database import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Vigencia de un refresh token; cada renovación la reinicia
+REFRESH_TOKEN_TTL_SECONDS = int(
+    os.getenv("REFRESH_TOKEN_TTL_SECONDS", str(30 * 24 * 3600))
+)
+
+# Sesiones de refresh token en Redis.
+#
+# El token es '<id de sesión>.<secreto>'. Por sesión se guarda un hash compacto
+# 'rt:<id>' con el email (u), el SHA-256 del secreto vigente (h) y el del anterior
+# (p); el secreto en claro nunca se guarda. Cada renovación rota el secreto: si
+# llega otra vez el anterior, el token fue copiado y la sesión se revoca entera.
+# 'rt:user:<email>' agrupa los ids de sesión del usuario para revocarlas juntas.
+
+
+def _session_key(session_id: str) -> str:
+    return f"rt:{session_id}"
+
+
+def _user_key(email: str) -> str:
+    return f"rt:user:{email}"
+
+
+def _digest(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _split(refresh_token: str) -> tuple[str, str] | None:
+    session_id, _, secret = refresh_token.partition(".")
+    if not session_id or not secret:
+        return None
+    return session_id, secret
+
+
+def create_session(email: str) -> str:
+    """Abre una sesión para el usuario y retorna su refresh token."""
+    session_id = secrets.token_urlsafe(12)
+    secret = secrets.token_urlsafe(32)
+
+    pipe = get_redis().pipeline()
+    pipe.hset(_session_key(session_id), mapping={"u": email, "h": _digest(secret)})
+    pipe.expire(_session_key(session_id), REFRESH_TOKEN_TTL_SECONDS)
+    pipe.sadd(_user_key(email), session_id)
+    pipe.expire(_user_key(email), REFRESH_TOKEN_TTL_SECONDS)
+    pipe.execute()
+    return f"{session_id}.{secret}"
+
+
+def rotate_session(refresh_token: str) -> tuple[str, str] | None:
+    """
+    Canjea un refresh token por uno nuevo de la misma sesión.
+
+    :return: (email, nuevo refresh token), o None si el token no es válido, ya se
+             usó o la sesión fue revocada.
+    """
+    parts = _split(refresh_token)
+    if parts is None:
+        return None
+    session_id, secret = parts
+    key = _session_key(session_id)
+    digest = _digest(secret)
+
+    from redis.exceptions import WatchError  # diferido: ver database.get_redis
+
+    with get_redis().pipeline() as pipe:
+        try:
+            # WATCH: dos renovaciones simultáneas del mismo token no pueden ganar ambas
+            pipe.watch(key)
+            session = pipe.hgetall(key)
+            if not session:
+                return None
+            email = session["u"]
+
+            if not hmac.compare_digest(digest, session["h"]):
+                if hmac.compare_digest(digest, session.get("p", "")):
+                    logger.warning(
+                        f"Refresh token reutilizado: se revoca la sesión de {email}"
+                    )
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.srem(_user_key(email), session_id)
+                    pipe.execute()
+                return None
+
+            new_secret = secrets.token_urlsafe(32)
+            pipe.multi()
+            pipe.hset(key, mapping={"h": _digest(new_secret), "p": digest})
+            pipe.expire(key, REFRESH_TOKEN_TTL_SECONDS)
+            pipe.expire(_user_key(email), REFRESH_TOKEN_TTL_SECONDS)
+            pipe.execute()
+        except WatchError:
+            # Otra petición rotó o revocó la sesión entre la lectura y la escritura
+            return None
+
+    return email, f"{session_id}.{new_secret}"
+
+
+def revoke_session(refresh_token: str) -> str | None:
+    """Cierra la sesión del refresh token; retorna su email (None si no existía)."""
+    parts = _split(refresh_token)
+    if parts is None:
+        return None
+    session_id, secret = parts
+    key = _session_key(session_id)
+
+    redis_client = get_redis()
+    session = redis_client.hgetall(key)
+    if not session or not hmac.compare_digest(_digest(secret), session["h"]):
+        return None
+
+    pipe = redis_client.pipeline()
+    pipe.delete(key)
+    pipe.srem(_user_key(session["u"]), session_id)
+    pipe.execute()
+    return session["u"]
+
+
+def revoke_user_sessions(email: str) -> int:
+    """Cierra todas las sesiones del usuario. Retorna cuántas había."""
+    redis_client = get_redis()
+    session_ids = redis_client.smembers(_user_key(email))
+
+    pipe = redis_client.pipeline()
+    for session_id in session_ids:
+        pipe.delete(_session_key(session_id))
+    pipe.delete(_user_key(email))
+    pipe.execute()
+    return len(session_ids)
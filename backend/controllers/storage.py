@@ -0,0 +1,344 @@
+import asyncio
+import os
+import uuid
+import weakref
+import zlib
+from collections.abc import AsyncIterator, Callable
+from pathlib import Path
+
+import aiofiles
+
+from controllers.hashing import HASH_ALGORITHMS, SIGNING_METHODS
+
+try:
+    import zstandard as _zstd
+except ImportError:  # zstandard es opcional
+    _zstd = None
+
+# off: nunca comprimir | auto: zstd si está instalado, si no zlib | zlib | zstd
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "off").lower()
+# Solo se comprime si la muestra queda por debajo de este porcentaje del original
+COMPRESSION_MIN_RATIO = float(os.getenv("COMPRESSION_MIN_RATIO", "0.9"))
+PROBE_SIZE = 64 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+# none: sin fsync | file: fsync del archivo antes del rename
+# dir: además fsync del directorio
+FSYNC_POLICY = os.getenv("FSYNC_POLICY", "file").lower()
+
+CODEC_SUFFIX = ".codec"
+TEMP_SUFFIX = ".tmp"
+
+# Un lock por ruta: las escrituras al mismo archivo se serializan sin un lock global
+_path_locks: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+
+class CorruptedFileError(ValueError):
+    """El contenido comprimido en disco no se puede descomprimir."""
+
+
+class ZlibCodec:
+    """Codec basado en zlib (biblioteca estándar)."""
+
+    name = "zlib"
+
+    def compressor(self):
+        return zlib.compressobj(6)
+
+    def decompressor(self):
+        return zlib.decompressobj()
+
+
+class ZstdCodec:
+    """Codec basado en Zstandard (requiere el paquete 'zstandard')."""
+
+    name = "zstd"
+
+    def compressor(self):
+        return _zstd.ZstdCompressor(level=3).compressobj()
+
+    def decompressor(self):
+        return _zstd.ZstdDecompressor().decompressobj()
+
+
+CODECS = {"zlib": ZlibCodec()}
+if _zstd is not None:
+    CODECS["zstd"] = ZstdCodec()
+
+
+def is_sidecar(filename: str) -> bool:
+    """
+    Indica si el nombre es el de un archivo auxiliar que genera la app:
+    '<archivo>.<método>.hash', '<archivo>.<método>.sig' o '<archivo>.codec'.
+
+    Solo cuentan los métodos de firma y algoritmos de hash conocidos, así que un
+    archivo subido como 'x.sig' o 'notas.hash' sigue siendo un archivo de datos.
+    """
+    if filename.endswith(CODEC_SUFFIX):
+        return len(filename) > len(CODEC_SUFFIX)
+
+    base, _, suffix = filename.rpartition(".")
+    name, _, method = base.rpartition(".")
+    if not name:
+        return False
+    if suffix == "sig":
+        return method in SIGNING_METHODS
+    return suffix == "hash" and (method in SIGNING_METHODS or method in HASH_ALGORITHMS)
+
+
+def is_temp_file(filename: str) -> bool:
+    """Indica si el archivo es un temporal de una escritura en curso."""
+    return filename.startswith(".") and filename.endswith(TEMP_SUFFIX)
+
+
+def is_data_file(filename: str) -> bool:
+    """Indica si el archivo es un archivo subido (ni auxiliar ni temporal)."""
+    return not is_sidecar(filename) and not is_temp_file(filename)
+
+
+def path_lock(file_path: str | Path) -> asyncio.Lock:
+    """
+    Retorna el lock asociado a una ruta.
+
+    El lock es por proceso; entre procesos la consistencia del archivo de datos la
+    garantiza el rename atómico.
+    """
+    key = str(Path(file_path).absolute())
+    lock = _path_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _path_locks[key] = lock
+    return lock
+
+
+def _fsync_dir(directory: Path):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _temp_path(file_path: Path) -> Path:
+    return file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}{TEMP_SUFFIX}")
+
+
+async def _sync_file(f):
+    """Aplica el fsync del archivo abierto según FSYNC_POLICY."""
+    if FSYNC_POLICY in ("file", "dir"):
+        await f.flush()
+        await asyncio.to_thread(os.fsync, f.fileno())
+
+
+async def _sync_dir(file_path: Path):
+    """Aplica el fsync del directorio según FSYNC_POLICY."""
+    if FSYNC_POLICY == "dir":
+        await asyncio.to_thread(_fsync_dir, file_path.parent)
+
+
+async def atomic_write(file_path: str | Path, data: bytes | str):
+    """
+    Escribe un archivo de forma atómica: temporal en el mismo directorio + rename.
+
+    Un lector concurrente ve el contenido anterior completo o el nuevo completo,
+    nunca uno a medias. El fsync se aplica según FSYNC_POLICY.
+    """
+    file_path = Path(file_path)
+    if isinstance(data, str):
+        data = data.encode()
+
+    temp_path = _temp_path(file_path)
+    try:
+        async with aiofiles.open(temp_path, "wb") as f:
+            await f.write(data)
+            await _sync_file(f)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    await _sync_dir(file_path)
+
+
+def _configured_codec():
+    """Retorna el codec configurado o None si la compresión está desactivada."""
+    if STORAGE_COMPRESSION == "off":
+        return None
+    if STORAGE_COMPRESSION == "auto":
+        return CODECS.get("zstd", CODECS["zlib"])
+    return CODECS.get(STORAGE_COMPRESSION, CODECS["zlib"])
+
+
+def choose_codec(sample: bytes):
+    """
+    Prueba la compresibilidad de una muestra del archivo.
+
+    :return: El codec a usar o None si no vale la pena comprimir.
+    """
+    codec = _configured_codec()
+    if codec is None or not sample:
+        return None
+
+    probe = sample[:PROBE_SIZE]
+    compressor = codec.compressor()
+    compressed_size = len(compressor.compress(probe)) + len(compressor.flush())
+    if compressed_size >= len(probe) * COMPRESSION_MIN_RATIO:
+        return None
+    return codec
+
+
+def _codec_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + CODEC_SUFFIX)
+
+
+def read_codec_info(file_path: str | Path) -> dict | None:
+    """
+    Lee el archivo .codec de un archivo almacenado.
+
+    :return: {'codec': nombre, 'size': tamaño original} o None si no está comprimido.
+    """
+    file_path = Path(file_path)
+    codec_path = _codec_path(file_path)
+    if not codec_path.exists():
+        return None
+
+    fields = {}
+    for line in codec_path.read_text().strip().splitlines():
+        key, _, value = line.partition(":")
+        fields[key.strip()] = value.strip()
+
+    # El .codec y el archivo de datos se reemplazan por separado; si el tamaño en
+    # disco no coincide, el .codec pertenece a otra versión del archivo.
+    stored_size = fields.get("Tamaño en disco")
+    if stored_size is not None and int(stored_size) != file_path.stat().st_size:
+        return None
+
+    return {"codec": fields["Codec"], "size": int(fields["Tamaño"])}
+
+
+async def write_stream(
+    file_path: str | Path,
+    chunks: AsyncIterator[bytes],
+    on_chunk: Callable[[bytes], None] | None = None,
+) -> dict:
+    """
+    Guarda un archivo subido bloque a bloque, de forma atómica y comprimiéndolo si
+    conviene.
+
+    La compresibilidad se decide con los primeros PROBE_SIZE bytes. 'on_chunk' recibe
+    cada bloque original (por ejemplo, para calcular hashes sin releer el archivo).
+
+    :return: {'codec': nombre o None, 'size': bytes originales,
+              'stored_size': bytes en disco}
+    """
+    file_path = Path(file_path)
+    codec_path = _codec_path(file_path)
+    temp_path = _temp_path(file_path)
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as f:
+            # Muestra para decidir el codec
+            head = []
+            head_size = 0
+            iterator = chunks.__aiter__()
+            async for chunk in iterator:
+                head.append(chunk)
+                head_size += len(chunk)
+                if head_size >= PROBE_SIZE:
+                    break
+
+            head = b"".join(head)
+            codec = choose_codec(head)
+            compressor = codec.compressor() if codec else None
+
+            async def emit(chunk: bytes):
+                nonlocal size
+                size += len(chunk)
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                await f.write(compressor.compress(chunk) if compressor else chunk)
+
+            await emit(head)
+            async for chunk in iterator:
+                await emit(chunk)
+            if compressor:
+                await f.write(compressor.flush())
+
+            stored_size = await f.tell()
+            await _sync_file(f)
+
+        # El .codec se escribe antes que los datos; ver read_codec_info
+        if codec:
+            await atomic_write(
+                codec_path,
+                f"Codec: {codec.name}\nTamaño: {size}\nTamaño en disco: {stored_size}",
+            )
+        os.replace(temp_path, file_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    if not codec:
+        codec_path.unlink(missing_ok=True)
+    await _sync_dir(file_path)
+
+    return {
+        "codec": codec.name if codec else None,
+        "size": size,
+        "stored_size": stored_size,
+    }
+
+
+async def write_file(file_path: str | Path, data: bytes) -> dict:
+    """Guarda el contenido completo de un archivo; ver write_stream."""
+
+    async def single_chunk():
+        yield data
+
+    return await write_stream(file_path, single_chunk())
+
+
+async def iter_file(
+    file_path: str | Path, chunk_size: int = READ_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Lee un archivo almacenado por bloques, descomprimiéndolo si es necesario."""
+    info = read_codec_info(file_path)
+    if info and info["codec"] not in CODECS:
+        raise ValueError(f"Codec no disponible: {info['codec']}")
+    decompressor = CODECS[info["codec"]].decompressor() if info else None
+
+    async with aiofiles.open(file_path, "rb") as f:
+        while chunk := await f.read(chunk_size):
+            if decompressor is None:
+                yield chunk
+                continue
+            try:
+                data = decompressor.decompress(chunk)
+            except Exception as e:
+                raise CorruptedFileError(f"Archivo comprimido dañado: {e}")
+            if data:
+                yield data
+
+    if decompressor is not None and hasattr(decompressor, "flush"):
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+async def read_file(file_path: str | Path) -> bytes:
+    """Lee el contenido original completo de un archivo almacenado."""
+    return b"".join([chunk async for chunk in iter_file(file_path)])
+
+
+def stored_size(file_path: str | Path) -> int:
+    """Retorna los bytes que ocupa en disco un archivo almacenado (0 si no existe)."""
+    try:
+        return Path(file_path).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def original_size(file_path: str | Path) -> int:
+    """Retorna el tamaño original (sin comprimir) de un archivo almacenado."""
+    info = read_codec_info(file_path)
+    return info["size"] if info else Path(file_path).stat().st_size
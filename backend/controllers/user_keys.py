@@ -0,0 +1,90 @@
+from datetime import UTC, datetime
+
+from sqlalchemy import insert
+
+from controllers.keys import der_to_pem, key_fingerprint, pem_to_der
+from database import UserKey, db
+from database.queries import (
+    REVOKE_ACTIVE_KEYS,
+    USER_ID_BY_EMAIL,
+    USER_KEYS_FOR_VERIFICATION,
+)
+
+
+def rotate_public_keys(user_email: str, public_keys: dict[str, str]) -> dict | None:
+    """
+    Registra nuevas llaves públicas (PEM por algoritmo) y revoca las activas anteriores.
+
+    Las llaves revocadas se conservan para verificar archivos firmados antes de rotar.
+
+    :return: Huella de cada llave nueva por algoritmo, o None si el usuario no existe.
+    """
+    rows = []
+    for algorithm, pem in public_keys.items():
+        der = pem_to_der(pem)
+        rows.append(
+            {
+                "algorithm": algorithm,
+                "public_key": der,
+                "fingerprint": key_fingerprint(der),
+            }
+        )
+
+    with db.write() as session:
+        user_id = session.scalar(USER_ID_BY_EMAIL, {"email": user_email})
+        if user_id is None:
+            return None
+
+        now = datetime.now(UTC)
+        session.execute(
+            REVOKE_ACTIVE_KEYS,
+            {"owner_id": user_id, "key_algorithms": list(public_keys), "revoked": now},
+        )
+        session.execute(
+            insert(UserKey),
+            [{**row, "user_id": user_id, "created_at": now} for row in rows],
+        )
+
+    return {row["algorithm"]: row["fingerprint"] for row in rows}
+
+
+def find_public_keys(
+    user_email: str, fingerprints: dict[str, str | None]
+) -> dict | None:
+    """
+    Busca, en una sola consulta, la llave pública de cada algoritmo de 'fingerprints'.
+
+    Si la huella es None (archivos firmados antes de registrar huellas) se usa la
+    llave activa del algoritmo. Una huella que no es del usuario no se resuelve.
+
+    :return: {algoritmo: {'fingerprint', 'pem', 'revoked'}}, o None si el usuario no
+             existe.
+    """
+    with db.read() as session:
+        user_id = session.scalar(USER_ID_BY_EMAIL, {"email": user_email})
+        if user_id is None:
+            return None
+        rows = session.execute(
+            USER_KEYS_FOR_VERIFICATION,
+            {
+                "user_id": user_id,
+                "fingerprints": [fp for fp in fingerprints.values() if fp],
+                "algorithms": [alg for alg, fp in fingerprints.items() if not fp],
+            },
+        ).all()
+
+    found = {}
+    for row in rows:
+        if row.algorithm not in fingerprints:
+            continue
+        wanted = fingerprints[row.algorithm]
+        if wanted is None and row.revoked_at is not None:
+            continue
+        if wanted is not None and wanted != row.fingerprint:
+            continue
+        found[row.algorithm] = {
+            "fingerprint": row.fingerprint,
+            "pem": der_to_pem(row.public_key),
+            "revoked": row.revoked_at is not None,
+        }
+    return found
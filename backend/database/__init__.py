@@ -1,16 +1,62 @@
 from .database import Database
-from .schemas import User
+from .migrations import migrate_legacy_public_keys, migrate_storage_used
+from .schemas import User, UserKey
 import os
-import redis
 
 current_directory = os.path.dirname(os.path.abspath(__file__))
-db = Database(f"{current_directory}/database.db")
+# El motor se crea con el primer uso (ver Database.engine)
+db = Database(os.getenv("DATABASE_PATH", f"{current_directory}/database.db"))
 
+_redis_client = None
 
-redis_instance = redis.Redis(
-    host=os.getenv("REDIS_HOST", "localhost"), port=6379, db=0, decode_responses=True
-)
 
-redis_instance.flushall()
+def get_redis():
+    """
+    Retorna el cliente de Redis, creándolo en el primer uso.
 
-__all__ = ["db", "User", "redis_instance"]
+    Importar el paquete no importa 'redis' ni abre conexiones; el cliente se crea
+    en el lifespan de la app o en la primera petición que lo necesite.
+    """
+    global _redis_client
+    if _redis_client is None:
+        from .redis_client import create_redis_client
+
+        _redis_client = create_redis_client()
+    return _redis_client
+
+
+def __getattr__(name):
+    # Compatibilidad: 'from database import redis_instance'
+    if name == "redis_instance":
+        return get_redis()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def init_storage(flush_redis: bool = True):
+    """
+    Inicialización única, antes de levantar los workers (ver prestart.py).
+
+    Crea el esquema, activa WAL, migra las llaves públicas antiguas, agrega la
+    columna de uso de almacenamiento a bases anteriores y, si se pide,
+    limpia los contadores de intentos de login en Redis. No se ejecuta al importar
+    el módulo: cada worker lo importa y no debe borrar el estado de los demás.
+    """
+    db.create_tables()
+    db.enable_wal()
+    migrate_legacy_public_keys(db.engine)
+    migrate_storage_used(db.engine)
+    if flush_redis:
+        # Solo los contadores de intentos de login: las sesiones de refresh token
+        # (rt:*) sobreviven al despliegue
+        redis_client = get_redis()
+        keys = []
+        for key in redis_client.scan_iter("login:*", count=1000):
+            keys.append(key)
+            if len(keys) == 1000:
+                redis_client.delete(*keys)
+                keys.clear()
+        if keys:
+            redis_client.delete(*keys)
+
+
+__all__ = ["db", "User", "UserKey", "get_redis", "init_storage"]
@@ -1,12 +1,25 @@
 import logging
+import os
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+
 from database.schemas import Base
+from monitoring import DB_SESSION_DURATION, span, timer
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Registra cada sentencia SQL (solo para depurar: tiene un costo alto por consulta)
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
 
 class Database:
     """Clase para la conexión a la base de datos SQLite."""
@@ -15,24 +28,59 @@ class Database:
         """
         Conecta a la base de datos SQLite y crea el motor.
 
+        No se conecta aquí: el motor se crea con el primer uso y las tablas las crean
+        prestart.py y el lifespan de la app, para que importar el módulo no tenga
+        efectos.
+
         :param db_path: Ruta al archivo de la base de datos SQLite
         """
         self.db_path = db_path
-        self.engine = None
-        self.session_factory = None
-
-        self.connect()
-        self.session_factory = sessionmaker(bind=self.engine)
-        self.create_tables()
+        self._engine = None
+        self._session_factory = None
 
     def connect(self):
         """Conecta a la base de datos SQLite y crea un motor."""
         connection_string = f"sqlite:///{self.db_path}"
-        self.engine = create_engine(connection_string, echo=True)
+        self._engine = create_engine(connection_string, echo=SQL_ECHO)
+        # SQLite no aplica las llaves foráneas (ON DELETE CASCADE) si no se activan
+        event.listen(self._engine, "connect", _enable_foreign_keys)
+        self._session_factory = sessionmaker(bind=self._engine)
+
+    @property
+    def engine(self):
+        """Motor de SQLAlchemy, creado en el primer acceso."""
+        if self._engine is None:
+            self.connect()
+        return self._engine
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            self.connect()
+        return self._session_factory
+
+    def ping(self) -> bool:
+        """Comprueba que la base responde (para la sonda de disponibilidad)."""
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+        return True
 
     def create_tables(self):
         """Crea las tablas en la base de datos si no existen."""
         Base.metadata.create_all(self.engine)
+        # create_all no agrega índices nuevos a tablas que ya existían
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+    def enable_wal(self):
+        """
+        Activa el modo WAL de SQLite (persistente en el archivo).
+
+        Con varios workers, los lectores no se bloquean mientras otro proceso escribe.
+        """
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
 
     def get_session(self):
         """
@@ -49,16 +97,20 @@ class Database:
 
         :return: Sesión de base de datos y el código de estado
         """
-        session = self.get_session()
-        try:
-            yield session  # Yield the session to the 'with' block
-            session.commit()
-        except Exception as error:
-            logger.error(f"Error en la operación de escritura: {error}")
-            session.rollback()
-            raise  # Re-raise the exception to propagate it
-        finally:
-            session.close()
+        with (
+            timer(DB_SESSION_DURATION, mode="write"),
+            span("db.write", {"db.system": "sqlite"}),
+        ):
+            session = self.get_session()
+            try:
+                yield session  # Yield the session to the 'with' block
+                session.commit()
+            except Exception as error:
+                logger.error(f"Error en la operación de escritura: {error}")
+                session.rollback()
+                raise  # Re-raise the exception to propagate it
+            finally:
+                session.close()
 
     @contextmanager
     def read(self):
@@ -67,22 +119,26 @@ class Database:
 
         :return: Sesión de base de datos
         """
-        session = self.get_session()
-        try:
-            yield session
-        except Exception as error:
-            logger.error(f"Error en la operación de lectura: {error}")
-            session.rollback()
-        finally:
-            session.close()
+        with (
+            timer(DB_SESSION_DURATION, mode="read"),
+            span("db.read", {"db.system": "sqlite"}),
+        ):
+            session = self.get_session()
+            try:
+                yield session
+            except Exception as error:
+                logger.error(f"Error en la operación de lectura: {error}")
+                session.rollback()
+            finally:
+                session.close()
 
 
 if __name__ == "__main__":
-    import os
     from database.schemas import User
 
     current_directory = os.path.dirname(os.path.abspath(__file__))
     db = Database(f"{current_directory}/example.db")
+    db.create_tables()
 
     with db.write() as session:
         # Create a test user
@@ -0,0 +1,108 @@
+import logging
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from .schemas import UserKey
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Columnas PEM que tenía la tabla users antes de user_keys
+LEGACY_KEY_COLUMNS = {
+    "public_key_RSA": "rsa",
+    "public_key_ECC": "ecc",
+    "public_key_ED25519": "ed25519",
+}
+
+
+def migrate_legacy_public_keys(engine: Engine) -> int:
+    """
+    Copia las llaves PEM de las columnas antiguas de users a user_keys y elimina las
+    columnas.
+
+    Idempotente: en una base ya migrada (o nueva) no hace nada. Se ejecuta una sola
+    vez antes de levantar los workers (init_storage).
+
+    :return: Número de llaves migradas
+    """
+    from controllers.keys import key_fingerprint, pem_to_der
+
+    with engine.begin() as connection:
+        columns = {
+            row[1] for row in connection.exec_driver_sql("PRAGMA table_info(users)")
+        }
+        legacy = [column for column in LEGACY_KEY_COLUMNS if column in columns]
+        if not legacy:
+            return 0
+
+        rows = connection.exec_driver_sql(
+            f"SELECT id, {', '.join(legacy)} FROM users"
+        ).all()
+        keys = []
+        for user_id, *pems in rows:
+            for column, pem in zip(legacy, pems):
+                if not pem:
+                    continue
+                der = pem_to_der(pem)
+                keys.append(
+                    {
+                        "user_id": user_id,
+                        "algorithm": LEGACY_KEY_COLUMNS[column],
+                        "public_key": der,
+                        "fingerprint": key_fingerprint(der),
+                    }
+                )
+        if keys:
+            connection.execute(insert(UserKey), keys)
+
+        for column in legacy:
+            try:
+                connection.exec_driver_sql(f"ALTER TABLE users DROP COLUMN {column}")
+            except OperationalError:
+                # SQLite < 3.35 no soporta DROP COLUMN: la columna queda sin uso
+                connection.exec_driver_sql(f"UPDATE users SET {column} = NULL")
+
+    logger.info(f"Llaves públicas migradas a user_keys: {len(keys)}")
+    return len(keys)
+
+
+def migrate_storage_used(engine: Engine, base_dir: Path | None = None) -> int:
+    """
+    Agrega la columna users.storage_used a una base anterior a las cuotas y la
+    calcula con lo que ocupan en disco los archivos de cada usuario.
+
+    Idempotente: si la columna ya existe no hace nada.
+
+    :return: Número de usuarios con uso distinto de cero
+    """
+    from controllers.layout import BASE_DIR, iter_stored_files
+    from controllers.storage import stored_size
+
+    base_dir = Path(base_dir or BASE_DIR)
+    with engine.begin() as connection:
+        columns = {
+            row[1] for row in connection.exec_driver_sql("PRAGMA table_info(users)")
+        }
+        if "storage_used" in columns:
+            return 0
+
+        connection.exec_driver_sql(
+            "ALTER TABLE users ADD COLUMN storage_used INTEGER NOT NULL DEFAULT 0"
+        )
+        usage = []
+        for user_id, email in connection.exec_driver_sql("SELECT id, email FROM users"):
+            used = sum(
+                stored_size(path) for path in iter_stored_files(base_dir / email)
+            )
+            if used:
+                usage.append((used, user_id))
+        if usage:
+            connection.exec_driver_sql(
+                "UPDATE users SET storage_used = ? WHERE id = ?", usage
+            )
+
+    logger.info(f"Columna storage_used agregada; usuarios con archivos: {len(usage)}")
+    return len(usage)
@@ -0,0 +1,61 @@
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .schemas import User, UserKey
+
+# Consultas frecuentes por email, construidas una sola vez. SQLAlchemy memoriza la
+# clave de caché de cada objeto, así que en cada ejecución reutiliza el SQL compilado
+# sin volver a construir ni a recorrer la expresión. El email va como parámetro:
+# session.execute(USER_BY_EMAIL, {"email": email}).
+
+# Usuario completo (las llaves públicas están en user_keys)
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+
+USER_ID_BY_EMAIL = select(User.id).where(User.email == bindparam("email"))
+
+# Alta masiva: un email ya registrado se omite en lugar de abortar el lote, y
+# RETURNING dice cuáles se insertaron. Con una lista de filas, SQLAlchemy lo envía
+# como INSERT ... VALUES (...), (...) por páginas.
+INSERT_NEW_USERS = (
+    sqlite_insert(User)
+    .on_conflict_do_nothing(index_elements=[User.email])
+    .returning(User.email)
+)
+
+# Solo las columnas del login, sin cargar la entidad User
+CREDENTIALS_BY_EMAIL = select(User.id, User.email, User.password).where(
+    User.email == bindparam("email")
+)
+
+# Llaves de un usuario: las activas ('algorithms') y las de las huellas pedidas
+# (incluso revocadas, para verificar firmas anteriores a una rotación)
+USER_KEYS_FOR_VERIFICATION = select(
+    UserKey.algorithm, UserKey.fingerprint, UserKey.public_key, UserKey.revoked_at
+).where(
+    UserKey.user_id == bindparam("user_id"),
+    (
+        UserKey.fingerprint.in_(bindparam("fingerprints", expanding=True))
+        | (
+            UserKey.revoked_at.is_(None)
+            & UserKey.algorithm.in_(bindparam("algorithms", expanding=True))
+        )
+    ),
+)
+
+REVOKE_ACTIVE_KEYS = (
+    update(UserKey)
+    .where(
+        UserKey.user_id == bindparam("owner_id"),
+        UserKey.algorithm.in_(bindparam("key_algorithms", expanding=True)),
+        UserKey.revoked_at.is_(None),
+    )
+    .values(revoked_at=bindparam("revoked"))
+    .execution_options(synchronize_session=False)
+)
+
+# DELETE directo, sin cargar el usuario antes (user_keys se borra en cascada)
+DELETE_USER_BY_EMAIL = (
+    delete(User)
+    .where(User.email == bindparam("email"))
+    .execution_options(synchronize_session=False)
+)
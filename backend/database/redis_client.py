@@ -0,0 +1,41 @@
+import os
+
+import redis
+
+from monitoring import REDIS_COMMAND_DURATION, span, timer
+
+
+class InstrumentedRedis(redis.Redis):
+    """Cliente de Redis que registra la latencia y un span de cada comando."""
+
+    def execute_command(self, *args, **options):
+        command = str(args[0]).lower()
+        with (
+            timer(REDIS_COMMAND_DURATION, command=command),
+            span(f"redis.{command}", {"db.system": "redis"}),
+        ):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super().pipeline(transaction, shard_hint)
+        execute = pipe.execute
+
+        def timed_execute(*args, **kwargs):
+            with (
+                timer(REDIS_COMMAND_DURATION, command="pipeline"),
+                span("redis.pipeline", {"db.system": "redis"}),
+            ):
+                return execute(*args, **kwargs)
+
+        pipe.execute = timed_execute
+        return pipe
+
+
+def create_redis_client() -> InstrumentedRedis:
+    """Crea el cliente de Redis; la conexión se abre con el primer comando."""
+    return InstrumentedRedis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=0,
+        decode_responses=True,
+    )
@@ -1,21 +1,66 @@
-from sqlalchemy import Column, Integer, String
+from datetime import UTC, datetime
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 
+def _utcnow() -> datetime:
+    return datetime.now(UTC)
+
+
 class User(Base):
     __tablename__ = "users"
-
     id = Column(Integer, primary_key=True, autoincrement=True)
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
     name = Column(String, nullable=True)
     surname = Column(String, nullable=True)
     birthdate = Column(String, nullable=True)
-
-    public_key_RSA = Column(String, nullable=True)
-    public_key_ECC = Column(String, nullable=True)
+    # Bytes ocupados por los archivos del usuario (se actualiza en cada subida)
+    storage_used = Column(Integer, nullable=False, default=0, server_default="0")
 
     def __repr__(self):
         return f"<User(id={self.id}, email={self.email})>"
+
+
+class UserKey(Base):
+    """
+    Llave pública de un usuario. Cada rotación revoca las activas y agrega nuevas.
+
+    Las llaves revocadas se conservan: los archivos firmados guardan la huella de la
+    llave usada (línea 'Llave' del .hash) y se pueden verificar después de rotar.
+    """
+
+    __tablename__ = "user_keys"
+    __table_args__ = (
+        # Llave activa de un usuario por algoritmo (revoked_at IS NULL)
+        Index("ix_user_keys_user_algorithm", "user_id", "algorithm", "revoked_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    algorithm = Column(String, nullable=False)
+    # SubjectPublicKeyInfo en DER (una fracción del PEM, sin base64 ni cabeceras)
+    public_key = Column(LargeBinary, nullable=False)
+    # SHA-256 (hex) del DER; identifica la llave en las firmas
+    fingerprint = Column(String, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+    revoked_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"<UserKey(id={self.id}, algorithm={self.algorithm}, "
+            f"fingerprint={self.fingerprint[:16]})>"
+        )
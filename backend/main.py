@@ -1,13 +1,63 @@
-from fastapi import FastAPI, Request, Response
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from controllers.backends import crypto_backends_loaded, load_crypto_backends
+from controllers.jobs import job_queue
+from controllers.scrubber import SCRUB_ENABLED, scrubber
+from database import db, get_redis
+from middleware import (
+    CompressionMiddleware,
+    MetricsMiddleware,
+    RequestBodyLimitMiddleware,
+    SecurityHeadersMiddleware,
+    TracingMiddleware,
+    UploadProgressMiddleware,
+)
+from monitoring import metrics
+from routes import (
+    auth_router,
+    file_router,  # Import the file router
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Idempotente: con varios workers el esquema ya lo creó prestart.py
+    db.create_tables()
+    # El cliente de Redis abre la conexión con el primer comando
+    get_redis()
+
+    # cryptography y jose se cargan en segundo plano; /ready espera a que terminen
+    crypto_loading = asyncio.create_task(asyncio.to_thread(load_crypto_backends))
+
+    # Verificación de integridad en segundo plano (opcional, un solo worker la ejecuta)
+    if SCRUB_ENABLED:
+        scrubber.start()
+    # Cola de jobs (hash y firma de las subidas)
+    job_queue.start()
+    yield
+    await scrubber.stop()
+    # Los jobs en curso terminan antes de apagar el worker
+    await job_queue.stop()
+    await crypto_loading
 
-from routes import auth_router
-from routes import file_router  # Import the file router
 
 app = FastAPI(
     title="Cifrados: Laboratorio 4",
+    lifespan=lifespan,
 )
 
+# Bytes recibidos de las subidas con X-Upload-Id (dentro del límite de tamaño)
+app.add_middleware(UploadProgressMiddleware)
+
+# Límite de tamaño y backpressure de los cuerpos de petición (dentro de CORS
+# para que las respuestas 413 también lleven las cabeceras CORS)
+app.add_middleware(RequestBodyLimitMiddleware)
+
 # CORS
 origins = ["*"]
 app.add_middleware(
@@ -18,35 +68,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Span raíz por petición (opcional, ver TRACING_EXPORTER)
+app.add_middleware(TracingMiddleware)
+
+# gzip/brotli de las respuestas JSON grandes (las descargas pasan sin tocar)
+app.add_middleware(CompressionMiddleware)
+
+# Métricas por ruta (por fuera de los demás, para medir también su costo)
+app.add_middleware(MetricsMiddleware)
+
+# Cabeceras de seguridad y caché (el más externo: cubre también las respuestas de
+# CORS y 413)
+app.add_middleware(SecurityHeadersMiddleware)
+
 # Routers
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(file_router, prefix="/file", tags=["file"])
 
 
-# --- Middleware de cabeceras de seguridad ---
-@app.middleware("http")
-async def add_security_headers(request: Request, call_next):
-    response: Response = await call_next(request)
+@app.get("/health")
+async def health_check():
+    return {"status": "ok"}
 
-    # 1. Strict-Transport-Security
-    response.headers["Strict-Transport-Security"] = (
-        "max-age=31536000; includeSubDomains; preload"
-    )
 
-    # 2. X-Content-Type-Options
-    response.headers["X-Content-Type-Options"] = "nosniff"
+# Tiempo máximo de cada verificación de /ready
+READINESS_TIMEOUT_SECONDS = 2.0
 
-    # 3. Cache-Control
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
 
-    return response
+async def _probe(check) -> bool:
+    """Ejecuta una verificación bloqueante en un hilo, con tiempo máximo."""
+    try:
+        await asyncio.wait_for(asyncio.to_thread(check), READINESS_TIMEOUT_SECONDS)
+        return True
+    except Exception:
+        return False
 
 
-@app.get("/health")
-async def health_check():
-    return {"status": "ok"}
+@app.get("/ready")
+async def readiness_check():
+    """
+    Sonda de disponibilidad: base de datos, Redis y backends criptográficos listos.
+
+    A diferencia de /health (el proceso responde), retorna 503 mientras alguna
+    dependencia no esté disponible.
+    """
+    checks = {
+        "database": await _probe(db.ping),
+        "redis": await _probe(lambda: get_redis().ping()),
+        "crypto": crypto_backends_loaded(),
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        {"status": "ready" if ready else "not_ready", "checks": checks},
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Exposición de métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 if __name__ == "__main__":
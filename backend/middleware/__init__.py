@@ -0,0 +1,15 @@
+from .compression import CompressionMiddleware
+from .limits import RequestBodyLimitMiddleware
+from .metrics import MetricsMiddleware
+from .progress import UploadProgressMiddleware
+from .security import SecurityHeadersMiddleware
+from .tracing import TracingMiddleware
+
+__all__ = [
+    "CompressionMiddleware",
+    "MetricsMiddleware",
+    "RequestBodyLimitMiddleware",
+    "SecurityHeadersMiddleware",
+    "TracingMiddleware",
+    "UploadProgressMiddleware",
+]
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import zlib
+from functools import lru_cache
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional
+    brotli = None
+
+# Respuestas JSON más chicas que esto se envían sin comprimir
+RESPONSE_COMPRESSION_MIN_BYTES = int(
+    os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")
+)
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+# Cuerpos desde este tamaño se comprimen en el pool de hilos, no en el event loop
+THREAD_COMPRESSION_BYTES = 256 * 1024
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int = RESPONSE_GZIP_LEVEL):
+        # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Comprime 'data'; si no es el final, vacía lo pendiente para enviarlo ya."""
+        mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._compressor.compress(data) + self._compressor.flush(mode)
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int = RESPONSE_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        output = self._compressor.process(data)
+        return output + (
+            self._compressor.finish() if final else self._compressor.flush()
+        )
+
+
+# En orden de preferencia ante la misma calidad ('q') en Accept-Encoding
+ENCODERS = (
+    {"br": BrotliEncoder, "gzip": GzipEncoder} if brotli else {"gzip": GzipEncoder}
+)
+
+
+@lru_cache(maxsize=128)
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Codificación a usar según Accept-Encoding (con sus 'q'), o None si ninguna."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip()] = quality
+
+    default = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in ENCODERS:
+        quality = accepted.get(name, default)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def _is_compressible(raw_headers) -> bool:
+    """Solo JSON ('application/json' o '+json') que no venga ya codificado."""
+    is_json = False
+    for name, value in raw_headers:
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            media_type = value.split(b";", 1)[0].strip().lower()
+            is_json = media_type == b"application/json" or media_type.endswith(b"+json")
+    return is_json
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime con brotli (si está instalado) o gzip las
+    respuestas JSON de al menos 'minimum_size' bytes, según el Accept-Encoding.
+
+    Descargas, zip, SSE y demás tipos pasan sin tocar (y sin perder el envío sin
+    copias de las descargas). Las respuestas JSON en streaming se comprimen por
+    bloque, vaciando el compresor en cada uno para no retrasar los datos.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = RESPONSE_COMPRESSION_MIN_BYTES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        pending_start: Message | None = None
+        encoder = None
+
+        async def compressing_send(message: Message):
+            nonlocal pending_start, encoder
+            if message["type"] == "http.response.start":
+                if _is_compressible(message.get("headers", [])):
+                    # Se decide con el primer bloque del cuerpo (tamaño y streaming)
+                    pending_start = message
+                    return
+                await send(message)
+                return
+
+            if message["type"] != "http.response.body" or (
+                pending_start is None and encoder is None
+            ):
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if pending_start is not None:
+                start, pending_start = pending_start, None
+                headers = MutableHeaders(raw=list(start.get("headers", [])))
+                headers.add_vary_header("Accept-Encoding")
+                start["headers"] = headers.raw
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start)
+                    await send(message)
+                    return
+
+                encoder = ENCODERS[encoding]()
+                headers["Content-Encoding"] = encoder.name
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                body = await self._compress(encoder, body, not more_body)
+                if not more_body:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+            else:
+                body = await self._compress(encoder, body, not more_body)
+
+            await send(
+                {"type": "http.response.body", "body": body, "more_body": more_body}
+            )
+
+        await self.app(scope, receive, compressing_send)
+
+    async def _compress(self, encoder, body: bytes, final: bool) -> bytes:
+        if len(body) >= THREAD_COMPRESSION_BYTES:
+            return await asyncio.to_thread(encoder.compress, body, final)
+        return encoder.compress(body, final)
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Tamaño máximo del cuerpo de una petición (archivo + campos del formulario)
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(101 * 1024 * 1024)))
+# Bytes de cuerpos de petición que se aceptan en paralelo antes de aplicar backpressure
+INFLIGHT_BYTES_LIMIT = int(os.getenv("INFLIGHT_BYTES_LIMIT", str(512 * 1024 * 1024)))
+
+
+class RequestTooLarge(Exception):
+    """El cuerpo de la petición superó el tamaño máximo."""
+
+
+class InflightBytes:
+    """Semáforo de bytes: limita el total de cuerpos de petición en curso."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.used = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, amount: int) -> int:
+        """Espera hasta que haya capacidad para 'amount' bytes y los reserva."""
+        amount = min(amount, self.capacity)
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.used + amount <= self.capacity)
+            self.used += amount
+        return amount
+
+    async def release(self, amount: int):
+        """Libera bytes reservados y despierta a las peticiones en espera."""
+        async with self.condition:
+            self.used -= amount
+            self.condition.notify_all()
+
+
+async def _send_too_large(send: Send, max_body_size: int):
+    body = json.dumps(
+        {"detail": f"El cuerpo de la petición excede {max_body_size} bytes."}
+    ).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class RequestBodyLimitMiddleware:
+    """
+    Middleware ASGI que limita el tamaño de los cuerpos de petición mientras se reciben.
+
+    - Rechaza con 413 si el Content-Length declarado excede el máximo, sin leer el
+      cuerpo.
+    - Cuenta los bytes recibidos y corta con 413 en cuanto se supera el límite, antes de
+      que el parser multipart los acumule.
+    - Reserva el tamaño del cuerpo en un semáforo global de bytes; si no hay capacidad,
+      la petición espera (backpressure) en lugar de agotar la memoria del worker.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_body_size: int = MAX_REQUEST_BYTES,
+        inflight_limit: int = INFLIGHT_BYTES_LIMIT,
+    ):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.inflight = InflightBytes(inflight_limit)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        chunked = b"chunked" in headers.get(b"transfer-encoding", b"").lower()
+        if content_length is None and not chunked:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            declared = int(content_length) if content_length else self.max_body_size
+        except ValueError:
+            declared = self.max_body_size
+        if declared > self.max_body_size:
+            await _send_too_large(send, self.max_body_size)
+            return
+
+        limit = declared if content_length else self.max_body_size
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise RequestTooLarge()
+            return message
+
+        async def guarded_send(message: Message):
+            nonlocal response_started
+            # Si el límite se superó, la respuesta de la app (p. ej. 400 por error de
+            # parseo) se reemplaza por el 413
+            if exceeded:
+                if not response_started:
+                    response_started = True
+                    await _send_too_large(send, self.max_body_size)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        reserved = await self.inflight.acquire(declared)
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except RequestTooLarge:
+            if not response_started:
+                await _send_too_large(send, self.max_body_size)
+        finally:
+            await self.inflight.release(reserved)
@@ -0,0 +1,62 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from monitoring import (
+    HTTP_REQUEST_BYTES,
+    HTTP_REQUEST_DURATION,
+    HTTP_RESPONSE_BYTES,
+)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que registra latencia, estado y bytes de entrada/salida por ruta.
+
+    La ruta se etiqueta con la plantilla (p. ej. '/file/archivos/{user_email}/...') y no
+    con la URL concreta, para mantener acotada la cardinalidad de las series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        bytes_in = 0
+        bytes_out = 0
+
+        async def counting_receive() -> Message:
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Message):
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            elif message["type"] == "http.response.zerocopy":
+                bytes_out += message.get("count", 0)
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route_path,
+                status=str(status),
+            )
+            HTTP_REQUEST_BYTES.inc(bytes_in, route=route_path)
+            HTTP_RESPONSE_BYTES.inc(bytes_out, route=route_path)
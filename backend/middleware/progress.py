@@ -0,0 +1,67 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from controllers.auth import InvalidTokenError, decode_jwt
+from controllers.progress import UPLOAD_ID_PATTERN, UploadProgress
+
+
+def _upload_owner(headers: dict) -> str | None:
+    """Email del usuario del JWT de la petición, o None si no es válido."""
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if not authorization.startswith("Bearer "):
+        return None
+    try:
+        return decode_jwt(authorization.split(" ")[1]).get("user_id")
+    except InvalidTokenError:
+        return None
+
+
+class UploadProgressMiddleware:
+    """
+    Middleware ASGI que reporta los bytes recibidos de las subidas con 'X-Upload-Id'.
+
+    Cuenta el cuerpo mientras llega (etapa 'receiving', antes de que el parser
+    multipart lo termine de leer) y deja el UploadProgress en request.state para
+    que la ruta continúe con las etapas siguientes. Si la ruta no lo toma (p. ej.
+    una petición rechazada), la subida se marca como fallida.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        upload_id = headers.get(b"x-upload-id", b"").decode("latin-1")
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            await self.app(scope, receive, send)
+            return
+        # Solo se crea el progreso de usuarios autenticados; el resto lo rechaza la ruta
+        user_email = _upload_owner(headers)
+        if not user_email:
+            await self.app(scope, receive, send)
+            return
+
+        progress = UploadProgress(user_email, upload_id)
+        try:
+            total = int(headers.get(b"content-length", b""))
+        except ValueError:
+            total = 0
+        progress.update("receiving", force=True, received=0, total=total)
+        scope.setdefault("state", {})["upload_progress"] = progress
+
+        async def counting_receive() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                progress.advance("received", len(message.get("body", b"")))
+                if not message.get("more_body", False):
+                    progress.update(force=True)
+            return message
+
+        try:
+            await self.app(scope, counting_receive, send)
+        finally:
+            if progress.state["stage"] == "receiving":
+                progress.fail("La subida no se procesó")
@@ -0,0 +1,51 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SECURITY_HEADERS = {
+    # 1. Strict-Transport-Security
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains; preload",
+    # 2. X-Content-Type-Options
+    "X-Content-Type-Options": "nosniff",
+    # 3. Cache-Control
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+
+class SecurityHeadersMiddleware:
+    """
+    Middleware ASGI que agrega las cabeceras de seguridad y de caché a cada respuesta.
+
+    Solo modifica el mensaje 'http.response.start': el cuerpo pasa sin copias ni
+    tareas intermedias, a diferencia de @app.middleware("http") (BaseHTTPMiddleware),
+    que envuelve cada respuesta en un stream adicional.
+    """
+
+    def __init__(self, app: ASGIApp, headers: dict | None = None):
+        self.app = app
+        headers = SECURITY_HEADERS if headers is None else headers
+        # Las cabeceras se codifican una sola vez
+        self.names = {name.lower().encode("latin-1") for name in headers}
+        self.raw_headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in headers.items()
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                # Igual que response.headers[...] = ...: reemplaza los valores previos
+                headers = [
+                    (name, value)
+                    for name, value in message.get("headers", [])
+                    if name.lower() not in self.names
+                ]
+                headers.extend(self.raw_headers)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,41 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from monitoring.tracing import parse_traceparent, span, tracing_enabled
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI que abre el span raíz de cada petición HTTP.
+
+    Si la petición trae una cabecera W3C 'traceparent', el span continúa esa traza.
+    Con las trazas desactivadas no agrega trabajo.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not tracing_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+        with span(f"{scope['method']} {scope['path']}", attributes, parent) as root:
+
+            async def traced_send(message: Message):
+                if message["type"] == "http.response.start":
+                    root.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, traced_send)
+
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+                root.set_attribute("http.route", route.path)
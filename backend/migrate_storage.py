@@ -0,0 +1,45 @@
+"""
+Migra FileSection del formato plano ('<email>/<archivo>') al sharded
+('<email>/.shards/<aa>/<bb>/<archivo>', ver controllers.layout).
+
+Se puede correr con la app en marcha: la app lee ambos formatos, los sidecars
+se enlazan primero y el archivo se mueve con un rename atómico. Repite pasadas
+hasta que una no mueva nada (una subida en curso puede volver a escribir en la
+ruta anterior):
+
+    python migrate_storage.py [--base-dir FileSection] [--max-passes 5]
+"""
+
+import argparse
+import logging
+from pathlib import Path
+
+from controllers.layout import BASE_DIR, migrate_storage
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Migra FileSection al formato sharded."
+    )
+    parser.add_argument("--base-dir", type=Path, default=BASE_DIR)
+    parser.add_argument("--max-passes", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    total = 0
+    for number in range(1, args.max_passes + 1):
+        moved = migrate_storage(args.base_dir)
+        logger.info(f"Pasada {number}: {moved} archivos migrados")
+        total += moved
+        if moved == 0:
+            break
+    else:
+        logger.warning("Quedan archivos en el formato anterior; vuelve a ejecutarlo")
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -4,6 +4,7 @@ from pydantic import BaseModel
 class SuccessfulLoginResponse(BaseModel):
     email: str
     jwt_token: str
+    refresh_token: str | None = None
 
 
 class SuccessfulRegisterResponse(BaseModel):
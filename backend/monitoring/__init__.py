@@ -0,0 +1,26 @@
+from .metrics import (
+    CRYPTO_DURATION,
+    DB_SESSION_DURATION,
+    DOWNLOAD_BYTES,
+    DOWNLOAD_THROUGHPUT,
+    HTTP_REQUEST_BYTES,
+    HTTP_REQUEST_DURATION,
+    HTTP_RESPONSE_BYTES,
+    REDIS_COMMAND_DURATION,
+    timer,
+)
+from .tracing import current_span, span
+
+__all__ = [
+    "CRYPTO_DURATION",
+    "DB_SESSION_DURATION",
+    "DOWNLOAD_BYTES",
+    "DOWNLOAD_THROUGHPUT",
+    "HTTP_REQUEST_BYTES",
+    "HTTP_REQUEST_DURATION",
+    "HTTP_RESPONSE_BYTES",
+    "REDIS_COMMAND_DURATION",
+    "current_span",
+    "span",
+    "timer",
+]
@@ -0,0 +1,174 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Métricas registradas, en orden de creación
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Contador acumulativo con etiquetas, en formato de texto de Prometheus."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        return self.values.get(key, 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram:
+    """Histograma con buckets acumulativos, suma y conteo por cada combinación de
+    etiquetas."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        counts, _ = self.values.get(key, ([0], 0.0))
+        return sum(counts)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, (list(c), t)) for key, (c, t) in self.values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            cumulative += counts[-1]
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+@contextmanager
+def timer(histogram: Histogram, **labels):
+    """Mide la duración del bloque y la registra en el histograma."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def render() -> str:
+    """Genera la exposición en formato de texto de Prometheus de todas las métricas."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# --- Métricas de la aplicación ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por ruta, método y estado.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_BYTES = Counter(
+    "http_request_bytes_total",
+    "Bytes recibidos en los cuerpos de petición por ruta.",
+    ("route",),
+)
+HTTP_RESPONSE_BYTES = Counter(
+    "http_response_bytes_total",
+    "Bytes enviados en los cuerpos de respuesta por ruta.",
+    ("route",),
+)
+CRYPTO_DURATION = Histogram(
+    "crypto_operation_duration_seconds",
+    "Duración de operaciones criptográficas (keygen, sign, verify) por algoritmo.",
+    ("operation", "algorithm"),
+)
+DB_SESSION_DURATION = Histogram(
+    "db_session_duration_seconds",
+    "Duración de las sesiones de base de datos (Database.read/write).",
+    ("mode",),
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Latencia de los comandos y pipelines de Redis.",
+    ("command",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+DOWNLOAD_BYTES = Counter(
+    "download_bytes_total",
+    "Bytes enviados en descargas de archivos por modo de envío.",
+    ("mode",),
+)
+DOWNLOAD_THROUGHPUT = Histogram(
+    "download_throughput_bytes_per_second",
+    "Rendimiento de cada descarga (bytes/s) por modo de envío.",
+    ("mode",),
+    buckets=tuple(
+        mib * 1024 * 1024 for mib in (1, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+    ),
+)
@@ -0,0 +1,226 @@
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from pathlib import Path
+
+# off: sin trazas | console: una línea JSON por span en stdout
+# file: JSON lines en TRACING_FILE
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "off").lower()
+TRACING_FILE = Path(os.getenv("TRACING_FILE", "traces.jsonl"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "cifrados-backend")
+
+_current_span: ContextVar = ContextVar("current_span", default=None)
+
+
+def _iso(timestamp_ns: int) -> str:
+    return (
+        datetime.fromtimestamp(timestamp_ns / 1e9, tz=UTC)
+        .isoformat(timespec="microseconds")
+        .replace("+00:00", "Z")
+    )
+
+
+class Span:
+    """
+    Span con los mismos campos que exporta el ConsoleSpanExporter de OpenTelemetry.
+
+    Los identificadores siguen W3C Trace Context (trace_id de 16 bytes, span_id de 8),
+    así que las trazas se pueden correlacionar con las de otros servicios.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        attributes: dict | None = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = "UNSET"
+        self.start_time = time.time_ns()
+        self.end_time = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+
+    def record_exception(self, error: BaseException):
+        """Marca el span como fallido y agrega el evento 'exception'."""
+        self.status = "ERROR"
+        self.events.append(
+            {
+                "name": "exception",
+                "timestamp": _iso(time.time_ns()),
+                "attributes": {
+                    "exception.type": type(error).__name__,
+                    "exception.message": str(error),
+                },
+            }
+        )
+
+    def end(self):
+        self.end_time = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_time or time.time_ns()) - self.start_time) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "context": {
+                "trace_id": f"0x{self.trace_id}",
+                "span_id": f"0x{self.span_id}",
+                "trace_state": "[]",
+            },
+            "kind": "SpanKind.INTERNAL",
+            "parent_id": f"0x{self.parent_id}" if self.parent_id else None,
+            "start_time": _iso(self.start_time),
+            "end_time": _iso(self.end_time or time.time_ns()),
+            "status": {"status_code": self.status},
+            "attributes": self.attributes,
+            "events": self.events,
+            "resource": {"attributes": {"service.name": TRACING_SERVICE_NAME}},
+        }
+
+
+class _NoopSpan:
+    """Span vacío que se usa cuando las trazas están desactivadas."""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_attributes(self, attributes: dict):
+        pass
+
+    def record_exception(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class ConsoleExporter:
+    """Escribe cada span terminado como una línea JSON en la salida estándar."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+class FileExporter:
+    """Agrega cada span terminado como una línea JSON a un archivo local."""
+
+    def __init__(self, path: Path = TRACING_FILE):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self.lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+class MemoryExporter:
+    """Guarda los spans en memoria (útil en pruebas)."""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+
+def _exporter_from_env():
+    if TRACING_EXPORTER == "console":
+        return ConsoleExporter()
+    if TRACING_EXPORTER == "file":
+        return FileExporter()
+    return None
+
+
+_exporter = _exporter_from_env()
+
+
+def set_exporter(exporter):
+    """Cambia el exportador de spans; None desactiva las trazas."""
+    global _exporter
+    _exporter = exporter
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def current_span():
+    """Retorna el span activo en el contexto actual (o el span vacío)."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def parse_traceparent(header: str) -> tuple[str, str] | None:
+    """Lee una cabecera W3C 'traceparent' y retorna (trace_id, span_id) del padre."""
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+
+@contextmanager
+def span(
+    name: str, attributes: dict | None = None, parent: tuple[str, str] | None = None
+):
+    """
+    Abre un span hijo del span activo (o de 'parent', un (trace_id, span_id) remoto).
+
+    Con las trazas desactivadas no crea nada y retorna un span vacío.
+    """
+    exporter = _exporter
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+
+    active = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent
+    elif active is not None:
+        trace_id, parent_id = active.trace_id, active.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+
+    current = Span(name, trace_id, parent_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as error:
+        current.record_exception(error)
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+        exporter.export(current)
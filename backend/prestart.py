@@ -0,0 +1,28 @@
+"""
+Inicialización única antes de levantar los workers de la app.
+
+Crea el esquema de la base y limpia Redis una sola vez, en lugar de que cada
+worker lo haga al importar. serve.py lo ejecuta antes de uvicorn; también se
+puede correr por separado: python prestart.py
+"""
+
+import logging
+import os
+
+from database import init_storage
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Limpia Redis (contadores de intentos de login) en cada despliegue
+REDIS_FLUSH_ON_START = os.getenv("REDIS_FLUSH_ON_START", "true").lower() == "true"
+
+
+def main():
+    init_storage(flush_redis=REDIS_FLUSH_ON_START)
+    logger.info("Inicialización previa completada")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,21 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError
 
-from models.responses import SuccessfulLoginResponse, SuccessfulRegisterResponse
-from models.user import (
-    RegisterRequest,
-    LoginRequest,
-    UpdateUserRequest,
-)  # You need to define this model
-from database import db, User
+from controllers.auth import (
+    BULK_REGISTER_ADMINS,
+    BULK_REGISTER_CHUNK_SIZE,
+    BULK_REGISTER_MAX_REQUESTS,
+    BULK_REGISTER_MAX_USERS,
+    get_current_claims,
+    get_current_user,
+    get_user_by_email,
+    hash_passwords,
+    issue_access_token,
+    register_many,
+    user_exists,
+)
 from controllers.auth import (
     login as login_controller,
+)
+from controllers.auth import (
     register as register_controller,
-    get_current_user,
+)
+from controllers.auth import (
     update as update_controller,
 )
-from controllers.keys import generate_rsa_keys, generate_ecc_keys
-from database import redis_instance
+from controllers.keys import (
+    generate_ecc_keys,
+    generate_ed25519_keys,
+    generate_rsa_keys,
+)
+from controllers.sessions import (
+    create_session,
+    revoke_session,
+    revoke_user_sessions,
+    rotate_session,
+)
+from controllers.user_keys import rotate_public_keys
+from database import User, db, get_redis
+from database.queries import DELETE_USER_BY_EMAIL
+from models.responses import SuccessfulLoginResponse, SuccessfulRegisterResponse
+from models.user import (
+    LoginRequest,
+    LogoutRequest,
+    RefreshRequest,
+    RegisterRequest,
+    UpdateUserRequest,
+)  # You need to define this model
 
 router = APIRouter()
 
@@ -39,8 +75,9 @@ def is_rate_limited(ip: str, email: str) -> bool:
     email_key = f"login:email:{email}"
 
     # Revisar si alguno superó el límite
-    ip_attempts = int(redis_instance.get(ip_key) or 0)
-    email_attempts = int(redis_instance.get(email_key) or 0)
+    redis_client = get_redis()
+    ip_attempts = int(redis_client.get(ip_key) or 0)
+    email_attempts = int(redis_client.get(email_key) or 0)
 
     return ip_attempts >= MAX_ATTEMPTS or email_attempts >= MAX_ATTEMPTS
 
@@ -51,7 +88,7 @@ def register_failed_attempt(ip: str, email: str):
     email_key = f"login:email:{email}"
 
     # IP
-    pipe = redis_instance.pipeline()
+    pipe = get_redis().pipeline()
     pipe.incr(ip_key)
     pipe.expire(ip_key, WINDOW_SECONDS)
     # Email
@@ -62,7 +99,17 @@ def register_failed_attempt(ip: str, email: str):
 
 def reset_attempts(ip: str, email: str):
     """Elimina contadores al autenticarse exitosamente."""
-    redis_instance.delete(f"login:ip:{ip}", f"login:email:{email}")
+    get_redis().delete(f"login:ip:{ip}", f"login:email:{email}")
+
+
+def register_bulk_request(ip: str) -> bool:
+    """Cuenta una petición de alta masiva de la IP; True si superó el límite."""
+    key = f"login:bulk:{ip}"
+    pipe = get_redis().pipeline()
+    pipe.incr(key)
+    pipe.expire(key, WINDOW_SECONDS)
+    requests, _ = pipe.execute()
+    return requests > BULK_REGISTER_MAX_REQUESTS
 
 
 @router.post("/login", response_model=SuccessfulLoginResponse, status_code=200)
@@ -83,7 +130,9 @@ async def login(
     if u and t:
         # Login exitoso → resetea contadores
         reset_attempts(ip, email)
-        return SuccessfulLoginResponse(email=u, jwt_token=t)
+        return SuccessfulLoginResponse(
+            email=u, jwt_token=t, refresh_token=create_session(u)
+        )
 
     # Intento fallido → registrar
     register_failed_attempt(ip, email)
@@ -94,6 +143,43 @@ async def login(
     )
 
 
+@router.post("/refresh", response_model=SuccessfulLoginResponse, status_code=200)
+async def refresh(refresh_request: RefreshRequest) -> SuccessfulLoginResponse:
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+
+    The presented refresh token stops working; presenting it again revokes the
+    whole session.
+    """
+    rotated = rotate_session(refresh_request.refresh_token)
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    email, refresh_token = rotated
+
+    token = issue_access_token(email)
+    if not token:
+        revoke_user_sessions(email)
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    return SuccessfulLoginResponse(
+        email=email, jwt_token=token, refresh_token=refresh_token
+    )
+
+
+@router.post("/logout")
+async def logout(logout_request: LogoutRequest):
+    """
+    Revoke the session of a refresh token, or every session of its user.
+
+    Access tokens already issued remain valid until they expire.
+    """
+    email = revoke_session(logout_request.refresh_token)
+    if email is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if logout_request.all_sessions:
+        revoke_user_sessions(email)
+    return {"message": "Logged out successfully"}
+
+
 @router.post("/register", response_model=SuccessfulRegisterResponse, status_code=201)
 async def register(user: RegisterRequest) -> SuccessfulRegisterResponse:
     """
@@ -124,45 +210,171 @@ async def register(user: RegisterRequest) -> SuccessfulRegisterResponse:
     )
 
 
-@router.post("/generate-keys")
-def generate_keys(user: User = Depends(get_current_user)):
-    """Genera un par de llaves RSA y ECC para el usuario autenticado."""
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'record'}: {err['msg']}"
+        for err in error.errors()
+    )
 
-    with db.write() as session:
-        # Se obtiene el usuario desde la BD
-        user_in_db = session.query(User).filter_by(email=user.email).first()
 
-        if not user_in_db:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+async def _bulk_register_results(records: list) -> AsyncIterator[str]:
+    """Registra los usuarios por bloques y genera una línea NDJSON por registro."""
+    seen = set()
+    for start in range(0, len(records), BULK_REGISTER_CHUNK_SIZE):
+        results = {}
+        valid = []
+        for index, record in enumerate(
+            records[start : start + BULK_REGISTER_CHUNK_SIZE], start
+        ):
+            try:
+                user = RegisterRequest.model_validate(record)
+            except ValidationError as e:
+                results[index] = {
+                    "index": index,
+                    "email": record.get("email") if isinstance(record, dict) else None,
+                    "status": "invalid",
+                    "detail": _validation_detail(e),
+                }
+                continue
+            email = str(user.email)
+            if email in seen:
+                results[index] = {
+                    "index": index,
+                    "email": email,
+                    "status": "conflict",
+                    "detail": "Duplicated email in request",
+                }
+                continue
+            seen.add(email)
+            valid.append((index, email, user))
+
+        # Hash del bloque en paralelo fuera del event loop; luego un solo INSERT
+        hashed = await hash_passwords([user.password for _, _, user in valid])
+        rows = [
+            {
+                "email": email,
+                "password": password,
+                "name": user.name,
+                "surname": user.surname,
+                "birthdate": str(user.birthdate),
+            }
+            for (_, email, user), password in zip(valid, hashed)
+        ]
+        try:
+            created = await run_in_threadpool(register_many, rows)
+        except Exception as e:
+            created = None
+            error = f"Error creating user: {e}"
+
+        for index, email, _ in valid:
+            if created is None:
+                results[index] = {
+                    "index": index,
+                    "email": email,
+                    "status": "error",
+                    "detail": error,
+                }
+            elif email in created:
+                results[index] = {"index": index, "email": email, "status": "created"}
+            else:
+                results[index] = {
+                    "index": index,
+                    "email": email,
+                    "status": "conflict",
+                    "detail": "User already exists",
+                }
+
+        for index in sorted(results):
+            yield json.dumps(results[index]) + "\n"
+
+
+@router.post("/register/bulk")
+async def register_bulk(
+    request: Request,
+    records: list[Any] = Body(...),
+    claims: dict = Depends(get_current_claims),
+):
+    """
+    Register many users in one request.
+
+    Only the emails in BULK_REGISTER_ADMINS may call it (disabled when empty),
+    and each IP is limited to BULK_REGISTER_MAX_REQUESTS requests per window,
+    like failed logins.
 
-        # Generar llaves RSA
-        rsa_private, rsa_public = generate_rsa_keys()
-        # Generar llaves ECC
-        ecc_private, ecc_public = generate_ecc_keys()
+    Each record is validated like /auth/register. Valid records are inserted
+    with one INSERT per chunk of BULK_REGISTER_CHUNK_SIZE; existing emails are
+    reported as conflicts without aborting the batch. The response is NDJSON
+    with one line per record, in order: {"index", "email", "status", "detail"?}
+    where status is created, conflict, invalid or error.
+    """
+    if claims["user_id"].lower() not in BULK_REGISTER_ADMINS:
+        raise HTTPException(
+            status_code=403, detail="Bulk registration is restricted to administrators"
+        )
+    if register_bulk_request(get_client_ip(request)):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many bulk registration requests. Please try again later.",
+        )
+    if len(records) > BULK_REGISTER_MAX_USERS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many users (max {BULK_REGISTER_MAX_USERS})",
+        )
+    return StreamingResponse(
+        _bulk_register_results(records), media_type="application/x-ndjson"
+    )
 
-        # Guardar llaves públicas
-        user_in_db.public_key_RSA = rsa_public
-        user_in_db.public_key_ECC = ecc_public
 
-        session.commit()
+@router.post("/generate-keys")
+def generate_keys(user: User = Depends(get_current_user)):
+    """Genera pares de llaves RSA, ECC y Ed25519 para el usuario autenticado."""
+
+    # Generar llaves RSA
+    rsa_private, rsa_public = generate_rsa_keys()
+    # Generar llaves ECC
+    ecc_private, ecc_public = generate_ecc_keys()
+    # Generar llaves Ed25519
+    ed25519_private, ed25519_public = generate_ed25519_keys()
+
+    # Guardar llaves públicas; las anteriores quedan revocadas pero se conservan
+    fingerprints = rotate_public_keys(
+        user.email, {"rsa": rsa_public, "ecc": ecc_public, "ed25519": ed25519_public}
+    )
+    if fingerprints is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-        return {
-            "message": "Llaves generadas exitosamente.",
-            "rsa_private_key": rsa_private,
-            "ecc_private_key": ecc_private,
-        }
+    return {
+        "message": "Llaves generadas exitosamente.",
+        "rsa_private_key": rsa_private,
+        "ecc_private_key": ecc_private,
+        "ed25519_private_key": ed25519_private,
+        "key_fingerprints": fingerprints,
+    }
 
 
 @router.get("/me")
-async def get_me(user: User = Depends(get_current_user)):
+async def get_me(claims: dict = Depends(get_current_claims)):
     """
     Get current authenticated user's info.
+
+    Tokens issued with JWT_EMBED_PROFILE carry the profile (as of login), so only
+    the user's existence is checked against the email index.
     """
+    if "profile" in claims:
+        if not await run_in_threadpool(user_exists, claims["user_id"]):
+            raise HTTPException(status_code=401, detail="Usuario no encontrado")
+        return {"email": claims["user_id"], **claims["profile"]}
+
+    user = await run_in_threadpool(get_user_by_email, claims["user_id"])
+    if not user:
+        raise HTTPException(status_code=401, detail="Usuario no encontrado")
     return {
         "email": user.email,
         "name": user.name,
         "surname": user.surname,
         "birthdate": user.birthdate,
+        "storage_used": user.storage_used,
     }
 
 
@@ -183,6 +395,8 @@ async def update_me(update: UpdateUserRequest, user: User = Depends(get_current_
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error updating user: {e}")
 
+    # La contraseña o el email pueden haber cambiado
+    revoke_user_sessions(user.email)
     return {"message": "User updated successfully"}
 
 
@@ -192,9 +406,9 @@ async def delete_me(user: User = Depends(get_current_user)):
     Delete current authenticated user.
     """
     with db.write() as session:
-        user_in_db = session.query(User).filter_by(email=user.email).first()
-        if not user_in_db:
-            raise HTTPException(status_code=404, detail="User not found")
-        session.delete(user_in_db)
+        result = session.execute(DELETE_USER_BY_EMAIL, {"email": user.email})
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="User not found")
 
+    revoke_user_sessions(user.email)
     return {"message": "User deleted successfully"}
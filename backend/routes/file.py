@@ -1,117 +1,325 @@
+import asyncio
+import uuid
 from pathlib import Path
-import hashlib
-
-from cryptography.exceptions import InvalidSignature
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import padding, ec
-from fastapi import APIRouter, UploadFile, File, Depends, Form, HTTPException
-from fastapi.responses import FileResponse
-import aiofiles
 
-from controllers.FileServer import save_user_file
+import aiofiles
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from controllers import fs
+from controllers.archive import ARCHIVE_FORMATS, collect_archive_entries, iter_archive
 from controllers.auth import get_current_user
-from database import db, User
+from controllers.download import (
+    DOWNLOAD_CHUNK_SIZE,
+    ZeroCopyFileResponse,
+    metered_stream,
+)
+from controllers.FileServer import load_signing_key, store_user_file, upload_chunks
+from controllers.hashing import (
+    find_hash_file,
+    hash_file,
+    parse_hash_file,
+    parse_key_fingerprint,
+)
+from controllers.jobs import PRIORITY_HIGH, PRIORITY_NORMAL, job_queue
+from controllers.layout import (
+    BASE_DIR,
+    SIGNING_METHODS,
+    find_stored_file_async,
+    iter_stored_files,
+    shard_dir,
+)
+from controllers.progress import (
+    UPLOAD_ID_PATTERN,
+    UploadProgress,
+    iter_progress_events,
+    read_progress,
+)
+from controllers.responses import FastJSONResponse
+from controllers.scrubber import scrubber
+from controllers.storage import iter_file, read_codec_info
+from controllers.user_keys import find_public_keys
+from monitoring import CRYPTO_DURATION, span, timer
 
-BASE_DIR = Path("FileSection")
 router = APIRouter()
 
 
+def _list_all_user_files() -> list[dict]:
+    all_users_files = []
+    for user_folder in BASE_DIR.iterdir():
+        if user_folder.is_dir():
+            user_files = [
+                file.name  # Solo el nombre del archivo
+                for file in iter_stored_files(user_folder)
+            ]
+            all_users_files.append({"user": user_folder.name, "files": user_files})
+    return all_users_files
+
+
 @router.post("/upload")
 async def upload_file(
+    request: Request,
     file: UploadFile = File(...),
     sign: bool = Form(False),
     method: str = Form(None),
     private_key: str = Form(None),
+    hash_algorithm: str = Form(None),
+    background: bool = Form(False),
+    upload_id: str = Header(None, alias="X-Upload-Id"),
     user=Depends(get_current_user),
 ):
     """Sube un archivo a la carpeta del usuario.
     Si se especifica el método y la clave privada, firma el archivo.
+    El algoritmo de hash (sha256, blake2b, ...) se puede elegir por archivo.
+    El hash se guarda junto con el archivo y la firma se escribe en un job; con
+    background=true la respuesta (202) no la espera. Con 'X-Upload-Id' el progreso
+    se consulta en /file/uploads/{upload_id}.
+    """
+    progress = None
+    if upload_id is not None or background:
+        upload_id = upload_id or uuid.uuid4().hex
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise HTTPException(
+                status_code=400,
+                detail="X-Upload-Id inválido: de 8 a 64 letras, números, '-' o '_'.",
+            )
+        # El middleware ya reportó los bytes recibidos; si no, se empieza aquí
+        progress = getattr(request.state, "upload_progress", None)
+        if progress is None:
+            progress = UploadProgress(user.email, upload_id)
+
+    try:
+        if sign:
+            # Una clave ilegible o de otro algoritmo es un 400 antes de guardar nada
+            await asyncio.to_thread(load_signing_key, private_key, method)
+        stored = await store_user_file(
+            file, user.email, hash_algorithm, progress, sign=sign, method=method
+        )
+    except HTTPException as e:
+        if progress is not None:
+            progress.fail(e.detail)
+        raise
+
+    # Los bytes y su hash ya están en disco: la firma sigue en la cola de jobs
+    job_id = uuid.uuid4().hex
+    if progress is not None:
+        progress.update("queued", job_id=job_id)
+    job_queue.enqueue(
+        "upload.finalize",
+        {
+            **stored,
+            "user_email": user.email,
+            "upload_id": upload_id,
+            "sign": sign,
+            "method": method,
+            "private_key": private_key,
+        },
+        owner=user.email,
+        # Primero los jobs de las peticiones que esperan la respuesta
+        priority=PRIORITY_NORMAL if background else PRIORITY_HIGH,
+        job_id=job_id,
+    )
+
+    if background:
+        return JSONResponse(
+            status_code=202,
+            content={
+                "upload_id": upload_id,
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": request.app.url_path_for(
+                    "get_upload_progress", upload_id=upload_id
+                ),
+                "events_url": request.app.url_path_for(
+                    "stream_upload_progress", upload_id=upload_id
+                ),
+                "job_url": request.app.url_path_for("get_job", job_id=job_id),
+            },
+        )
+
+    job = await job_queue.wait(job_id)
+    if job is None or job["status"] != "done":
+        error = job["error"] if job else "el job expiró"
+        raise HTTPException(
+            status_code=500, detail=f"Error durante proceso de hash o firma: {error}"
+        )
+    result = job["result"]
+    return result if upload_id is None else {**result, "upload_id": upload_id}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user=Depends(get_current_user)):
+    """Estado de un job propio: status, intentos, error y resultado."""
+    job = job_queue.get(job_id)
+    if job is None or job["owner"] != user.email:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_progress(upload_id: str, user=Depends(get_current_user)):
+    """Estado de una subida: etapa, bytes recibidos/guardados/firmados y resultado."""
+    state = read_progress(user.email, upload_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Subida no encontrada")
+    return state
+
+
+@router.get("/uploads/{upload_id}/events")
+async def stream_upload_progress(
+    upload_id: str, request: Request, user=Depends(get_current_user)
+):
     """
-    result = await save_user_file(
-        file=file,
-        user_email=user.email,
-        sign=sign,
-        method=method,
-        private_key=private_key,
+    Server-Sent Events con el progreso de una subida: 'progress' en cada cambio
+    y 'done' o 'error' al terminar.
+    """
+    return StreamingResponse(
+        iter_progress_events(user.email, upload_id, request.is_disconnected),
+        media_type="text/event-stream",
+        # Sin buffering en nginx: cada evento llega al cliente en cuanto se emite
+        headers={"X-Accel-Buffering": "no"},
     )
-    return result
 
 
-@router.get("/files")
+@router.get("/files", response_class=FastJSONResponse)
 async def get_all_user_files(user=Depends(get_current_user)):
     """
     Obtiene todos los archivos subidos por cada usuario,
-    excluyendo los archivos de hash (.hash.txt) y firmas (.sig).
+    excluyendo los archivos auxiliares de hash (.hash), firmas (.sig) y codec (.codec).
     Devuelve la información agrupada por usuario.
     """
     try:
-        all_users_files = []
+        # El recorrido completo en un solo salto al pool de hilos; la lista ya es
+        # JSON nativo, así que se serializa directo sin jsonable_encoder
+        return FastJSONResponse(await fs.run(_list_all_user_files))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener archivos: {e}")
 
-        for user_folder in BASE_DIR.iterdir():
-            if user_folder.is_dir():
-                user_email = user_folder.name
-                user_files = []
 
-                for file in user_folder.iterdir():
-                    if (
-                        file.is_file()
-                        and not file.name.endswith(".hash.txt")
-                        and not file.name.endswith(".sig")
-                    ):
-                        user_files.append(file.name)  # Solo el nombre del archivo
+@router.get("/scrubber")
+async def get_scrubber_status(user=Depends(get_current_user)):
+    """Devuelve el progreso y los contadores de la verificación de integridad en
+    segundo plano. Las rutas de archivos corruptos se limitan a las del usuario.
+    """
+    return scrubber.status(user.email)
 
-                all_users_files.append({"user": user_email, "files": user_files})
 
-        return all_users_files
+@router.get("/archivos/{user_email}/descargar")
+async def descargar_archivos(
+    user_email: str,
+    archivos: list[str] = Query(None),
+    formato: str = "zip",
+    sidecars: bool = False,
+    current_user=Depends(get_current_user),
+):
+    """
+    Descarga varios archivos de un usuario en un solo zip o tar.
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al obtener archivos: {e}")
+    Sin 'archivos' se incluyen todos. Con 'sidecars' se agregan los archivos de
+    hash y firma. El archivo se genera al vuelo, sin escribirlo en disco.
+    """
+    formato = formato.lower()
+    if formato not in ARCHIVE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato inválido. Usa uno de: {', '.join(ARCHIVE_FORMATS)}.",
+        )
+
+    entries = await fs.run(
+        collect_archive_entries, BASE_DIR / user_email, archivos, sidecars
+    )
+    return StreamingResponse(
+        metered_stream(
+            iter_archive(entries, formato, DOWNLOAD_CHUNK_SIZE), f"archive_{formato}"
+        ),
+        media_type=ARCHIVE_FORMATS[formato],
+        headers={
+            "Content-Disposition": f'attachment; filename="{user_email}.{formato}"'
+        },
+    )
 
 
 @router.get("/archivos/{user_email}/{filename}/descargar")
 async def descargar_archivo(
     user_email: str, filename: str, current_user=Depends(get_current_user)
 ):
-    file_path = BASE_DIR / user_email / filename
-
-    if not file_path.exists():
+    file_path = await find_stored_file_async(BASE_DIR / user_email, filename)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
 
-    return FileResponse(
+    # Los archivos comprimidos en disco se envían descomprimidos por bloques
+    codec_info = await fs.run(read_codec_info, file_path)
+    if codec_info:
+        return StreamingResponse(
+            metered_stream(iter_file(file_path, DOWNLOAD_CHUNK_SIZE), "decompress"),
+            media_type="application/octet-stream",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                "Content-Length": str(codec_info["size"]),
+            },
+        )
+
+    # sendfile si el servidor lo soporta; si no, bloques desde un mapeo en memoria
+    return ZeroCopyFileResponse(
         path=str(file_path), filename=filename, media_type="application/octet-stream"
     )
 
 
-@router.get("/archivos/{user_email}/{filename}/metadata")
+@router.get(
+    "/archivos/{user_email}/{filename}/metadata", response_class=FastJSONResponse
+)
 async def obtener_metadata(
     user_email: str, filename: str, current_user=Depends(get_current_user)
 ):
-    file_path = BASE_DIR / user_email / filename
+    """
+    Devuelve los métodos de firma del archivo y la llave pública de cada uno.
 
-    if not file_path.exists():
+    La llave es la que se usó al firmar (huella en la línea 'Llave' del .hash), aunque
+    el usuario haya rotado sus llaves después; los archivos sin huella usan la activa.
+    """
+    file_path = await find_stored_file_async(BASE_DIR / user_email, filename)
+    if file_path is None:
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
 
-    rsa_signature = file_path.with_suffix(file_path.suffix + ".rsa.sig")
-    ecc_signature = file_path.with_suffix(file_path.suffix + ".ecc.sig")
-
-    metodo_firma = []
-    public_keys = {}
-
-    with db.read() as session:
-        user = session.query(User).filter_by(email=user_email).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
-
-        if rsa_signature.exists() and user.public_key_RSA:
-            metodo_firma.append("rsa")
-            public_keys["rsa"] = user.public_key_RSA
-
-        if ecc_signature.exists() and user.public_key_ECC:
-            metodo_firma.append("ecc")
-            public_keys["ecc"] = user.public_key_ECC
-
-    return {"metodos_firma": metodo_firma, "llaves_publicas": public_keys}
+    # Las firmas de todos los algoritmos se buscan en paralelo
+    signed = await asyncio.gather(
+        *(
+            fs.exists(file_path.with_name(f"{filename}.{algorithm}.sig"))
+            for algorithm in SIGNING_METHODS
+        )
+    )
+    fingerprints = {}
+    for algorithm, has_signature in zip(SIGNING_METHODS, signed):
+        if not has_signature:
+            continue
+        hash_path = file_path.with_name(f"{filename}.{algorithm}.hash")
+        fingerprint = None
+        if await fs.exists(hash_path):
+            fingerprint = parse_key_fingerprint(await fs.read_text(hash_path))
+        fingerprints[algorithm] = fingerprint
+
+    keys = find_public_keys(user_email, fingerprints)
+    if keys is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    metodo_firma = [algorithm for algorithm in fingerprints if algorithm in keys]
+    return FastJSONResponse(
+        {
+            "metodos_firma": metodo_firma,
+            "llaves_publicas": {alg: keys[alg]["pem"] for alg in metodo_firma},
+            "huellas": {alg: keys[alg]["fingerprint"] for alg in metodo_firma},
+        }
+    )
 
 
 async def verify_signature(
@@ -119,29 +327,57 @@ async def verify_signature(
 ) -> bool:
     """
     Verifica la firma de un archivo con la clave pública proporcionada.
-    Dependiendo del algoritmo de firma, puede ser RSA o ECC.
+    Dependiendo del algoritmo de firma, puede ser RSA, ECC o Ed25519.
     """
+    # Diferido: ver controllers.backends
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, padding
+    from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+
     print(public_key)
     try:
-        async with aiofiles.open(file_path, "rb") as f:
-            file_data = await f.read()
-
-        public_key = serialization.load_pem_public_key(public_key.encode())
+        with span("verify.load_public_key", {"crypto.algorithm": algorithm}):
+            public_key = serialization.load_pem_public_key(public_key.encode())
 
         if algorithm == "rsa":
-            # Verificar con RSA
-            public_key.verify(
-                signature,
-                file_data,
-                padding.PSS(
-                    mgf=padding.MGF1(hashes.SHA256()),
-                    salt_length=padding.PSS.MAX_LENGTH,
-                ),
-                hashes.SHA256(),
-            )
+            # Verificar con RSA (el SHA-256 se calcula por bloques)
+            with span("verify.digest", {"hash.algorithm": "sha256"}):
+                digest = bytes.fromhex(await hash_file(file_path, "sha256"))
+            with (
+                timer(CRYPTO_DURATION, operation="verify", algorithm="rsa"),
+                span("verify.public_key", {"crypto.algorithm": "rsa"}),
+            ):
+                public_key.verify(
+                    signature,
+                    digest,
+                    padding.PSS(
+                        mgf=padding.MGF1(hashes.SHA256()),
+                        salt_length=padding.PSS.MAX_LENGTH,
+                    ),
+                    Prehashed(hashes.SHA256()),
+                )
         elif algorithm == "ecc":
-            # Verificar con ECC
-            public_key.verify(signature, file_data, ec.ECDSA(hashes.SHA256()))
+            # Verificar con ECC (el SHA-256 se calcula por bloques)
+            with span("verify.digest", {"hash.algorithm": "sha256"}):
+                digest = bytes.fromhex(await hash_file(file_path, "sha256"))
+            with (
+                timer(CRYPTO_DURATION, operation="verify", algorithm="ecc"),
+                span("verify.public_key", {"crypto.algorithm": "ecc"}),
+            ):
+                public_key.verify(
+                    signature, digest, ec.ECDSA(Prehashed(hashes.SHA256()))
+                )
+        elif algorithm == "ed25519":
+            # Verificar con Ed25519 (sin hash externo, requiere el contenido completo)
+            with span("verify.read") as read_span:
+                file_data = await fs.read_bytes(file_path)
+                read_span.set_attribute("file.bytes", len(file_data))
+            with (
+                timer(CRYPTO_DURATION, operation="verify", algorithm="ed25519"),
+                span("verify.public_key", {"crypto.algorithm": "ed25519"}),
+            ):
+                public_key.verify(signature, file_data)
         else:
             raise ValueError("Método de firma no soportado.")
 
@@ -150,34 +386,39 @@ async def verify_signature(
         return False
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Error al verificar la firma: {str(e)}"
+            status_code=500, detail=f"Error al verificar la firma: {e!s}"
         )
 
 
 async def _save_temp_file(file: UploadFile) -> Path:
-    """Guarda el archivo temporalmente y retorna su path."""
-    temp_file_path = Path("temp") / file.filename
-    temp_file_path.parent.mkdir(exist_ok=True)
+    """Guarda el archivo temporalmente (con nombre único) y retorna su path."""
+    temp_file_path = Path("temp") / f"{uuid.uuid4().hex}-{file.filename}"
+    await fs.mkdir(temp_file_path.parent, exist_ok=True)
 
-    async with aiofiles.open(temp_file_path, "wb") as f:
-        content = await file.read()
-        await f.write(content)
+    # Se copia por bloques con el mismo límite de tamaño que la subida
+    try:
+        async with aiofiles.open(temp_file_path, "wb") as f:
+            async for chunk in upload_chunks(file):
+                await f.write(chunk)
+    except BaseException:
+        await fs.unlink(temp_file_path, missing_ok=True)
+        raise
 
     return temp_file_path
 
 
 async def _verify_with_signature(
-    temp_file_path: Path, user_dir: Path, filename: str, public_key: str, algorithm: str
+    temp_file_path: Path, file_dir: Path, filename: str, public_key: str, algorithm: str
 ) -> dict:
     """Verifica el archivo usando firma digital."""
-    signature_path = user_dir / f"{filename}.{algorithm}.sig"
+    signature_path = file_dir / f"{filename}.{algorithm}.sig"
 
-    if not signature_path.exists():
+    if not await fs.exists(signature_path):
         raise HTTPException(
             status_code=400, detail=f"Algoritmo de firma {algorithm} no disponible."
         )
 
-    signature_bytes = signature_path.read_bytes()
+    signature_bytes = await fs.read_bytes(signature_path)
     is_valid = await verify_signature(
         str(temp_file_path), public_key, signature_bytes, algorithm
     )
@@ -190,24 +431,24 @@ async def _verify_with_signature(
         )
 
 
-async def _verify_with_hash(temp_file_path: Path, file_hash_path: Path) -> dict:
-    """Verifica la integridad del archivo usando hash."""
-    if not file_hash_path.exists():
+async def _verify_with_hash(temp_file_path: Path, file_hash_path: Path | None) -> dict:
+    """Verifica la integridad del archivo usando el algoritmo de hash almacenado."""
+    if file_hash_path is None or not await fs.exists(file_hash_path):
         raise HTTPException(
             status_code=400,
             detail="Archivo no firmado y sin hash disponible para verificar su integridad.",
         )
 
-    async with aiofiles.open(file_hash_path, "r") as f:
-        stored_hash = (await f.read()).strip()
-
-    # Calcular el hash del archivo
-    file_hash = hashlib.sha256()
-    async with aiofiles.open(temp_file_path, "rb") as f:
-        while chunk := await f.read(4096):
-            file_hash.update(chunk)
+    try:
+        algorithm, stored_hash = parse_hash_file(await fs.read_text(file_hash_path))
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    calculated_hash = file_hash.hexdigest()
+    # Calcular el hash del archivo con el mismo algoritmo con el que se guardó
+    try:
+        calculated_hash = await hash_file(temp_file_path, algorithm)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
     if stored_hash == calculated_hash:
         return {
@@ -235,22 +476,33 @@ async def verificar_autenticidad(
     # Guardar el archivo temporalmente
     temp_file_path = await _save_temp_file(file)
 
-    # Buscar el directorio del usuario
-    user_dir = BASE_DIR / user_email
-    if not user_dir.exists():
-        raise HTTPException(
-            status_code=404, detail="Directorio del usuario no encontrado"
-        )
+    try:
+        # Buscar el directorio del usuario
+        user_dir = BASE_DIR / user_email
+        if not await fs.exists(user_dir):
+            raise HTTPException(
+                status_code=404, detail="Directorio del usuario no encontrado"
+            )
 
-    # Buscar archivos de firma y hash
-    signature_path = user_dir / f"{file.filename}.{algorithm}.sig"
-    file_hash_path = user_dir / f"{file.filename}.hash"
+        # Los sidecars están en la carpeta del archivo guardado
+        stored_path = await find_stored_file_async(user_dir, file.filename)
+        file_dir = (
+            stored_path.parent if stored_path else shard_dir(user_dir, file.filename)
+        )
 
-    # Verificar si el archivo tiene una firma
-    if signature_path.exists():
-        return await _verify_with_signature(
-            temp_file_path, user_dir, file.filename, public_key, algorithm
+        # Buscar archivos de firma y hash
+        signature_path = file_dir / f"{file.filename}.{algorithm}.sig"
+        file_hash_path = await fs.run(
+            find_hash_file, file_dir, file.filename, algorithm
         )
 
-    # Si no tiene firma, verificar con hash
-    return await _verify_with_hash(temp_file_path, file_hash_path)
+        # Verificar si el archivo tiene una firma
+        if await fs.exists(signature_path):
+            return await _verify_with_signature(
+                temp_file_path, file_dir, file.filename, public_key, algorithm
+            )
+
+        # Si no tiene firma, verificar con hash
+        return await _verify_with_hash(temp_file_path, file_hash_path)
+    finally:
+        await fs.unlink(temp_file_path, missing_ok=True)
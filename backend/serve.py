@@ -0,0 +1,57 @@
+"""
+Punto de entrada de producción: inicialización única y uvicorn con varios workers.
+
+El número de workers se toma de WEB_CONCURRENCY o, si no está definido, de los
+CPUs disponibles para el proceso (afinidad y cuota de cgroups del contenedor).
+"""
+
+import math
+import os
+from pathlib import Path
+
+import uvicorn
+
+import prestart
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+
+
+def available_cpus() -> int:
+    """CPUs utilizables: afinidad del proceso limitada por la cuota de cgroups v2."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # no disponible fuera de Linux
+        cpus = os.cpu_count() or 1
+
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    """Workers de uvicorn: WEB_CONCURRENCY o un worker por CPU disponible."""
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    return available_cpus()
+
+
+def main():
+    prestart.main()
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=worker_count(),
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
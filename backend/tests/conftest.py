@@ -0,0 +1,13 @@
+import pytest
+
+from database import init_storage
+
+
+@pytest.fixture(scope="session", autouse=True)
+def storage():
+    """
+    Crea el esquema y limpia Redis una vez por sesión, como prestart.py.
+
+    Las pruebas usan TestClient sin 'with', así que el lifespan de la app no corre.
+    """
+    init_storage(flush_redis=True)
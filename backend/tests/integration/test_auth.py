@@ -1,7 +1,9 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 
-from database import db, User
+from database import db, User, UserKey
 from main import app  # Importa tu app principal de FastAPI
 
 # Crear el cliente de prueba
@@ -72,6 +74,86 @@ def test_register_user_already_exists(auth_headers):
     assert "User already exists" in response.json()["detail"]
 
 
+def test_register_bulk_reports_each_record(auth_headers, monkeypatch):
+    """Prueba el alta masiva con registros válidos, inválidos y en conflicto."""
+    import controllers.auth
+    import routes.auth
+
+    monkeypatch.setattr(routes.auth, "BULK_REGISTER_CHUNK_SIZE", 2)
+    monkeypatch.setattr(routes.auth, "BULK_REGISTER_ADMINS", {"testuser@example.com"})
+    inserts = []
+    monkeypatch.setattr(
+        routes.auth,
+        "register_many",
+        lambda users: (
+            inserts.append(len(users)) or controllers.auth.register_many(users)
+        ),
+    )
+
+    def record(email, name="Bulk"):
+        return {
+            "email": email,
+            "password": "password123",
+            "name": name,
+            "surname": "User",
+            "birthdate": "2001-02-03",
+        }
+
+    response = client.post(
+        "/auth/register/bulk",
+        headers=auth_headers,
+        json=[
+            record("bulk1@example.com"),
+            record("testuser@example.com"),  # ya registrado
+            record("bulk2@example.com", name="<b>"),
+            record("bulk1@example.com"),  # repetido en la petición
+            record("bulk3@example.com"),
+        ],
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["index"], r["status"]) for r in results] == [
+        (0, "created"),
+        (1, "conflict"),
+        (2, "invalid"),
+        (3, "conflict"),
+        (4, "created"),
+    ]
+    assert "name" in results[2]["detail"]
+    assert inserts == [2, 0, 1]
+
+    response = client.post(
+        "/auth/login", json={"email": "bulk3@example.com", "password": "password123"}
+    )
+    assert response.status_code == 200
+
+
+def test_register_bulk_requires_admin_and_is_rate_limited(auth_headers, monkeypatch):
+    """Prueba que el alta masiva exija un administrador y se limite por IP."""
+    import routes.auth
+    from database import get_redis
+
+    records = [{"email": "nadie@example.com"}]
+    assert client.post("/auth/register/bulk", json=records).status_code == 422
+    response = client.post("/auth/register/bulk", headers=auth_headers, json=records)
+    assert response.status_code == 403
+
+    monkeypatch.setattr(routes.auth, "BULK_REGISTER_ADMINS", {"testuser@example.com"})
+    monkeypatch.setattr(routes.auth, "BULK_REGISTER_MAX_REQUESTS", 2)
+    headers = {**auth_headers, "X-Forwarded-For": "203.0.113.7"}
+    try:
+        statuses = [
+            client.post(
+                "/auth/register/bulk", headers=headers, json=records
+            ).status_code
+            for _ in range(3)
+        ]
+    finally:
+        get_redis().delete("login:bulk:203.0.113.7")
+    assert statuses == [200, 200, 429]
+
+
 def test_register_invalid_name():
     """Prueba la validación de Pydantic para caracteres HTML en el nombre."""
     response = client.post(
@@ -97,6 +179,106 @@ def test_get_me(auth_headers):
     assert data["name"] == "Test"
 
 
+def test_get_me_from_embedded_profile(auth_headers, monkeypatch):
+    """Prueba que con JWT_EMBED_PROFILE /me responda desde el token, sin la base."""
+    import controllers.auth
+    import routes.auth
+
+    monkeypatch.setattr(controllers.auth, "JWT_EMBED_PROFILE", True)
+    response = client.post(
+        "/auth/login",
+        json={"email": "testuser@example.com", "password": "password123"},
+    )
+    token = response.json()["jwt_token"]
+
+    def no_db(email):
+        raise AssertionError("/me no debería consultar la base")
+
+    monkeypatch.setattr(routes.auth, "get_user_by_email", no_db)
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "email": "testuser@example.com",
+        "name": "Test",
+        "surname": "User",
+        "birthdate": "2000-01-01",
+        "storage_used": 0,
+    }
+
+    # Un usuario borrado no sigue recibiendo su perfil desde el token
+    client.delete("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+    client.post(
+        "/auth/register",
+        json={
+            "email": "testuser@example.com",
+            "password": "password123",
+            "name": "Test",
+            "surname": "User",
+            "birthdate": "2000-01-01",
+        },
+    )
+
+
+def _login_tokens() -> dict:
+    response = client.post(
+        "/auth/login",
+        json={"email": "testuser@example.com", "password": "password123"},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def _refresh(refresh_token: str):
+    return client.post("/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def test_refresh_rotates_the_refresh_token(auth_headers):
+    """Prueba que /refresh entregue un JWT nuevo y rote el refresh token."""
+    first = _login_tokens()["refresh_token"]
+
+    response = _refresh(first)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["email"] == "testuser@example.com"
+    assert data["refresh_token"] != first
+
+    me = client.get(
+        "/auth/me", headers={"Authorization": f"Bearer {data['jwt_token']}"}
+    )
+    assert me.status_code == 200
+
+    # El token rotado ya no sirve, y reusarlo revoca también el nuevo
+    assert _refresh(first).status_code == 401
+    assert _refresh(data["refresh_token"]).status_code == 401
+
+
+def test_logout_revokes_sessions(auth_headers):
+    """Prueba que /logout cierre una sesión o todas las del usuario."""
+    first = _login_tokens()["refresh_token"]
+    second = _login_tokens()["refresh_token"]
+    third = _login_tokens()["refresh_token"]
+
+    response = client.post("/auth/logout", json={"refresh_token": first})
+    assert response.status_code == 200
+    assert _refresh(first).status_code == 401
+    assert client.post("/auth/logout", json={"refresh_token": first}).status_code == 401
+
+    response = client.post(
+        "/auth/logout", json={"refresh_token": second, "all_sessions": True}
+    )
+    assert response.status_code == 200
+    assert _refresh(third).status_code == 401
+
+
+def test_delete_me_revokes_refresh_tokens(auth_headers):
+    """Prueba que borrar la cuenta invalide sus refresh tokens."""
+    refresh_token = _login_tokens()["refresh_token"]
+    assert client.delete("/auth/me", headers=auth_headers).status_code == 200
+    assert _refresh(refresh_token).status_code == 401
+
+
 def test_update_me(auth_headers):
     """Prueba que se puede actualizar el perfil del usuario."""
     update_data = {
@@ -136,12 +318,31 @@ def test_generate_keys(auth_headers):
     assert "BEGIN PRIVATE KEY" in data["rsa_private_key"]
     assert "BEGIN PRIVATE KEY" in data["ecc_private_key"]
 
-    # Verificar que las llaves públicas se guardaron en la BD
+    # Verificar que las llaves públicas se guardaron en la BD (en DER, con su huella)
     with db.read() as session:
         user = session.query(User).filter_by(email="testuser@example.com").first()
-        assert user.public_key_RSA is not None
-        assert user.public_key_ECC is not None
-        assert "BEGIN PUBLIC KEY" in user.public_key_RSA
+        keys = session.query(UserKey).filter_by(user_id=user.id, revoked_at=None).all()
+        assert {key.algorithm for key in keys} == {"rsa", "ecc", "ed25519"}
+        assert {key.algorithm: key.fingerprint for key in keys} == data[
+            "key_fingerprints"
+        ]
+
+
+def test_metrics_endpoint(auth_headers):
+    """Prueba que /metrics exponga latencias por ruta y tiempos de criptografía."""
+    client.post("/auth/generate-keys", headers=auth_headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'route="/auth/generate-keys"' in body
+    assert (
+        'crypto_operation_duration_seconds_count{operation="keygen",algorithm="rsa"}'
+        in body
+    )
+    assert 'db_session_duration_seconds_count{mode="read"}' in body
+    assert "redis_command_duration_seconds_count" in body
 
 
 def test_delete_me(auth_headers):
@@ -158,3 +359,123 @@ def test_delete_me(auth_headers):
     # Verificar que el token antiguo ya no es válido
     get_resp = client.get("/auth/me", headers=auth_headers)
     assert get_resp.status_code == 401  # Usuario no encontrado
+
+
+def test_baseline_database_is_upgraded(tmp_path):
+    """Prueba que una base con el esquema original quede usable tras init_storage."""
+    from sqlalchemy import create_engine
+
+    from controllers.layout import sharded_path
+    from database.database import Database
+    from database.migrations import migrate_legacy_public_keys, migrate_storage_used
+
+    db_path = tmp_path / "baseline.db"
+    with create_engine(f"sqlite:///{db_path}").begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, "
+            "email VARCHAR NOT NULL UNIQUE, password VARCHAR NOT NULL, "
+            "name VARCHAR, surname VARCHAR, birthdate VARCHAR, "
+            "public_key_RSA VARCHAR, public_key_ECC VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO users (email, password) VALUES (?, ?), (?, ?)",
+            ("con-archivos@example.com", "x", "sin-archivos@example.com", "x"),
+        )
+    user_folder = tmp_path / "FileSection" / "con-archivos@example.com"
+    user_folder.mkdir(parents=True)
+    (user_folder / "antiguo.txt").write_bytes(b"x" * 300)
+    (user_folder / "antiguo.txt.sha256.hash").write_text("no cuenta")
+    sharded = sharded_path(user_folder, "nuevo.txt")
+    sharded.parent.mkdir(parents=True)
+    sharded.write_bytes(b"y" * 200)
+
+    # Los mismos pasos que init_storage
+    legacy_db = Database(str(db_path))
+    legacy_db.create_tables()
+    migrate_legacy_public_keys(legacy_db.engine)
+    assert migrate_storage_used(legacy_db.engine, tmp_path / "FileSection") == 1
+    assert migrate_storage_used(legacy_db.engine, tmp_path / "FileSection") == 0
+
+    with legacy_db.read() as session:
+        with_files = (
+            session.query(User).filter_by(email="con-archivos@example.com").one()
+        )
+        without_files = (
+            session.query(User).filter_by(email="sin-archivos@example.com").one()
+        )
+    assert with_files.storage_used == 500
+    assert without_files.storage_used == 0
+
+
+def test_user_lookups_use_email_indexes():
+    """Prueba que las búsquedas por email usen índices sin cargar las llaves."""
+    from database.queries import CREDENTIALS_BY_EMAIL, USER_BY_EMAIL
+
+    with db.engine.connect() as connection:
+        plan = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + str(CREDENTIALS_BY_EMAIL.compile(db.engine)),
+            ("x@example.com",),
+        ).all()
+    assert "USING INDEX" in plan[0][-1]
+    assert "user_keys" not in str(CREDENTIALS_BY_EMAIL.compile(db.engine))
+
+    assert "users.email = ?" in str(USER_BY_EMAIL.compile(db.engine))
+
+
+def test_key_rotation_keeps_previous_keys(auth_headers):
+    """Prueba que rotar llaves revoque las anteriores sin borrarlas."""
+    first = client.post("/auth/generate-keys", headers=auth_headers).json()
+    second = client.post("/auth/generate-keys", headers=auth_headers).json()
+    assert first["key_fingerprints"]["rsa"] != second["key_fingerprints"]["rsa"]
+
+    with db.read() as session:
+        revoked = {
+            key.fingerprint: key.revoked_at
+            for key in session.query(UserKey).filter(
+                UserKey.fingerprint.in_(
+                    [
+                        first["key_fingerprints"]["rsa"],
+                        second["key_fingerprints"]["rsa"],
+                    ]
+                )
+            )
+        }
+    assert revoked[first["key_fingerprints"]["rsa"]] is not None
+    assert revoked[second["key_fingerprints"]["rsa"]] is None
+
+
+def test_legacy_public_key_columns_are_migrated(tmp_path):
+    """Prueba la migración de las columnas PEM antiguas de users a user_keys."""
+    from sqlalchemy import create_engine, inspect
+
+    from controllers.keys import der_to_pem, generate_ecc_keys
+    from database.migrations import migrate_legacy_public_keys
+    from database.schemas import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, "
+            "email VARCHAR NOT NULL UNIQUE, password VARCHAR NOT NULL, "
+            "name VARCHAR, surname VARCHAR, birthdate VARCHAR, "
+            "storage_used INTEGER DEFAULT 0 NOT NULL, public_key_RSA VARCHAR, "
+            "public_key_ECC VARCHAR, public_key_ED25519 VARCHAR)"
+        )
+        _, ecc_public = generate_ecc_keys()
+        connection.exec_driver_sql(
+            "INSERT INTO users (email, password, public_key_ECC) VALUES (?, ?, ?)",
+            ("antiguo@example.com", "x", ecc_public),
+        )
+    Base.metadata.create_all(engine)
+
+    assert migrate_legacy_public_keys(engine) == 1
+    assert migrate_legacy_public_keys(engine) == 0
+
+    columns = {column["name"] for column in inspect(engine).get_columns("users")}
+    assert "public_key_ECC" not in columns
+    with engine.connect() as connection:
+        algorithm, der = connection.exec_driver_sql(
+            "SELECT algorithm, public_key FROM user_keys"
+        ).one()
+    assert algorithm == "ecc"
+    assert der_to_pem(der) == ecc_public
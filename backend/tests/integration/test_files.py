@@ -1,10 +1,20 @@
-import pytest
+import io
 import os
 import shutil
-import io
+import tarfile
+import time
+import zipfile
+
+import pytest
 from fastapi.testclient import TestClient
+
+from controllers.keys import (
+    generate_ecc_keys,
+    generate_ed25519_keys,
+    generate_rsa_keys,
+)
+from controllers.layout import BASE_DIR, sharded_path
 from main import app  # Importa tu app principal de FastAPI
-from controllers.keys import generate_rsa_keys, generate_ecc_keys
 
 # --- Configuración del Cliente ---
 # Se define 'client' aquí a nivel de módulo.
@@ -12,6 +22,11 @@ from controllers.keys import generate_rsa_keys, generate_ecc_keys
 client = TestClient(app)
 
 
+def stored_path(user_email: str, filename: str) -> str:
+    """Ruta en disco de un archivo subido (y prefijo de sus sidecars)."""
+    return str(sharded_path(BASE_DIR / user_email, filename))
+
+
 # --- Fixtures ---
 
 
@@ -75,9 +90,11 @@ def test_keys():
     """
     rsa_priv, rsa_pub = generate_rsa_keys()
     ecc_priv, ecc_pub = generate_ecc_keys()
+    ed25519_priv, ed25519_pub = generate_ed25519_keys()
     return {
         "rsa": {"private": rsa_priv, "public": rsa_pub},
         "ecc": {"private": ecc_priv, "public": ecc_pub},
+        "ed25519": {"private": ed25519_priv, "public": ed25519_pub},
     }
 
 
@@ -105,7 +122,7 @@ def test_upload_file_no_sign(auth_headers, auth_user):
 
     # Verificar que el archivo existe en el servidor
     user_email = auth_user["email"]
-    expected_path = f"FileSection/{user_email}/test_unsigned.txt"
+    expected_path = stored_path(user_email, "test_unsigned.txt")
     assert os.path.exists(expected_path)
 
 
@@ -133,7 +150,7 @@ def test_upload_file_with_rsa_sign(auth_headers, auth_user, test_keys):
 
     # Verificar que existen el archivo original, la firma y el hash
     user_email = auth_user["email"]
-    base_path = f"FileSection/{user_email}/test_signed_rsa.txt"
+    base_path = stored_path(user_email, "test_signed_rsa.txt")
     assert os.path.exists(base_path)
     assert os.path.exists(f"{base_path}.rsa.sig")
     assert os.path.exists(f"{base_path}.rsa.hash")
@@ -161,7 +178,7 @@ def test_upload_file_with_ecc_sign(auth_headers, auth_user, test_keys):
     assert "ecc_signature" in response.json()
 
     user_email = auth_user["email"]
-    base_path = f"FileSection/{user_email}/test_signed_ecc.txt"
+    base_path = stored_path(user_email, "test_signed_ecc.txt")
     assert os.path.exists(base_path)
     assert os.path.exists(f"{base_path}.ecc.sig")
     assert os.path.exists(f"{base_path}.ecc.hash")
@@ -183,10 +200,52 @@ def test_upload_sign_missing_key(auth_headers):
         "/file/upload", headers=auth_headers, files=file_to_upload, data=form_data
     )
 
-    assert response.status_code == 500
+    assert response.status_code == 400
     assert "Se requiere método de firma y clave privada" in response.json()["detail"]
 
 
+def test_upload_rejects_key_of_another_method(auth_headers, auth_user, test_keys):
+    """Prueba que una clave de otro algoritmo sea un 400 y no se guarde el archivo."""
+    filename = "clave_equivocada.txt"
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(b"contenido"), "text/plain")},
+        # Sin 'method' se firma con Ed25519, pero la clave es RSA
+        data={"sign": True, "private_key": test_keys["rsa"]["private"]},
+    )
+
+    assert response.status_code == 400
+    assert "no corresponde al método de firma 'ed25519'" in response.json()["detail"]
+    assert not os.path.exists(stored_path(auth_user["email"], filename))
+
+
+def test_files_named_like_sidecars(auth_headers, auth_user):
+    """Prueba que 'x.sig' se liste y que un nombre de sidecar generado sea un 400."""
+    for filename in ("x.sig", "notas.hash"):
+        response = client.post(
+            "/file/upload",
+            headers=auth_headers,
+            files={"file": (filename, io.BytesIO(b"datos"), "text/plain")},
+        )
+        assert response.status_code == 200
+
+    response = client.get("/file/files", headers=auth_headers)
+    user_files = next(
+        item["files"] for item in response.json() if item["user"] == auth_user["email"]
+    )
+    assert {"x.sig", "notas.hash"} <= set(user_files)
+
+    for filename in ("informe.pdf.rsa.sig", "informe.pdf.sha256.hash", "a.codec"):
+        response = client.post(
+            "/file/upload",
+            headers=auth_headers,
+            files={"file": (filename, io.BytesIO(b"datos"), "text/plain")},
+        )
+        assert response.status_code == 400
+        assert "Nombre de archivo reservado" in response.json()["detail"]
+
+
 def test_get_all_user_files(auth_headers, auth_user, test_keys):
     """Prueba que el endpoint /files liste los archivos correctos y oculte los .sig/.hash."""
 
@@ -230,7 +289,8 @@ def test_get_all_user_files(auth_headers, auth_user, test_keys):
     file_list = user_files_data["files"]
     assert "signed.txt" in file_list
     assert "unsigned.txt" in file_list
-    assert len(file_list) >= 2  # Asegurarse que no se colaron los .sig o .hash
+    # Asegurarse que no se colaron los .sig o .hash
+    assert not [name for name in file_list if name.endswith((".sig", ".hash"))]
 
 
 def test_download_file(auth_headers, auth_user):
@@ -392,3 +452,510 @@ def test_verify_signature_invalid_wrong_key(auth_headers, auth_user, test_keys):
 
     assert response.status_code == 400
     assert "La firma RSA no es válida" in response.json()["detail"]
+
+
+def test_upload_with_blake2b_and_verify_hash(auth_headers, auth_user):
+    """Prueba que el algoritmo de hash elegido se guarde y se use al verificar."""
+
+    file_content = b"contenido verificado con blake2b"
+    filename = "blake.txt"
+
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(file_content), "text/plain")},
+        data={"sign": False, "hash_algorithm": "blake2b"},
+    )
+    assert response.status_code == 200
+    assert response.json()["hash_algorithm"] == "blake2b"
+
+    form_data = {
+        "user_email": auth_user["email"],
+        "public_key": "sin-llave",
+        "algorithm": "rsa",
+    }
+
+    # El mismo contenido pasa la verificación de integridad
+    response = client.post(
+        "/file/verificar",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(file_content), "text/plain")},
+        data=form_data,
+    )
+    assert response.status_code == 200
+    assert "integridad ha sido verificada" in response.json()["message"]
+
+    # Un contenido distinto no coincide con el hash almacenado
+    response = client.post(
+        "/file/verificar",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(b"alterado"), "text/plain")},
+        data=form_data,
+    )
+    assert response.status_code == 400
+
+
+def test_upload_invalid_hash_algorithm(auth_headers):
+    """Prueba que un algoritmo de hash desconocido sea rechazado."""
+
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": ("x.txt", io.BytesIO(b"x"), "text/plain")},
+        data={"sign": False, "hash_algorithm": "md4-inexistente"},
+    )
+    assert response.status_code == 400
+
+
+def test_upload_default_method_is_ed25519_and_verifies(
+    auth_headers, auth_user, test_keys
+):
+    """Prueba que sin método se firme con Ed25519 y que la firma se verifique."""
+
+    file_content = b"contenido firmado con ed25519"
+    filename = "verify_ed25519.txt"
+
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(file_content), "text/plain")},
+        data={"sign": True, "private_key": test_keys["ed25519"]["private"]},
+    )
+    assert response.status_code == 200
+    assert "ed25519_signature" in response.json()
+
+    base_path = stored_path(auth_user["email"], filename)
+    assert os.path.exists(f"{base_path}.ed25519.sig")
+
+    response = client.post(
+        "/file/verificar",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(file_content), "text/plain")},
+        data={
+            "user_email": auth_user["email"],
+            "public_key": test_keys["ed25519"]["public"],
+            "algorithm": "ed25519",
+        },
+    )
+    assert response.status_code == 200
+    assert "ED25519" in response.json()["message"]
+
+
+def test_get_metadata_ed25519_signed_file(auth_headers, auth_user):
+    """Prueba que la metadata incluya la llave pública Ed25519 generada."""
+
+    key_gen_response = client.post("/auth/generate-keys", headers=auth_headers)
+    assert key_gen_response.status_code == 200
+    ed25519_private_key = key_gen_response.json()["ed25519_private_key"]
+
+    client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": ("meta_ed.txt", io.BytesIO(b"meta"), "text/plain")},
+        data={"sign": True, "method": "ed25519", "private_key": ed25519_private_key},
+    )
+
+    response = client.get(
+        f"/file/archivos/{auth_user['email']}/meta_ed.txt/metadata",
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["metodos_firma"] == ["ed25519"]
+    assert "BEGIN PUBLIC KEY" in data["llaves_publicas"]["ed25519"]
+
+
+def test_compressed_upload_download_and_verify(
+    auth_headers, auth_user, test_keys, monkeypatch
+):
+    """Prueba que la compresión en disco sea transparente para descarga y firma."""
+    from controllers import storage
+
+    monkeypatch.setattr(storage, "STORAGE_COMPRESSION", "zlib")
+
+    file_content = b"linea de log repetida\n" * 2000
+    filename = "app.log"
+
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(file_content), "text/plain")},
+        data={
+            "sign": True,
+            "method": "ecc",
+            "private_key": test_keys["ecc"]["private"],
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["codec"] == "zlib"
+
+    file_path = stored_path(auth_user["email"], filename)
+    assert os.path.getsize(file_path) < len(file_content)
+
+    response = client.get(
+        f"/file/archivos/{auth_user['email']}/{filename}/descargar",
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    assert response.content == file_content
+    assert (
+        response.headers["content-disposition"] == f'attachment; filename="{filename}"'
+    )
+
+    # La firma se calculó sobre el contenido original
+    response = client.post(
+        "/file/verificar",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(file_content), "text/plain")},
+        data={
+            "user_email": auth_user["email"],
+            "public_key": test_keys["ecc"]["public"],
+            "algorithm": "ecc",
+        },
+    )
+    assert response.status_code == 200
+
+    # El archivo .codec no aparece en el listado
+    files = client.get("/file/files", headers=auth_headers).json()
+    user_files = next(item for item in files if item["user"] == auth_user["email"])
+    assert user_files["files"] == [filename]
+
+
+def test_upload_over_max_size_is_rejected(auth_headers, auth_user, monkeypatch):
+    """Prueba que un archivo mayor al máximo se rechace sin dejar rastro en disco."""
+    import controllers.FileServer as file_server
+
+    monkeypatch.setattr(file_server, "MAX_UPLOAD_BYTES", 10)
+
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": ("big.txt", io.BytesIO(b"x" * 11), "text/plain")},
+        data={"sign": False},
+    )
+
+    assert response.status_code == 413
+    assert not os.path.exists(stored_path(auth_user["email"], "big.txt"))
+
+
+def test_upload_quota_is_tracked_and_enforced(auth_headers, auth_user, monkeypatch):
+    """Prueba que el uso se acumule por usuario y que la cuota se respete."""
+    from controllers import quota
+    from database import User, db
+
+    monkeypatch.setattr(quota, "STORAGE_QUOTA_BYTES", 100)
+
+    def storage_used():
+        with db.read() as session:
+            return (
+                session.query(User.storage_used)
+                .filter_by(email=auth_user["email"])
+                .scalar()
+            )
+
+    # El fixture borra FileSection, así que el uso acumulado se reinicia también
+    with db.write() as session:
+        session.query(User).filter_by(email=auth_user["email"]).update(
+            {"storage_used": 0}
+        )
+    assert storage_used() == 0
+
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": ("a.txt", io.BytesIO(b"a" * 60), "text/plain")},
+        data={"sign": False},
+    )
+    assert response.status_code == 200
+    assert storage_used() == 60
+
+    # Sobrescribir el mismo archivo solo cuenta la diferencia
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": ("a.txt", io.BytesIO(b"a" * 70), "text/plain")},
+        data={"sign": False},
+    )
+    assert response.status_code == 200
+    assert storage_used() == 70
+
+    # Un archivo nuevo que no cabe en la cuota se rechaza
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": ("b.txt", io.BytesIO(b"b" * 40), "text/plain")},
+        data={"sign": False},
+    )
+    assert response.status_code == 413
+    assert storage_used() == 70
+
+
+def test_download_archive_of_selected_files(auth_headers, auth_user, test_keys):
+    """Prueba la descarga de varios archivos en un zip y en un tar."""
+    for filename, content in (("uno.txt", b"uno" * 100), ("dos.png", b"\x89PNG" * 50)):
+        client.post(
+            "/file/upload",
+            headers=auth_headers,
+            files={"file": (filename, io.BytesIO(content), "text/plain")},
+            data={
+                "sign": True,
+                "method": "ecc",
+                "private_key": test_keys["ecc"]["private"],
+            },
+        )
+
+    response = client.get(
+        f"/file/archivos/{auth_user['email']}/descargar",
+        headers=auth_headers,
+        params={"archivos": ["uno.txt"], "sidecars": True},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.read("uno.txt") == b"uno" * 100
+        assert "uno.txt.ecc.sig" in archive.namelist()
+        assert "dos.png" not in archive.namelist()
+
+    response = client.get(
+        f"/file/archivos/{auth_user['email']}/descargar",
+        headers=auth_headers,
+        params={"formato": "tar"},
+    )
+    assert response.status_code == 200
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        assert archive.getnames() == ["dos.png", "uno.txt"]
+
+    response = client.get(
+        f"/file/archivos/{auth_user['email']}/descargar",
+        headers=auth_headers,
+        params={"formato": "rar"},
+    )
+    assert response.status_code == 400
+
+
+def test_metadata_returns_signing_key_after_rotation(auth_headers, auth_user):
+    """Prueba que la metadata devuelva la llave de la firma aunque se haya rotado."""
+    keys = client.post("/auth/generate-keys", headers=auth_headers).json()
+    client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": ("rotado.txt", io.BytesIO(b"contenido"), "text/plain")},
+        data={"sign": True, "method": "ecc", "private_key": keys["ecc_private_key"]},
+    )
+    hash_path = stored_path(auth_user["email"], "rotado.txt") + ".ecc.hash"
+    with open(hash_path) as f:
+        assert f"Llave: {keys['key_fingerprints']['ecc']}" in f.read()
+
+    # Rotar las llaves no invalida la firma anterior
+    client.post("/auth/generate-keys", headers=auth_headers)
+
+    response = client.get(
+        f"/file/archivos/{auth_user['email']}/rotado.txt/metadata",
+        headers=auth_headers,
+    )
+    data = response.json()
+    assert data["huellas"] == {"ecc": keys["key_fingerprints"]["ecc"]}
+
+    response = client.post(
+        "/file/verificar",
+        files={"file": ("rotado.txt", io.BytesIO(b"contenido"), "text/plain")},
+        data={
+            "user_email": auth_user["email"],
+            "public_key": data["llaves_publicas"]["ecc"],
+            "algorithm": "ecc",
+        },
+    )
+    assert response.status_code == 200
+
+
+def test_legacy_flat_layout_is_served_and_migrated(auth_headers, auth_user):
+    """Prueba que los archivos del formato plano se sirvan antes y después de migrar."""
+    from controllers import fs
+    from controllers.layout import migrate_storage
+
+    keys = client.post("/auth/generate-keys", headers=auth_headers).json()
+    client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": ("plano.txt", io.BytesIO(b"formato anterior"), "text/plain")},
+        data={"sign": True, "method": "rsa", "private_key": keys["rsa_private_key"]},
+    )
+
+    # Se lleva el archivo y sus sidecars al formato anterior
+    user_dir = BASE_DIR / auth_user["email"]
+    shard = os.path.dirname(stored_path(auth_user["email"], "plano.txt"))
+    for name in os.listdir(shard):
+        shutil.move(os.path.join(shard, name), user_dir / name)
+    fs.invalidate()
+
+    def check():
+        response = client.get(
+            f"/file/archivos/{auth_user['email']}/plano.txt/descargar",
+            headers=auth_headers,
+        )
+        assert response.content == b"formato anterior"
+        response = client.get(
+            f"/file/archivos/{auth_user['email']}/plano.txt/metadata",
+            headers=auth_headers,
+        )
+        assert response.json()["metodos_firma"] == ["rsa"]
+        response = client.post(
+            "/file/verificar",
+            files={
+                "file": ("plano.txt", io.BytesIO(b"formato anterior"), "text/plain")
+            },
+            data={
+                "user_email": auth_user["email"],
+                "public_key": response.json()["llaves_publicas"]["rsa"],
+                "algorithm": "rsa",
+            },
+        )
+        assert response.status_code == 200
+        files = client.get("/file/files", headers=auth_headers).json()
+        assert files == [{"user": auth_user["email"], "files": ["plano.txt"]}]
+
+    check()
+    assert migrate_storage() == 1
+    assert os.path.exists(stored_path(auth_user["email"], "plano.txt") + ".rsa.sig")
+    assert not os.path.exists(user_dir / "plano.txt")
+    check()
+
+
+def test_upload_progress_is_reported_by_upload_id(auth_headers, auth_user, test_keys):
+    """Prueba el progreso de una subida con X-Upload-Id: estado y eventos SSE."""
+    file_content = b"progreso de la subida" * 100
+    headers = {**auth_headers, "X-Upload-Id": "subida-0001"}
+
+    response = client.post(
+        "/file/upload",
+        headers=headers,
+        files={"file": ("progreso.txt", io.BytesIO(file_content), "text/plain")},
+        data={"sign": True, "private_key": test_keys["ed25519"]["private"]},
+    )
+    assert response.status_code == 200
+    assert response.json()["upload_id"] == "subida-0001"
+
+    response = client.get("/file/uploads/subida-0001", headers=auth_headers)
+    state = response.json()
+    assert state["stage"] == "done"
+    assert state["received"] == state["total"] > len(file_content)
+    assert state["stored"] == state["signed"] == len(file_content)
+    assert state["result"]["ed25519_signature"].endswith(".ed25519.sig")
+
+    with client.stream(
+        "GET", "/file/uploads/subida-0001/events", headers=auth_headers
+    ) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = response.read().decode()
+    assert body.startswith("event: done\n")
+
+    assert (
+        client.get("/file/uploads/otra-subida", headers=auth_headers).status_code == 404
+    )
+    response = client.post(
+        "/file/upload",
+        headers={**auth_headers, "X-Upload-Id": "corto"},
+        files={"file": ("progreso.txt", io.BytesIO(b"x"), "text/plain")},
+    )
+    assert response.status_code == 400
+
+
+def test_background_upload_returns_202_and_finishes(auth_headers, auth_user):
+    """Prueba que con background=true la subida responda 202 y el job termine luego."""
+    # Con 'with' el event loop sigue vivo entre peticiones y la tarea puede terminar
+    with TestClient(app) as background_client:
+        response = background_client.post(
+            "/file/upload",
+            headers=auth_headers,
+            files={
+                "file": ("diferida.txt", io.BytesIO(b"en segundo plano"), "text/plain")
+            },
+            data={"background": True},
+        )
+        assert response.status_code == 202
+        body = response.json()
+        assert body["status"] == "queued"
+        assert body["status_url"] == f"/file/uploads/{body['upload_id']}"
+
+        for _ in range(100):
+            state = background_client.get(
+                body["status_url"], headers=auth_headers
+            ).json()
+            if state["stage"] in ("done", "error"):
+                break
+            time.sleep(0.05)
+
+        job = background_client.get(body["job_url"], headers=auth_headers).json()
+
+    assert state["stage"] == "done"
+    assert state["job_id"] == body["job_id"]
+    assert state["stored"] == len(b"en segundo plano")
+    assert job["status"] == "done"
+    assert job["result"]["hash_path"] == state["result"]["hash_path"]
+    with open(stored_path(auth_user["email"], "diferida.txt"), "rb") as f:
+        assert f.read() == b"en segundo plano"
+    # El job solo lo ve su dueño
+    other = {**auth_user, "email": "otro@example.com"}
+    client.post("/auth/register", json=other)
+    token = client.post(
+        "/auth/login", json={"email": other["email"], "password": other["password"]}
+    ).json()["jwt_token"]
+    response = client.get(body["job_url"], headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 404
+
+
+def test_overwrite_replaces_sidecars_even_if_signing_fails(
+    auth_headers, auth_user, test_keys, monkeypatch
+):
+    """Prueba que al sobrescribir no queden el hash ni la firma de la versión previa."""
+    import hashlib
+
+    from fastapi import HTTPException
+
+    import controllers.FileServer as file_server
+    from controllers.hashing import parse_hash_file
+
+    filename = "sobrescrito.txt"
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(b"version 1"), "text/plain")},
+        data={
+            "sign": True,
+            "method": "rsa",
+            "private_key": test_keys["rsa"]["private"],
+        },
+    )
+    assert response.status_code == 200
+    path = stored_path(auth_user["email"], filename)
+    assert os.path.exists(f"{path}.rsa.sig")
+
+    # La firma de la versión nueva falla en el job
+    async def failing_signer(*args):
+        raise HTTPException(status_code=500, detail="firma fallida")
+
+    monkeypatch.setattr(file_server, "sign_file_with_ecc", failing_signer)
+    response = client.post(
+        "/file/upload",
+        headers=auth_headers,
+        files={"file": (filename, io.BytesIO(b"version 2"), "text/plain")},
+        data={
+            "sign": True,
+            "method": "ecc",
+            "private_key": test_keys["ecc"]["private"],
+        },
+    )
+    assert response.status_code == 500
+
+    assert not os.path.exists(f"{path}.rsa.sig")
+    assert not os.path.exists(f"{path}.rsa.hash")
+    with open(f"{path}.ecc.hash") as f:
+        algorithm, stored_hash = parse_hash_file(f.read())
+    assert stored_hash == hashlib.new(algorithm, b"version 2").hexdigest()
+
+    response = client.get(
+        f"/file/archivos/{auth_user['email']}/{filename}/metadata",
+        headers=auth_headers,
+    )
+    assert response.json()["metodos_firma"] == []
@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from controllers.backends import load_crypto_backends
+from main import app
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+# Presupuesto de importación de la app en un proceso nuevo (generoso para CI)
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "5"))
+
+client = TestClient(app)
+
+
+def test_import_is_lazy_and_within_budget():
+    """Importar la app no carga cryptography/jose/redis ni crea el motor de la base."""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        "loaded = [m for m in ('cryptography', 'jose', 'redis') if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'loaded': loaded,"
+        " 'engine': main.db._engine is not None}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert report["loaded"] == []
+    assert report["engine"] is False
+    assert report["elapsed"] < STARTUP_BUDGET_SECONDS
+
+
+def test_ready_reports_dependencies():
+    """Prueba que /ready revise base, Redis y backends, separado de /health."""
+    load_crypto_backends()
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {
+        "status": "ready",
+        "checks": {"database": True, "redis": True, "crypto": True},
+    }
+    assert client.get("/health").json() == {"status": "ok"}
+
+
+def test_ready_fails_when_redis_is_down(monkeypatch):
+    """Prueba que /ready retorne 503 si Redis no responde."""
+
+    class DownRedis:
+        def ping(self):
+            raise ConnectionError("Redis no disponible")
+
+    monkeypatch.setattr("main.get_redis", lambda: DownRedis())
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["redis"] is False
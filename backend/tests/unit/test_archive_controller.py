@@ -0,0 +1,79 @@
+import asyncio
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+
+from controllers import storage
+from controllers.archive import collect_archive_entries, iter_tar, iter_zip
+
+TEXT = b"linea de texto repetida\n" * 20_000
+MEDIA = os.urandom(200_000)
+
+
+@pytest.fixture
+def user_dir(tmp_path):
+    directory = tmp_path / "ana@example.com"
+    directory.mkdir()
+    (directory / "notas.txt").write_bytes(TEXT)
+    (directory / "foto.jpg").write_bytes(MEDIA)
+    (directory / "notas.txt.ed25519.sig").write_bytes(b"firma")
+    (directory / "notas.txt.sha256.hash").write_text("SHA256: abc\nAlgoritmo: sha256")
+    return directory
+
+
+def _collect(chunks) -> list[bytes]:
+    async def consume():
+        return [chunk async for chunk in chunks]
+
+    return asyncio.run(consume())
+
+
+def test_zip_stores_compressed_formats_and_deflates_the_rest(user_dir):
+    """Verifica el contenido del zip y el modo de compresión por extensión."""
+    entries = collect_archive_entries(user_dir)
+    parts = _collect(iter_zip(entries, chunk_size=16 * 1024))
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(parts))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["foto.jpg", "notas.txt"]
+        assert archive.read("notas.txt") == TEXT
+        assert archive.read("foto.jpg") == MEDIA
+        assert archive.getinfo("foto.jpg").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("notas.txt").compress_type == zipfile.ZIP_DEFLATED
+
+    # El archivo se entrega por bloques, no armado completo en memoria
+    assert max(len(part) for part in parts) < 64 * 1024
+
+
+def test_tar_with_sidecars_and_compressed_storage(user_dir, monkeypatch):
+    """Verifica el tar con sidecars y que los comprimidos en disco salgan originales."""
+    monkeypatch.setattr(storage, "STORAGE_COMPRESSION", "zlib")
+    asyncio.run(storage.write_file(user_dir / "notas.txt", TEXT))
+    assert storage.read_codec_info(user_dir / "notas.txt")
+
+    entries = collect_archive_entries(user_dir, ["notas.txt"], include_sidecars=True)
+    data = b"".join(_collect(iter_tar(entries)))
+
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == [
+            "notas.txt",
+            "notas.txt.ed25519.sig",
+            "notas.txt.sha256.hash",
+        ]
+        assert archive.extractfile("notas.txt").read() == TEXT
+
+
+def test_collect_rejects_missing_and_invalid_names(user_dir):
+    """Verifica los errores por archivos inexistentes, auxiliares o rutas."""
+    for filenames, status in (
+        (["no-existe.txt"], 404),
+        (["notas.txt.ed25519.sig"], 404),
+        (["../otro/notas.txt"], 400),
+    ):
+        with pytest.raises(HTTPException) as error:
+            collect_archive_entries(user_dir, filenames)
+        assert error.value.status_code == status
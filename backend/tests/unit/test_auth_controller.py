@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from jose import jwt
 from fastapi import HTTPException
@@ -20,6 +22,16 @@ def test_hash_password_sha256():
     assert len(p1) == 64  # hash sha256 = 64 chars hex
 
 
+def test_hash_passwords_keeps_order_across_batches(monkeypatch):
+    """Verifica que el hash en paralelo por bloques conserve el orden del lote."""
+    monkeypatch.setattr(auth, "PASSWORD_HASH_BATCH_SIZE", 3)
+    monkeypatch.setattr(auth, "PASSWORD_HASH_WORKERS", 2)
+    passwords = [f"clave{i}" for i in range(10)]
+    hashed = asyncio.run(auth.hash_passwords(passwords))
+    assert hashed == [auth._hash_password(password) for password in passwords]
+    assert asyncio.run(auth.hash_passwords([])) == []
+
+
 def test_generate_jwt_token_contains_expected_fields():
     """Verifica que el JWT tenga campos esperados."""
     user = DummyUser()
@@ -84,6 +96,61 @@ def test_verify_jwt_user_not_found(monkeypatch):
     assert "usuario" in excinfo.value.detail.lower()
 
 
+def test_decode_jwt_matches_jose():
+    """Verifica que la verificación rápida retorne los mismos claims que jose."""
+    token = auth._generate_jwt_token(DummyUser())
+    expected = jwt.decode(token, auth.SECRET_KEY, algorithms=["HS256"])
+    auth.forget_jwt(token)
+    assert auth.decode_jwt(token) == expected
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        jwt.encode({"user_id": "x", "exp": 2**40}, "otra-llave", algorithm="HS256"),
+        jwt.encode({"user_id": "x", "exp": 2**40}, auth.SECRET_KEY, algorithm="HS512"),
+        "a.b.c",
+    ],
+)
+def test_decode_jwt_rejects_foreign_tokens(token):
+    """Verifica que se rechacen firmas de otra llave, otros algoritmos y basura."""
+    with pytest.raises(auth.InvalidTokenError):
+        auth.decode_jwt(token)
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"user_id": "x", "exp": "2099"},
+        {"user_id": "x", "exp": 2**40, "iat": "1"},
+        {"user_id": "x", "exp": 2**40, "iat": 2**39},
+        {"user_id": "x", "exp": 2**40, "nbf": 2**39},
+        {"user_id": "x", "exp": 2**40, "nbf": 1.5},
+        {"user_id": "x", "exp": 2**40, "aud": "otra-app"},
+        {"user_id": "x", "exp": 2**40, "sub": 1},
+    ],
+)
+def test_decode_jwt_validates_registered_claims(claims):
+    """Verifica tipos de exp/iat/nbf/sub, 'iat'/'nbf' futuros y 'aud'."""
+    token = jwt.encode(claims, auth.SECRET_KEY, algorithm="HS256")
+    with pytest.raises(auth.InvalidTokenError):
+        auth.decode_jwt(token)
+
+
+def test_decode_jwt_caches_claims_until_exp(monkeypatch):
+    """Verifica que un token verificado no se vuelva a verificar hasta su 'exp'."""
+    token = auth._generate_jwt_token(DummyUser())
+    claims = auth.decode_jwt(token)
+
+    monkeypatch.setattr(auth, "_HMAC_SHA256", None)  # fallaría si se usara
+    assert auth.decode_jwt(token) is claims
+
+    monkeypatch.setattr(auth.time, "time", lambda: claims["exp"])
+    with pytest.raises(auth.ExpiredTokenError):
+        auth.decode_jwt(token)
+    assert token not in auth._claims_cache
+
+
 def test_get_current_user_valid(monkeypatch):
     """Verifica que extraiga el token correctamente del header."""
     user = DummyUser()
@@ -105,65 +172,43 @@ def test_get_current_user_invalid_format():
     assert excinfo.value.status_code == 400
 
 
-def test_login_success(monkeypatch):
-    """Simula login exitoso."""
-    user = DummyUser(password=auth._hash_password("pass123"))
+class DummyDB:
+    """Simula una sesión de lectura que retorna 'row' en cada consulta."""
 
-    def mock_query(_):
-        class Q:
-            def filter_by(self, **kwargs):
-                return self
+    def __init__(self, row):
+        self.row = row
+        self.params = None
 
-            def first(self):
-                return user
+    def __enter__(self):
+        return self
 
-        return Q()
+    def __exit__(self, *a):
+        pass
 
-    class DummyDB:
-        def __enter__(self):
-            """Simula contexto de base de datos."""
-            return self
+    def execute(self, statement, params):
+        self.params = params
+        return self
 
-        def __exit__(self, *a):
-            """Cerrar contexto."""
-            pass
+    def first(self):
+        return self.row
 
-        def query(self, _):
-            """Simula consulta de usuario."""
-            return mock_query(_)
 
-    monkeypatch.setattr(auth.db, "write", lambda: DummyDB())
+def test_login_success(monkeypatch):
+    """Simula login exitoso."""
+    user = DummyUser(password=auth._hash_password("pass123"))
+    session = DummyDB(user)
+    monkeypatch.setattr(auth.db, "read", lambda: session)
 
     email, token = auth.login(user.email, "pass123")
     assert email == user.email
+    assert session.params == {"email": user.email}
     decoded = jwt.decode(token, auth.SECRET_KEY, algorithms=["HS256"])
     assert decoded["user_id"] == user.email
 
 
 def test_login_failure(monkeypatch):
     """Simula credenciales incorrectas."""
-
-    class DummyDB:
-        def __enter__(self):
-            """Simula contexto de base de datos."""
-            return self
-
-        def __exit__(self, *a):
-            """Cerrar contexto."""
-            pass
-
-        def query(self, _):
-            """Simula consulta de usuario que no existe."""
-            class Q:
-                def filter_by(self, **kwargs):
-                    return self
-
-                def first(self):
-                    return None
-
-            return Q()
-
-    monkeypatch.setattr(auth.db, "write", lambda: DummyDB())
+    monkeypatch.setattr(auth.db, "read", lambda: DummyDB(None))
     email, token = auth.login("bad@example.com", "wrong")
     assert email == ""
     assert token == ""
@@ -0,0 +1,100 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from controllers.responses import FastJSONResponse
+from middleware.compression import CompressionMiddleware, choose_encoding
+
+LISTING = [
+    {"user": f"user{i}@example.com", "files": ["a.txt", "b.pdf"]} for i in range(100)
+]
+
+
+def _build_client(tmp_path) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/listing", response_class=FastJSONResponse)
+    async def listing():
+        return FastJSONResponse(LISTING)
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield b"["
+            for item in LISTING:
+                yield json.dumps(item).encode() + b","
+            yield b"{}]"
+
+        return StreamingResponse(chunks(), media_type="application/json")
+
+    @app.get("/download")
+    async def download():
+        file_path = tmp_path / "archivo.json"
+        file_path.write_text(json.dumps(LISTING))
+        return FileResponse(file_path, media_type="application/octet-stream")
+
+    return TestClient(app)
+
+
+def test_large_json_is_gzipped(tmp_path):
+    """Verifica que un listado grande se comprima y se lea igual al descomprimir."""
+    response = _build_client(tmp_path).get(
+        "/listing", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert int(response.headers["Content-Length"]) < len(json.dumps(LISTING))
+    assert response.json() == LISTING
+
+
+def test_small_and_unaccepted_responses_are_not_compressed(tmp_path):
+    """Verifica el umbral de tamaño y que sin Accept-Encoding no se comprima."""
+    client = _build_client(tmp_path)
+
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    assert small.headers["Vary"] == "Accept-Encoding"
+
+    identity = client.get("/listing", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in identity.headers
+    assert identity.json() == LISTING
+
+
+def test_streamed_json_is_compressed_by_chunks(tmp_path):
+    """Verifica que un JSON en streaming se comprima sin Content-Length."""
+    response = _build_client(tmp_path).get(
+        "/stream", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert response.json() == [*LISTING, {}]
+
+
+def test_downloads_are_not_compressed(tmp_path):
+    """Verifica que las descargas binarias pasen intactas aunque se acepte gzip."""
+    response = _build_client(tmp_path).get(
+        "/download", headers={"Accept-Encoding": "gzip"}
+    )
+    assert "Content-Encoding" not in response.headers
+    assert response.content == json.dumps(LISTING).encode()
+
+
+def test_choose_encoding_honours_quality_values():
+    """Verifica la negociación de Accept-Encoding con sus 'q'."""
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("*") is not None
+    assert choose_encoding("deflate") is None
+
+
+def test_fast_json_matches_json_response():
+    """Verifica que FastJSONResponse serialice lo mismo que JSONResponse."""
+    content = {"huellas": {"rsa": "ñandú"}, "archivos": LISTING[:2]}
+    assert json.loads(FastJSONResponse(content).body) == content
@@ -0,0 +1,129 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from controllers import download
+from controllers.download import ZeroCopyFileResponse
+from monitoring import DOWNLOAD_BYTES, DOWNLOAD_THROUGHPUT
+
+DATA = os.urandom(300_000)
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / "artefacto.bin"
+    path.write_bytes(DATA)
+    return path
+
+
+def _run(response, extensions: dict, headers: list = ()) -> list[dict]:
+    """Ejecuta la respuesta ASGI con las extensiones dadas y retorna los mensajes."""
+    messages = []
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "headers": list(headers),
+        "extensions": extensions,
+    }
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopy":
+            message = {**message, "data": message["file"].read()}
+        messages.append(message)
+
+    asyncio.run(response(scope, receive, send))
+    return messages
+
+
+def test_zerocopy_hands_the_file_to_the_server(data_path):
+    """Verifica que con la extensión zerocopy no se envíe el contenido como cuerpo."""
+    before = DOWNLOAD_BYTES.get(mode="zerocopy")
+
+    messages = _run(ZeroCopyFileResponse(data_path), {"http.response.zerocopy": {}})
+
+    start, body = messages
+    assert start["status"] == 200
+    assert body["type"] == "http.response.zerocopy"
+    assert (body["offset"], body["count"]) == (0, len(DATA))
+    assert body["data"] == DATA
+    assert DOWNLOAD_BYTES.get(mode="zerocopy") == before + len(DATA)
+
+
+def test_zerocopy_range_sets_offset_and_count(data_path):
+    """Verifica que una petición con Range se traduzca a offset/count."""
+    messages = _run(
+        ZeroCopyFileResponse(data_path),
+        {"http.response.zerocopy": {}},
+        [(b"range", b"bytes=100-199")],
+    )
+
+    start, body = messages
+    assert start["status"] == 206
+    assert (body["offset"], body["count"]) == (100, 100)
+
+
+def test_pathsend_sends_the_absolute_path(data_path):
+    """Verifica que con la extensión pathsend solo se envíe la ruta."""
+    messages = _run(ZeroCopyFileResponse(data_path), {"http.response.pathsend": {}})
+
+    assert messages[1] == {"type": "http.response.pathsend", "path": str(data_path)}
+
+
+def test_mmap_fallback_streams_in_chunks(data_path, monkeypatch):
+    """Verifica el envío por bloques desde el mapeo en memoria y sus métricas."""
+    monkeypatch.setattr(ZeroCopyFileResponse, "chunk_size", 128 * 1024)
+    before = DOWNLOAD_THROUGHPUT.count(mode="mmap")
+
+    messages = _run(ZeroCopyFileResponse(data_path), {})
+
+    bodies = [message for message in messages[1:]]
+    assert [len(message["body"]) for message in bodies] == [131072, 131072, 37856]
+    assert [message["more_body"] for message in bodies] == [True, True, False]
+    assert b"".join(message["body"] for message in bodies) == DATA
+    assert DOWNLOAD_THROUGHPUT.count(mode="mmap") == before + 1
+
+
+def test_read_fallback_when_mmap_fails(data_path, monkeypatch):
+    """Verifica que sin mmap el archivo se lea por bloques."""
+
+    def fail(path):
+        raise OSError("mmap no soportado")
+
+    monkeypatch.setattr(download, "_map_file", fail)
+    before = DOWNLOAD_BYTES.get(mode="read")
+
+    messages = _run(ZeroCopyFileResponse(data_path), {})
+
+    assert b"".join(message["body"] for message in messages[1:]) == DATA
+    assert DOWNLOAD_BYTES.get(mode="read") == before + len(DATA)
+
+
+def test_ranges_and_empty_files_over_http(tmp_path, data_path):
+    """Verifica rangos, HEAD y archivos vacíos a través de una app real."""
+    empty = tmp_path / "vacio.bin"
+    empty.touch()
+    app = FastAPI()
+
+    @app.api_route("/{name}", methods=["GET", "HEAD"])
+    async def serve(name: str):
+        return ZeroCopyFileResponse(tmp_path / name)
+
+    client = TestClient(app)
+
+    response = client.get("/artefacto.bin", headers={"Range": "bytes=1000-"})
+    assert response.status_code == 206
+    assert response.content == DATA[1000:]
+
+    response = client.head("/artefacto.bin")
+    assert response.headers["content-length"] == str(len(DATA))
+    assert response.content == b""
+
+    response = client.get("/vacio.bin")
+    assert response.status_code == 200
+    assert response.content == b""
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from controllers import fs
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    fs.invalidate()
+    yield
+    fs.invalidate()
+
+
+@pytest.fixture
+def stat_calls(monkeypatch):
+    """Cuenta las llamadas reales a stat."""
+    calls = []
+    real_stat = fs.aiofiles.os.stat
+
+    async def counting_stat(path):
+        calls.append(path)
+        return await real_stat(path)
+
+    monkeypatch.setattr(fs.aiofiles.os, "stat", counting_stat)
+    return calls
+
+
+def test_existing_paths_are_cached_until_ttl(tmp_path, stat_calls, monkeypatch):
+    """Verifica que el stat de una ruta existente se reutilice hasta STAT_CACHE_TTL."""
+    path = tmp_path / "archivo.txt"
+    path.write_text("hola")
+    now = [1000.0]
+    monkeypatch.setattr(fs.time, "monotonic", lambda: now[0])
+
+    assert asyncio.run(fs.is_file(path))
+    assert asyncio.run(fs.exists(path))
+    assert len(stat_calls) == 1
+
+    now[0] += fs.STAT_CACHE_TTL
+    assert asyncio.run(fs.exists(path))
+    assert len(stat_calls) == 2
+
+
+def test_missing_paths_are_not_cached(tmp_path, stat_calls):
+    """Verifica que un archivo recién creado se vea aunque antes no existiera."""
+    path = tmp_path / "nuevo.txt"
+
+    assert not asyncio.run(fs.exists(path))
+    path.write_text("hola")
+    assert asyncio.run(fs.exists(path))
+    assert len(stat_calls) == 2
+
+
+def test_unlink_invalidates_the_cache(tmp_path):
+    """Verifica que borrar con fs.unlink no deje el stat en caché."""
+    path = tmp_path / "temporal.txt"
+    path.write_text("hola")
+
+    assert asyncio.run(fs.exists(path))
+    asyncio.run(fs.unlink(path))
+    assert not asyncio.run(fs.exists(path))
+    asyncio.run(fs.unlink(path, missing_ok=True))
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(fs.unlink(path))
+
+
+def test_mkdir_and_reads(tmp_path):
+    """Verifica mkdir (con exist_ok y parents) y las lecturas completas."""
+    nested = tmp_path / "a" / "b"
+    asyncio.run(fs.mkdir(nested, parents=True))
+    asyncio.run(fs.mkdir(nested, exist_ok=True))
+    with pytest.raises(FileExistsError):
+        asyncio.run(fs.mkdir(nested))
+    assert asyncio.run(fs.is_dir(nested))
+
+    (nested / "datos.bin").write_bytes(b"\x00\x01")
+    assert asyncio.run(fs.read_bytes(nested / "datos.bin")) == b"\x00\x01"
+    assert asyncio.run(fs.read_text(nested / "datos.bin")) == "\x00\x01"
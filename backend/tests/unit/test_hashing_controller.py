@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from controllers import hashing, keys
+
+
+def test_registry_includes_fast_algorithms():
+    """Verifica que el registro incluya SHA-256 y BLAKE2b."""
+    assert "sha256" in hashing.HASH_ALGORITHMS
+    assert "blake2b" in hashing.HASH_ALGORITHMS
+
+
+def test_hash_bytes_matches_hashlib():
+    """Verifica que hash_bytes use el algoritmo solicitado."""
+    data = b"contenido"
+    assert hashing.hash_bytes(data, "sha256") == hashlib.sha256(data).hexdigest()
+    assert hashing.hash_bytes(data, "blake2b") == hashlib.blake2b(data).hexdigest()
+
+
+def test_get_hasher_unknown_algorithm():
+    """Verifica que un algoritmo desconocido lance ValueError."""
+    with pytest.raises(ValueError):
+        hashing.get_hasher("md4-inexistente")
+
+
+def test_hash_file_reads_in_chunks():
+    """Verifica que hash_file calcule el mismo hash que sobre los bytes completos."""
+    data = os.urandom(10_000)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_path = os.path.join(tmpdir, "archivo.bin")
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+        digest = asyncio.run(hashing.hash_file(file_path, "blake2b", chunk_size=1024))
+    assert digest == hashlib.blake2b(data).hexdigest()
+
+
+def test_save_hash_records_algorithm():
+    """Verifica que save_hash guarde el algoritmo separado del método de firma."""
+    data = b"contenido de prueba"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_path = os.path.join(tmpdir, "archivo.txt")
+        hash_path = asyncio.run(keys.save_hash(data, file_path, "ecc", "blake2b"))
+
+        with open(hash_path, "r") as f:
+            algorithm, digest = hashing.parse_hash_file(f.read())
+
+    assert algorithm == "blake2b"
+    assert digest == hashlib.blake2b(data).hexdigest()
+
+
+def test_parse_legacy_hash_file():
+    """Verifica que los archivos .hash antiguos se lean como SHA-256."""
+    content = "SHA256: abc123\nFirmado con: rsa"
+    assert hashing.parse_hash_file(content) == ("sha256", "abc123")
+
+
+def test_find_hash_file_prefers_method():
+    """Verifica que find_hash_file priorice el método y luego busque cualquiera."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        user_dir = Path(tmpdir)
+        (user_dir / "a.txt.ecc.hash").write_text("x")
+        (user_dir / "a.txt.rsa.hash").write_text("x")
+
+        assert hashing.find_hash_file(user_dir, "a.txt", "rsa").name == "a.txt.rsa.hash"
+        assert hashing.find_hash_file(user_dir, "a.txt", "ed").name == "a.txt.ecc.hash"
+        assert hashing.find_hash_file(user_dir, "b.txt") is None
@@ -1,6 +1,6 @@
 import os
 import tempfile
-from cryptography.hazmat.primitives.asymmetric import rsa, ec
+from cryptography.hazmat.primitives.asymmetric import rsa, ec, ed25519
 from cryptography.hazmat.primitives import serialization
 import asyncio
 
@@ -46,16 +46,33 @@ def test_generate_ecc_keys_valid_pem():
     assert isinstance(public, ec.EllipticCurvePublicKey)
 
 
+def test_generate_ed25519_keys_valid_pem():
+    """Verifica que las claves Ed25519 se generen y sean válidas PEM."""
+    priv_pem, pub_pem = keys.generate_ed25519_keys()
+    assert "BEGIN PRIVATE KEY" in priv_pem
+    assert "BEGIN PUBLIC KEY" in pub_pem
+
+    private = serialization.load_pem_private_key(priv_pem.encode(), password=None)
+    public = serialization.load_pem_public_key(pub_pem.encode())
+    assert isinstance(private, ed25519.Ed25519PrivateKey)
+    assert isinstance(public, ed25519.Ed25519PublicKey)
+
+
 def test_generate_keys_combines_rsa_and_ecc(monkeypatch):
-    """Verifica que generate_keys combine correctamente ambas funciones."""
+    """Verifica que generate_keys combine correctamente las tres funciones."""
     monkeypatch.setattr(keys, "generate_rsa_keys", lambda: ("priv_rsa", "pub_rsa"))
     monkeypatch.setattr(keys, "generate_ecc_keys", lambda: ("priv_ecc", "pub_ecc"))
+    monkeypatch.setattr(
+        keys, "generate_ed25519_keys", lambda: ("priv_ed25519", "pub_ed25519")
+    )
 
     result = keys.generate_keys()
     assert result["rsa"]["private"] == "priv_rsa"
     assert result["rsa"]["public"] == "pub_rsa"
     assert result["ecc"]["private"] == "priv_ecc"
     assert result["ecc"]["public"] == "pub_ecc"
+    assert result["ed25519"]["private"] == "priv_ed25519"
+    assert result["ed25519"]["public"] == "pub_ed25519"
 
 
 def test_sign_file_with_rsa_creates_signature_and_hash():
@@ -96,3 +113,35 @@ def test_sign_file_with_ecc_creates_signature_and_hash():
         with open(sig_path, "rb") as f:
             signature = f.read()
         assert len(signature) > 0
+
+
+def test_sign_file_with_ed25519_creates_valid_signature():
+    """Verifica que sign_file_with_ed25519 cree una firma verificable."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_path = os.path.join(tmpdir, "archivo.txt")
+        with open(file_path, "wb") as f:
+            f.write(b"hola ed25519")
+
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        sig_path, hash_path = asyncio.run(
+            keys.sign_file_with_ed25519(file_path, private_key)
+        )
+
+        assert os.path.exists(hash_path)
+        with open(sig_path, "rb") as f:
+            signature = f.read()
+
+    # Lanza InvalidSignature si la firma no corresponde
+    private_key.public_key().verify(signature, b"hola ed25519")
+
+
+def test_public_key_pem_der_roundtrip():
+    """Verifica la conversión PEM <-> DER y la huella de la llave de firma."""
+    private_pem, public_pem = keys.generate_rsa_keys()
+    der = keys.pem_to_der(public_pem)
+
+    assert keys.der_to_pem(der) == public_pem
+    assert len(der) < len(public_pem)
+
+    private_key = serialization.load_pem_private_key(private_pem.encode(), None)
+    assert keys._signer_fingerprint(private_key) == keys.key_fingerprint(der)
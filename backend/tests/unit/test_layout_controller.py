@@ -0,0 +1,123 @@
+import os
+
+from controllers.layout import (
+    SHARD_ROOT,
+    find_stored_file,
+    iter_stored_files,
+    legacy_sidecars,
+    migrate_user_dir,
+    shard_dir,
+    sharded_path,
+    storage_path,
+)
+
+
+def test_shard_dir_is_stable_and_two_levels_deep(tmp_path):
+    """Verifica que la carpeta dependa solo del nombre y tenga dos niveles."""
+    path = shard_dir(tmp_path, "informe.pdf")
+    assert path == shard_dir(tmp_path, "informe.pdf")
+    assert path.relative_to(tmp_path).parts[0] == SHARD_ROOT
+    assert [len(part) for part in path.relative_to(tmp_path / SHARD_ROOT).parts] == [
+        2,
+        2,
+    ]
+
+
+def test_lookups_prefer_sharded_and_fall_back_to_legacy(tmp_path):
+    """Verifica la búsqueda en ambos formatos y la ruta de escritura."""
+    (tmp_path / "viejo.txt").write_text("a")
+    nuevo = sharded_path(tmp_path, "nuevo.txt")
+    nuevo.parent.mkdir(parents=True)
+    nuevo.write_text("b")
+
+    assert find_stored_file(tmp_path, "viejo.txt") == tmp_path / "viejo.txt"
+    assert find_stored_file(tmp_path, "nuevo.txt") == nuevo
+    assert find_stored_file(tmp_path, "no.txt") is None
+    assert storage_path(tmp_path, "viejo.txt") == tmp_path / "viejo.txt"
+    assert storage_path(tmp_path, "no.txt") == sharded_path(tmp_path, "no.txt")
+    assert sorted(path.name for path in iter_stored_files(tmp_path)) == [
+        "nuevo.txt",
+        "viejo.txt",
+    ]
+
+
+def test_legacy_sidecars_are_assigned_to_their_file():
+    """Verifica que 'a.b.ecc.sig' sea de 'a.b' si ese archivo existe."""
+    names = sorted(
+        [
+            "a",
+            "a.sha256.hash",
+            "a.rsa.sig",
+            "a.rsa.hash",
+            "a.codec",
+            "a.b",
+            "a.b.sha256.hash",
+            "a.b.ecc.sig",
+        ]
+    )
+    data_names = {"a", "a.b"}
+    assert legacy_sidecars("a", names, data_names) == [
+        "a.codec",
+        "a.rsa.hash",
+        "a.rsa.sig",
+        "a.sha256.hash",
+    ]
+    assert legacy_sidecars("a.b", names, data_names) == [
+        "a.b.ecc.sig",
+        "a.b.sha256.hash",
+    ]
+
+
+def test_migrate_user_dir_moves_files_with_their_sidecars(tmp_path):
+    """Verifica la migración y que una versión más nueva en el formato anterior gane."""
+    for name in ("doc.txt", "doc.txt.ed25519.hash", "doc.txt.ed25519.sig"):
+        (tmp_path / name).write_text(name)
+    (tmp_path / ".doc.txt.abc.tmp").write_text("escritura en curso")
+
+    assert migrate_user_dir(tmp_path) == 1
+    target = shard_dir(tmp_path, "doc.txt")
+    assert sorted(path.name for path in target.iterdir()) == [
+        "doc.txt",
+        "doc.txt.ed25519.hash",
+        "doc.txt.ed25519.sig",
+    ]
+    assert sorted(path.name for path in tmp_path.iterdir() if path.is_file()) == [
+        ".doc.txt.abc.tmp"
+    ]
+
+    # Una subida que empezó antes de migrar vuelve a escribir en la ruta anterior
+    (tmp_path / "doc.txt").write_text("versión nueva")
+    assert migrate_user_dir(tmp_path) == 1
+    assert (target / "doc.txt").read_text() == "versión nueva"
+    assert not (tmp_path / "doc.txt").exists()
+    assert migrate_user_dir(tmp_path) == 0
+
+
+def test_migrate_keeps_files_replaced_during_migration(tmp_path, monkeypatch):
+    """Verifica que lo reemplazado a mitad de la migración no se pierda."""
+    from controllers import layout
+
+    for name in ("doc.txt", "doc.txt.sha256.hash"):
+        (tmp_path / name).write_text(f"{name} v1")
+
+    link = layout._link
+    replaced = []
+
+    def replace_after_link(source, destination):
+        link(source, destination)
+        if replaced:
+            return
+        replaced.append(source)
+        # Escritura atómica (otro inodo) entre el enlace y el borrado de la ruta previa
+        for name in ("doc.txt", "doc.txt.sha256.hash"):
+            temp = tmp_path / f".{name}.tmp"
+            temp.write_text(f"{name} v2")
+            os.replace(temp, tmp_path / name)
+
+    monkeypatch.setattr(layout, "_link", replace_after_link)
+    assert migrate_user_dir(tmp_path) == 1
+
+    target = shard_dir(tmp_path, "doc.txt")
+    assert (target / "doc.txt").read_text() == "doc.txt v2"
+    assert (target / "doc.txt.sha256.hash").read_text() == "doc.txt.sha256.hash v2"
+    assert not any(path.is_file() for path in tmp_path.iterdir())
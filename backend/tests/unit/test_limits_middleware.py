@@ -0,0 +1,65 @@
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from middleware.limits import InflightBytes, RequestBodyLimitMiddleware
+
+
+def _build_client(max_body_size: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(RequestBodyLimitMiddleware, max_body_size=max_body_size)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        body = await request.body()
+        return {"size": len(body)}
+
+    return TestClient(app)
+
+
+def test_body_within_limit_passes():
+    """Verifica que un cuerpo dentro del límite llegue a la app."""
+    client = _build_client(max_body_size=100)
+    response = client.post("/echo", content=b"x" * 100)
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+
+def test_declared_content_length_over_limit_is_rejected():
+    """Verifica el rechazo por Content-Length sin leer el cuerpo."""
+    client = _build_client(max_body_size=100)
+    response = client.post("/echo", content=b"x" * 101)
+    assert response.status_code == 413
+
+
+def test_chunked_body_over_limit_is_rejected_mid_stream():
+    """Verifica que un cuerpo sin Content-Length se corte al superar el límite."""
+    client = _build_client(max_body_size=100)
+
+    def body():
+        for _ in range(10):
+            yield b"x" * 50
+
+    response = client.post("/echo", content=body())
+    assert response.status_code == 413
+
+
+def test_inflight_bytes_applies_backpressure():
+    """Verifica que una reserva espere hasta que se libere capacidad."""
+
+    async def scenario():
+        inflight = InflightBytes(capacity=100)
+        await inflight.acquire(80)
+
+        waiter = asyncio.create_task(inflight.acquire(50))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        await inflight.release(80)
+        assert await asyncio.wait_for(waiter, timeout=1) == 50
+        # Una reserva mayor que la capacidad se limita a la capacidad
+        await inflight.release(50)
+        assert await inflight.acquire(1000) == 100
+
+    asyncio.run(scenario())
@@ -0,0 +1,76 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from middleware.metrics import MetricsMiddleware
+from monitoring import HTTP_REQUEST_BYTES, HTTP_REQUEST_DURATION, HTTP_RESPONSE_BYTES
+from monitoring.metrics import Counter, Histogram, render, timer
+
+
+def test_histogram_buckets_are_cumulative():
+    """Verifica los buckets acumulativos, la suma y el conteo del histograma."""
+    histogram = Histogram(
+        "test_latency_seconds", "Prueba.", ("op",), buckets=(0.1, 1.0)
+    )
+    histogram.observe(0.05, op="a")
+    histogram.observe(0.5, op="a")
+    histogram.observe(5, op="a")
+
+    samples = list(histogram.samples())
+    assert 'test_latency_seconds_bucket{op="a",le="0.1"} 1' in samples
+    assert 'test_latency_seconds_bucket{op="a",le="1.0"} 2' in samples
+    assert 'test_latency_seconds_bucket{op="a",le="+Inf"} 3' in samples
+    assert 'test_latency_seconds_sum{op="a"} 5.55' in samples
+    assert 'test_latency_seconds_count{op="a"} 3' in samples
+
+
+def test_render_includes_help_type_and_escaped_labels():
+    """Verifica el formato de exposición y el escape de valores de etiquetas."""
+    counter = Counter("test_events_total", "Eventos de prueba.", ("name",))
+    counter.inc(2, name='con "comillas"')
+
+    output = render()
+    assert "# HELP test_events_total Eventos de prueba." in output
+    assert "# TYPE test_events_total counter" in output
+    assert 'test_events_total{name="con \\"comillas\\""} 2' in output
+
+
+def test_timer_records_even_on_error():
+    """Verifica que el timer registre la duración aunque el bloque falle."""
+    histogram = Histogram("test_timer_seconds", "Prueba.", ("op",))
+    try:
+        with timer(histogram, op="falla"):
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+    assert histogram.count(op="falla") == 1
+
+
+def test_middleware_labels_by_route_template():
+    """Verifica que el middleware use la plantilla de ruta y cuente bytes."""
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.post("/items/{item_id}")
+    async def echo(item_id: str, request: Request):
+        return {"size": len(await request.body())}
+
+    client = TestClient(app)
+    route = "/items/{item_id}"
+    before = HTTP_REQUEST_DURATION.count(method="POST", route=route, status="200")
+    bytes_in = HTTP_REQUEST_BYTES.get(route=route)
+    bytes_out = HTTP_RESPONSE_BYTES.get(route=route)
+
+    response = client.post("/items/abc", content=b"x" * 10)
+    assert response.status_code == 200
+
+    assert (
+        HTTP_REQUEST_DURATION.count(method="POST", route=route, status="200")
+        == before + 1
+    )
+    assert HTTP_REQUEST_BYTES.get(route=route) == bytes_in + 10
+    assert HTTP_RESPONSE_BYTES.get(route=route) == bytes_out + len(response.content)
+
+    client.get("/no-existe")
+    assert (
+        HTTP_REQUEST_DURATION.count(method="GET", route="unmatched", status="404") >= 1
+    )
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+from controllers import progress
+from database import get_redis
+
+EMAIL = "progress@example.com"
+
+
+@pytest.fixture(autouse=True)
+def fast_events(monkeypatch):
+    monkeypatch.setattr(progress, "UPLOAD_EVENTS_POLL", 0)
+    yield
+    for key in get_redis().scan_iter(f"upload:{EMAIL}:*"):
+        get_redis().delete(key)
+
+
+async def _not_disconnected() -> bool:
+    return False
+
+
+def _collect_events(upload_id: str) -> list[tuple[str, dict]]:
+    async def collect():
+        return [
+            event
+            async for event in progress.iter_progress_events(
+                EMAIL, upload_id, _not_disconnected
+            )
+        ]
+
+    events = []
+    for raw in asyncio.run(collect()):
+        fields = dict(line.split(": ", 1) for line in raw.strip().splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_byte_counters_are_throttled(monkeypatch):
+    """Verifica que los bytes se escriban cada UPLOAD_PROGRESS_INTERVAL y las etapas
+    siempre."""
+    now = [1000.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+
+    upload = progress.UploadProgress(EMAIL, "throttle-1")
+    upload.update("receiving", force=True, received=0, total=300)
+    upload.advance("received", 100)
+    upload.advance("received", 100)
+    assert progress.read_progress(EMAIL, "throttle-1")["received"] == 0
+
+    now[0] += progress.UPLOAD_PROGRESS_INTERVAL
+    upload.advance("received", 100)
+    state = progress.read_progress(EMAIL, "throttle-1")
+    assert state["received"] == 300
+    assert state["total"] == 300
+
+    upload.advance("stored", 50)
+    upload.update("signing")
+    state = progress.read_progress(EMAIL, "throttle-1")
+    assert state["stage"] == "signing"
+    assert state["stored"] == 50
+
+
+def test_progress_is_scoped_by_user():
+    """Verifica que otro usuario no vea el progreso de la subida."""
+    progress.UploadProgress(EMAIL, "scoped-01").update("storing")
+
+    assert progress.read_progress(EMAIL, "scoped-01")["stage"] == "storing"
+    assert progress.read_progress("otro@example.com", "scoped-01") is None
+
+
+def test_events_end_with_done_and_result():
+    """Verifica que el stream SSE termine con 'done' y el resultado de la subida."""
+    upload = progress.UploadProgress(EMAIL, "events-01")
+    upload.update("storing", stored=10)
+    upload.finish({"file_path": "FileSection/x"})
+
+    events = _collect_events("events-01")
+    assert [name for name, _ in events] == ["done"]
+    assert events[0][1]["result"] == {"file_path": "FileSection/x"}
+    assert events[0][1]["stored"] == 10
+
+
+def test_events_for_unknown_upload_end_with_error(monkeypatch):
+    """Verifica que una subida que no aparece termine el stream con 'error'."""
+    monkeypatch.setattr(progress, "UPLOAD_EVENTS_WAIT", 0)
+
+    events = _collect_events("missing-01")
+    assert events == [("error", {"detail": "Subida no encontrada"})]
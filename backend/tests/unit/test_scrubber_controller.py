@@ -0,0 +1,118 @@
+import asyncio
+import json
+from pathlib import Path
+
+from controllers import keys
+from controllers.scrubber import IntegrityScrubber
+
+
+def _store(base_dir: Path, relative_path: str, data: bytes):
+    """Guarda un archivo con su hash como lo hace la subida."""
+    file_path = base_dir / relative_path
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(data)
+    asyncio.run(keys.save_hash(data, str(file_path), "sha256", "blake2b"))
+
+
+def test_scrubber_detects_corruption(tmp_path):
+    """Verifica que el scrubber cuente archivos corruptos y sin hash."""
+    base_dir = tmp_path / "FileSection"
+    _store(base_dir, "a@example.com/ok.txt", b"contenido sano")
+    _store(base_dir, "a@example.com/roto.txt", b"contenido original")
+    (base_dir / "a@example.com/roto.txt").write_bytes(b"contenido alterado")
+    (base_dir / "b@example.com").mkdir()
+    (base_dir / "b@example.com/sin_hash.txt").write_bytes(b"x")
+
+    scrubber = IntegrityScrubber(
+        base_dir=base_dir, bytes_per_sec=0, checkpoint_path=tmp_path / "cp.json"
+    )
+    asyncio.run(scrubber.run_pass())
+
+    status = scrubber.status()
+    assert status["files_scanned"] == 2
+    assert status["corrupted"] == 1
+    assert status["missing_hash"] == 1
+    assert status["passes_completed"] == 1
+    assert status["recent_corruptions"] == ["a@example.com/roto.txt"]
+
+
+def test_scrubber_resumes_from_checkpoint(tmp_path):
+    """Verifica que una pasada continúe después del último archivo del checkpoint."""
+    base_dir = tmp_path / "FileSection"
+    for name in ("1.txt", "2.txt", "3.txt"):
+        _store(base_dir, f"a@example.com/{name}", name.encode())
+
+    checkpoint = tmp_path / "cp.json"
+    checkpoint.write_text(
+        json.dumps({"last_path": "a@example.com/2.txt", "stats": {"files_scanned": 2}})
+    )
+
+    scrubber = IntegrityScrubber(
+        base_dir=base_dir, bytes_per_sec=0, checkpoint_path=checkpoint
+    )
+    asyncio.run(scrubber.run_pass())
+
+    # Solo se revisa 3.txt; los contadores previos se conservan
+    assert scrubber.stats["files_scanned"] == 3
+    assert json.loads(checkpoint.read_text())["last_path"] is None
+
+
+def test_only_one_worker_runs_the_scrubber(tmp_path):
+    """Verifica que con varios workers solo uno obtenga el lock del scrubber."""
+    lock_path = tmp_path / "scrubber.lock"
+    first = IntegrityScrubber(
+        base_dir=tmp_path, checkpoint_path=tmp_path / "cp.json", lock_path=lock_path
+    )
+    second = IntegrityScrubber(
+        base_dir=tmp_path, checkpoint_path=tmp_path / "cp.json", lock_path=lock_path
+    )
+
+    async def run():
+        assert first.start() is True
+        assert second.start() is False
+        await first.stop()
+        # Al detenerse el primero, el lock queda libre
+        assert second.start() is True
+        await second.stop()
+
+    asyncio.run(run())
+
+
+def test_scrubber_lists_each_directory_once(tmp_path, monkeypatch):
+    """Verifica que cada directorio se liste una sola vez por pasada."""
+    import controllers.scrubber as scrubber_module
+
+    base_dir = tmp_path / "FileSection"
+    for i in range(5):
+        _store(base_dir, f"a@example.com/{i}.txt", f"archivo {i}".encode())
+
+    def unexpected_lookup(*args):
+        raise AssertionError("find_hash_file lista el directorio por archivo")
+
+    monkeypatch.setattr(scrubber_module, "find_hash_file", unexpected_lookup)
+    scrubber = IntegrityScrubber(
+        base_dir=base_dir, bytes_per_sec=0, checkpoint_path=tmp_path / "cp.json"
+    )
+    assert scrubber.list_files()[0] == ("a@example.com/0.txt", "0.txt.sha256.hash")
+    asyncio.run(scrubber.run_pass())
+
+    assert scrubber.stats["files_scanned"] == 5
+    assert scrubber.stats["errors"] == scrubber.stats["corrupted"] == 0
+
+
+def test_status_only_shows_the_users_corruptions(tmp_path):
+    """Verifica que las rutas corruptas de otros usuarios no se expongan."""
+    base_dir = tmp_path / "FileSection"
+    for user in ("a@example.com", "b@example.com"):
+        _store(base_dir, f"{user}/roto.txt", b"original")
+        (base_dir / user / "roto.txt").write_bytes(b"alterado")
+
+    scrubber = IntegrityScrubber(
+        base_dir=base_dir, bytes_per_sec=0, checkpoint_path=tmp_path / "cp.json"
+    )
+    asyncio.run(scrubber.run_pass())
+
+    status = scrubber.status("a@example.com")
+    assert status["corrupted"] == 2
+    assert status["recent_corruptions"] == ["a@example.com/roto.txt"]
+    assert scrubber.status("c@example.com")["recent_corruptions"] == []
@@ -0,0 +1,44 @@
+from fastapi import FastAPI, Response
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+
+from middleware.security import SECURITY_HEADERS, SecurityHeadersMiddleware
+
+
+def _build_client(tmp_path) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(SecurityHeadersMiddleware)
+
+    @app.get("/cached")
+    async def cached():
+        return Response("ok", headers={"Cache-Control": "public, max-age=60"})
+
+    @app.get("/download")
+    async def download():
+        file_path = tmp_path / "archivo.bin"
+        file_path.write_bytes(b"x" * 1000)
+        return FileResponse(file_path)
+
+    return TestClient(app)
+
+
+def test_security_headers_replace_existing_values(tmp_path):
+    """Verifica que las cabeceras reemplacen los valores puestos por la ruta."""
+    response = _build_client(tmp_path).get("/cached")
+    for name, value in SECURITY_HEADERS.items():
+        assert response.headers.get_list(name) == [value]
+
+
+def test_security_headers_on_file_response(tmp_path):
+    """Verifica que las descargas lleven las cabeceras y el cuerpo intacto."""
+    response = _build_client(tmp_path).get("/download")
+    assert response.status_code == 200
+    assert response.content == b"x" * 1000
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+
+
+def test_security_headers_on_not_found(tmp_path):
+    """Verifica que también las respuestas de error lleven las cabeceras."""
+    response = _build_client(tmp_path).get("/no-existe")
+    assert response.status_code == 404
+    assert response.headers["Strict-Transport-Security"].startswith("max-age=")
@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+import pytest
+
+from controllers import storage
+
+TEXT = b"fecha,usuario,accion\n" + b"2024-01-01,ana,login\n" * 5000
+
+
+@pytest.mark.parametrize("codec", sorted(storage.CODECS))
+def test_write_and_read_compressed_roundtrip(tmp_path, monkeypatch, codec):
+    """Verifica que un archivo compresible se guarde comprimido y se lea intacto."""
+    monkeypatch.setattr(storage, "STORAGE_COMPRESSION", codec)
+    file_path = tmp_path / "log.csv"
+
+    result = asyncio.run(storage.write_file(file_path, TEXT))
+
+    assert result["codec"] == codec
+    assert file_path.stat().st_size < len(TEXT)
+    assert storage.read_codec_info(file_path) == {"codec": codec, "size": len(TEXT)}
+    assert storage.original_size(file_path) == len(TEXT)
+    assert asyncio.run(storage.read_file(file_path)) == TEXT
+
+
+def test_incompressible_data_is_stored_raw(tmp_path, monkeypatch):
+    """Verifica que la prueba de compresibilidad no comprima los datos aleatorios."""
+    monkeypatch.setattr(storage, "STORAGE_COMPRESSION", "zlib")
+    data = os.urandom(100_000)
+    file_path = tmp_path / "random.bin"
+
+    result = asyncio.run(storage.write_file(file_path, data))
+
+    assert result["codec"] is None
+    assert file_path.read_bytes() == data
+    assert storage.read_codec_info(file_path) is None
+
+
+def test_overwrite_raw_removes_stale_codec(tmp_path, monkeypatch):
+    """Verifica que sobrescribir sin compresión elimine el archivo .codec anterior."""
+    file_path = tmp_path / "log.csv"
+    monkeypatch.setattr(storage, "STORAGE_COMPRESSION", "zlib")
+    asyncio.run(storage.write_file(file_path, TEXT))
+
+    monkeypatch.setattr(storage, "STORAGE_COMPRESSION", "off")
+    asyncio.run(storage.write_file(file_path, TEXT))
+
+    assert storage.read_codec_info(file_path) is None
+    assert file_path.read_bytes() == TEXT
+
+
+def test_corrupted_compressed_file_raises(tmp_path, monkeypatch):
+    """Verifica que un archivo comprimido dañado lance CorruptedFileError."""
+    monkeypatch.setattr(storage, "STORAGE_COMPRESSION", "zlib")
+    file_path = tmp_path / "log.csv"
+    asyncio.run(storage.write_file(file_path, TEXT))
+    # Daño que conserva el tamaño en disco (bit rot)
+    stored = file_path.read_bytes()
+    file_path.write_bytes(stored[:10] + bytes(len(stored) - 10))
+
+    with pytest.raises(storage.CorruptedFileError):
+        asyncio.run(storage.read_file(file_path))
+
+
+def test_is_sidecar():
+    """Verifica la detección de archivos auxiliares."""
+    assert storage.is_sidecar("a.txt.rsa.hash")
+    assert storage.is_sidecar("a.txt.ecc.sig")
+    assert storage.is_sidecar("a.txt.codec")
+    assert storage.is_sidecar("a.txt.blake2b.hash")
+    assert not storage.is_sidecar("a.txt")
+    # Solo los nombres que genera la app: estos son archivos subidos
+    assert not storage.is_sidecar("x.sig")
+    assert not storage.is_sidecar("notas.hash")
+    assert not storage.is_sidecar("a.txt.hash")
+    assert not storage.is_sidecar("a.b.sig")
+    assert not storage.is_sidecar(".codec")
+
+
+def test_stale_codec_file_is_ignored(tmp_path, monkeypatch):
+    """Verifica que un .codec de otra versión del archivo no se aplique."""
+    monkeypatch.setattr(storage, "STORAGE_COMPRESSION", "zlib")
+    file_path = tmp_path / "log.csv"
+    asyncio.run(storage.write_file(file_path, TEXT))
+
+    # Simula un lector entre el rename de los datos nuevos y el borrado del .codec
+    file_path.write_bytes(b"contenido nuevo sin comprimir")
+
+    assert storage.read_codec_info(file_path) is None
+    assert asyncio.run(storage.read_file(file_path)) == b"contenido nuevo sin comprimir"
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path, monkeypatch):
+    """Verifica que atomic_write reemplace el archivo sin dejar temporales."""
+    monkeypatch.setattr(storage, "FSYNC_POLICY", "dir")
+    file_path = tmp_path / "a.txt"
+    file_path.write_bytes(b"viejo")
+
+    asyncio.run(storage.atomic_write(file_path, b"nuevo"))
+
+    assert file_path.read_bytes() == b"nuevo"
+    assert [p.name for p in tmp_path.iterdir()] == ["a.txt"]
+
+
+def test_concurrent_writes_same_path_do_not_interleave(tmp_path):
+    """Verifica que escrituras concurrentes bajo el lock dejen un contenido completo."""
+    file_path = tmp_path / "a.bin"
+    payloads = [bytes([i]) * 200_000 for i in range(8)]
+
+    async def write(data):
+        async with storage.path_lock(file_path):
+            await storage.write_file(file_path, data)
+
+    async def main():
+        await asyncio.gather(*(write(data) for data in payloads))
+
+    asyncio.run(main())
+
+    assert file_path.read_bytes() in payloads
+    assert storage.is_temp_file(".a.bin.0123.tmp")
+    assert not storage.is_data_file(".a.bin.0123.tmp")
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import tempfile
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from controllers import keys
+from middleware.tracing import TracingMiddleware
+from monitoring import tracing
+from monitoring.tracing import FileExporter, MemoryExporter, parse_traceparent, span
+
+
+@pytest.fixture
+def exporter():
+    """Activa las trazas con un exportador en memoria durante la prueba."""
+    memory = MemoryExporter()
+    tracing.set_exporter(memory)
+    yield memory
+    tracing.set_exporter(None)
+
+
+def test_span_is_noop_when_disabled():
+    """Verifica que sin exportador no se creen spans."""
+    with span("deshabilitado") as current:
+        current.set_attribute("clave", "valor")
+    assert current is tracing.NOOP_SPAN
+
+
+def test_nested_spans_share_trace_and_parent(exporter):
+    """Verifica la relación padre-hijo y el estado de error de los spans."""
+    with (
+        span("padre") as parent,
+        pytest.raises(RuntimeError),
+        span("hijo", {"file.bytes": 10}),
+    ):
+        raise RuntimeError("falla")
+
+    child, root = exporter.spans
+    assert child.trace_id == root.trace_id
+    assert child.parent_id == root.span_id
+    assert root.parent_id is None
+    assert child.status == "ERROR"
+    assert child.attributes["file.bytes"] == 10
+    assert parent is root
+
+
+def test_sign_file_emits_stage_spans(exporter):
+    """Verifica que la firma RSA genere spans por etapa con bytes y algoritmo."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_path = os.path.join(tmpdir, "archivo.txt")
+        with open(file_path, "wb") as f:
+            f.write(b"x" * 1000)
+
+        asyncio.run(keys.sign_file_with_rsa(file_path, private_key))
+
+    spans = {s.name: s for s in exporter.spans}
+    assert spans["sign.digest"].attributes["file.bytes"] == 1000
+    assert spans["sign.private_key"].attributes["crypto.algorithm"] == "rsa"
+    assert "sign.write_signature" in spans
+
+
+def test_middleware_continues_remote_trace(exporter):
+    """Verifica que el span raíz use la ruta y continúe el 'traceparent' recibido."""
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        with span("trabajo"):
+            return {"id": item_id}
+
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    parent_id = "00f067aa0ba902b7"
+    response = TestClient(app).get(
+        "/items/1", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"}
+    )
+    assert response.status_code == 200
+
+    work, root = exporter.spans
+    assert root.name == "GET /items/{item_id}"
+    assert root.trace_id == trace_id
+    assert root.parent_id == parent_id
+    assert root.attributes["http.status_code"] == 200
+    assert work.parent_id == root.span_id
+
+
+def test_parse_traceparent_rejects_invalid_headers():
+    """Verifica que una cabecera 'traceparent' inválida se ignore."""
+    assert parse_traceparent("basura") is None
+    assert parse_traceparent("00-xyz-00f067aa0ba902b7-01") is None
+
+
+def test_file_exporter_writes_json_lines():
+    """Verifica el formato de exportación compatible con OpenTelemetry."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "traces.jsonl")
+        tracing.set_exporter(FileExporter(path))
+        try:
+            with span("exportado", {"crypto.algorithm": "ecc"}):
+                pass
+        finally:
+            tracing.set_exporter(None)
+
+        with open(path) as f:
+            record = json.loads(f.readline())
+
+    assert record["name"] == "exportado"
+    assert record["context"]["trace_id"].startswith("0x")
+    assert len(record["context"]["span_id"]) == 18
+    assert record["attributes"] == {"crypto.algorithm": "ecc"}
+    assert record["end_time"] >= record["start_time"]
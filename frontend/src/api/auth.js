@@ -87,7 +87,7 @@ export async function deleteProfile() {
     return await response.json()
 }
 
-// Función para generar llaves RSA y ECC
+// Función para generar llaves RSA, ECC y Ed25519
 export async function generateKeys() {
     const response = await fetch(`${API_BASE_URL}/auth/generate-keys`, {
         method: 'POST',